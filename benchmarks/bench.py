@@ -0,0 +1,226 @@
+'''
+measures levelorm's throughput against a temporary database. run it from the repo's root: ::
+
+	python3 -m benchmarks                        # compare against benchmarks/baseline.json
+	python3 -m benchmarks --output results.json  # also write the results
+	python3 -m benchmarks --save-baseline        # replace the baseline
+	python3 -m benchmarks --filter codec.         # only benchmarks whose names contain codec.
+
+results are operations per second. the run fails (exits with 1) if any benchmark is more than
+``--threshold`` slower than the baseline. baselines are only comparable on the machine they were recorded on
+'''
+
+import argparse
+import json
+import os
+from os import path
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import typing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import plyvel
+
+import levelorm
+from levelorm.fields import Array, BaseField, Blob, Boolean, Float, Integer, String
+
+BASELINE = path.join(path.dirname(path.abspath(__file__)), 'baseline.json')
+# each benchmark is timed for at least this long, REPEAT times, and the best run is kept
+MIN_TIME = 0.2
+REPEAT = 3
+THRESHOLD = 0.25
+RECORDS = 1000
+
+# name: (function, operations per call)
+Benchmarks = Dict[str, Tuple[Callable[[], Any], int]]
+
+def field_benchmarks() -> Benchmarks:
+	cases: List[Tuple[str, BaseField, Any]] = [
+		('boolean', Boolean(), True),
+		('integer', Integer(), -123456),
+		('float', Float(), 87.5),
+		('string.8', String(), 'moo' * 3),
+		('string.4k', String(), 'moo' * 1365),
+		('string.shift-jis', String(encoding='shift-jis'), 'もー' * 4),
+		('blob.8', Blob(), b'\xde\xad\xbe\xef' * 2),
+		('blob.64k', Blob(), os.urandom(65536)),
+		('array.integer.10', Array(Integer()), list(range(10))),
+		('array.integer.10k', Array(Integer()), list(range(10000))),
+		('array.array.integer.10x10', Array(Array(Integer())), [list(range(10))] * 10),
+		('array.array.integer.100x100', Array(Array(Integer())), [list(range(100))] * 100),
+		('array.string.100', Array(String()), ['moo'] * 100),
+	]
+	benchmarks: Benchmarks = {}
+	for name, field, value in cases:
+		data = field.pack(value)
+		benchmarks['codec.%s.serialize' % name] = (_bind(field.pack, value), 1)
+		benchmarks['codec.%s.deserialize' % name] = (_bind(field.unpack_from, data, 0), 1)
+	return benchmarks
+
+def model_benchmarks(db: plyvel.DB) -> Benchmarks:
+	DBBaseModel: typing.Any = levelorm.db_base_model(db)
+	CachedBaseModel: typing.Any = levelorm.db_base_model(db, cache_size=RECORDS * 2)
+
+	class Animal(DBBaseModel):
+		prefix = 'animal'
+		name = String(key=True)
+		onomatopoeia = String()
+		shouts = Boolean()
+		decibels = Float()
+
+	class CompactAnimal(DBBaseModel):
+		prefix = 'compactanimal'
+		format = 'compact'
+		name = String(key=True)
+		onomatopoeia = String()
+		shouts = Boolean()
+		decibels = Float()
+
+	class Matrices(DBBaseModel):
+		prefix = 'matrix'
+		name = String(key=True)
+		numbers = Array(Array(Integer()))
+
+	class RawData(DBBaseModel):
+		prefix = 'raw'
+		key = Blob(key=True)
+		data = Blob()
+
+	class CachedAnimal(CachedBaseModel):
+		prefix = 'cachedanimal'
+		name = String(key=True)
+		onomatopoeia = String()
+		shouts = Boolean()
+		decibels = Float()
+
+	def make_animals(model):
+		return [model('animal%05d' % i, 'moo', i % 2 == 0, float(i)) for i in range(RECORDS)]
+
+	datasets = [
+		('animal', Animal, make_animals(Animal)),
+		('animal.compact', CompactAnimal, make_animals(CompactAnimal)),
+		('matrix', Matrices, [Matrices('matrix%05d' % i, [list(range(32))] * 32) for i in range(RECORDS // 10)]),
+		('raw', RawData, [RawData(b'raw%05d' % i, os.urandom(1024)) for i in range(RECORDS)]),
+	]
+	benchmarks: Benchmarks = {}
+	for name, model, instances in datasets:
+		model.save_many(instances)
+		keys = [instance._key for instance in instances]
+		benchmarks['model.%s.save' % name] = (_bind(_save_all, instances), len(instances))
+		benchmarks['model.%s.save.unchanged' % name] = (_bind(_save_all, instances, False), len(instances))
+		benchmarks['model.%s.save_many' % name] = (_bind(model.save_many, instances, False, True), len(instances))
+		benchmarks['model.%s.get' % name] = (_bind(_get_all, model, keys), len(keys))
+		benchmarks['model.%s.get_many' % name] = (_bind(model.get_many, keys), len(keys))
+		benchmarks['model.%s.iter' % name] = (_bind(_consume, model.iter), len(keys))
+
+	animals = make_animals(CachedAnimal)
+	CachedAnimal.save_many(animals)
+	keys = [animal.name for animal in animals]
+	benchmarks['cache.animal.get.cold'] = (_bind(_get_cold, CachedAnimal, keys), len(keys))
+	CachedAnimal._cache.clear()
+	_get_all(CachedAnimal, keys)
+	benchmarks['cache.animal.get.warm'] = (_bind(_get_all, CachedAnimal, keys), len(keys))
+	return benchmarks
+
+def _bind(func: Callable, *args) -> Callable[[], Any]:
+	def call():
+		return func(*args)
+	return call
+
+def _save_all(instances, force: bool = True) -> None:
+	for instance in instances:
+		instance.save(force)
+
+def _get_all(model, keys) -> None:
+	get = model.get
+	for key in keys:
+		get(key)
+
+def _get_cold(model, keys) -> None:
+	model._cache.clear()
+	_get_all(model, keys)
+
+def _consume(func: Callable) -> None:
+	for _ in func():
+		pass
+
+def measure(func: Callable[[], Any], operations: int) -> float:
+	''' operations per second of the fastest of :data:`REPEAT` runs of at least :data:`MIN_TIME` '''
+	timer = timeit.Timer(func)
+	number = 1
+	while True:
+		elapsed = timer.timeit(number)
+		if elapsed >= MIN_TIME:
+			break
+		number *= max(2, int(MIN_TIME / max(elapsed, 1e-9) * 1.2))
+	best = min([elapsed] + timer.repeat(REPEAT - 1, number))
+	return number * operations / best
+
+def run(name_filter: Optional[str] = None) -> Dict[str, float]:
+	dbpath = tempfile.mkdtemp(prefix='levelorm-bench-')
+	db = plyvel.DB(dbpath, create_if_missing=True)
+	try:
+		benchmarks = field_benchmarks()
+		benchmarks.update(model_benchmarks(db))
+		results = {}
+		for name, (func, operations) in benchmarks.items():
+			if name_filter is not None and name_filter not in name:
+				continue
+			results[name] = measure(func, operations)
+			print('%-45s %14.0f ops/s' % (name, results[name]), file=sys.stderr)
+		return results
+	finally:
+		db.close()
+		shutil.rmtree(dbpath)
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+	''' descriptions of the results that are more than ``threshold`` (a fraction) slower than ``baseline`` '''
+	regressions = []
+	for name, ops in sorted(results.items()):
+		expected = baseline.get(name)
+		if expected is None:
+			continue
+		change = ops / expected - 1
+		if change < -threshold:
+			regressions.append('%s: %.0f ops/s, baseline %.0f ops/s (%+.0f%%)' % (name, ops, expected, change * 100))
+	return regressions
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(prog='python3 -m benchmarks', description=__doc__.split('\n\n')[0].strip())
+	parser.add_argument('--output', help='write the results to this JSON file')
+	parser.add_argument('--baseline', default=BASELINE)
+	parser.add_argument('--save-baseline', action='store_true', help='write the results to --baseline')
+	parser.add_argument('--threshold', type=float, default=THRESHOLD,
+			help='the fraction slower than the baseline that counts as a regression (default %(default)s)')
+	parser.add_argument('--filter', help='only run benchmarks whose names contain this')
+	args = parser.parse_args(argv)
+
+	results = run(args.filter)
+	document = {
+		'python': platform.python_version(),
+		'machine': platform.machine(),
+		'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'results': results,
+	}
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(document, f, indent='\t', sort_keys=True)
+	if args.save_baseline:
+		with open(args.baseline, 'w') as f:
+			json.dump(document, f, indent='\t', sort_keys=True)
+		return
+
+	if not path.exists(args.baseline):
+		print('no baseline at %s' % args.baseline, file=sys.stderr)
+		return
+	with open(args.baseline) as f:
+		baseline = json.load(f)['results']
+	regressions = compare(results, baseline, args.threshold)
+	for regression in regressions:
+		print('regression: ' + regression, file=sys.stderr)
+	if regressions:
+		sys.exit(1)
@@ -0,0 +1,138 @@
+'''
+aggregates over raw values. used by :meth:`levelorm.orm.BaseModel.aggregate`: ::
+
+	Animal.aggregate(sum='decibels', max=['decibels', 'legs'], group_by='shouts')
+	# {True: {'count': 2, 'sum': {'decibels': 182.0}, 'max': {'decibels': 95.0, 'legs': 4}}, False: {...}}
+	Animal.aggregate(histogram={'decibels': [40, 80, 120]}, start='a', stop='m')
+	# {'count': 3, 'histogram': {'decibels': [0, 1, 2, 0]}}
+
+only the fields that are needed are decoded (with a :meth:`levelorm.codec.Codec.projector`) and no instances
+are built. ``sum``, ``min``, ``max`` and ``histogram`` take ``Integer``, ``Float`` or ``Boolean`` fields.
+a histogram has a bucket for values less than the first edge, one between each pair of edges (including the
+lower one) and one for values from the last edge up. ``group_by`` is a value field or one of the fields of a
+:class:`levelorm.fields.CompositeKey`
+'''
+
+import bisect
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from . import fields
+
+Fieldnames = Union[str, Sequence[str], None]
+
+def _names(value: Fieldnames) -> List[str]:
+	if value is None:
+		return []
+	if isinstance(value, str):
+		return [value]
+	return list(value)
+
+class Aggregator:
+	''' accumulates the aggregates of one call of :meth:`levelorm.orm.BaseModel.aggregate` '''
+
+	def __init__(self, model, sum: Fieldnames = None, min: Fieldnames = None, max: Fieldnames = None,
+			histogram: Optional[Dict[str, Sequence[float]]] = None, group_by: Optional[str] = None) -> None:
+		codec = model._codec
+		self.sum = _names(sum)
+		self.min = _names(min)
+		self.max = _names(max)
+		self.histogram = {name: sorted(edges) for name, edges in (histogram or {}).items()}
+		self.group_by = group_by
+
+		wanted: List[str] = []
+		for name in self.sum + self.min + self.max + list(self.histogram):
+			i = codec.positions.get(name)
+			if i is None or not isinstance(codec.fields[i], fields.FixedWidthField):
+				raise ValueError('%r is not an Integer, Float or Boolean value field of %s' % (name, model.__name__))
+			if name not in wanted:
+				wanted.append(name)
+
+		# where the group comes from: the projected values or the deserialized key
+		self.group_position: Optional[int] = None
+		self.key_position: Optional[int] = None
+		self.deserialize_key = model._keyfield.deserialize_key
+		if group_by is not None:
+			keyfield = model._keyfield
+			if group_by in codec.positions:
+				if isinstance(codec.fields[codec.positions[group_by]], fields.Array):
+					raise ValueError('cannot group by the Array %r' % group_by)
+				if group_by not in wanted:
+					wanted.append(group_by)
+				self.group_position = wanted.index(group_by)
+			elif isinstance(keyfield, fields.CompositeKey) and group_by in keyfield.names:
+				self.key_position = keyfield.names.index(group_by)
+			else:
+				raise ValueError('%r is not a value field or part of a composite key of %s' % (group_by, model.__name__))
+
+		self.project = codec.projector(wanted) if wanted else None
+		self.sum_positions = [wanted.index(name) for name in self.sum]
+		self.min_positions = [wanted.index(name) for name in self.min]
+		self.max_positions = [wanted.index(name) for name in self.max]
+		self.histogram_positions = [(wanted.index(name), edges) for name, edges in self.histogram.items()]
+		# group: [count, sums, mins, maxes, histograms]
+		self.groups: Dict[Any, list] = {}
+
+	@property
+	def needs_key(self) -> bool:
+		return self.key_position is not None
+
+	@property
+	def needs_value(self) -> bool:
+		return self.project is not None
+
+	def _new_group(self) -> list:
+		return [
+			0,
+			[0] * len(self.sum),
+			[None] * len(self.min),
+			[None] * len(self.max),
+			[[0] * (len(edges) + 1) for edges in self.histogram.values()],
+		]
+
+	def add(self, key: Optional[bytes], data) -> None:
+		values = self.project(data) if self.project is not None else ()
+		if self.group_position is not None:
+			group = values[self.group_position]
+		elif self.key_position is not None:
+			group = self.deserialize_key(key)[self.key_position]
+		else:
+			group = None
+		state = self.groups.get(group)
+		if state is None:
+			state = self.groups[group] = self._new_group()
+
+		state[0] += 1
+		sums = state[1]
+		for j, position in enumerate(self.sum_positions):
+			sums[j] += values[position]
+		mins = state[2]
+		for j, position in enumerate(self.min_positions):
+			value = values[position]
+			if mins[j] is None or value < mins[j]:
+				mins[j] = value
+		maxes = state[3]
+		for j, position in enumerate(self.max_positions):
+			value = values[position]
+			if maxes[j] is None or value > maxes[j]:
+				maxes[j] = value
+		histograms = state[4]
+		for j, (position, edges) in enumerate(self.histogram_positions):
+			histograms[j][bisect.bisect_right(edges, values[position])] += 1
+
+	def _result(self, state: list) -> Dict[str, Any]:
+		result: Dict[str, Any] = {'count': state[0]}
+		if self.sum:
+			result['sum'] = dict(zip(self.sum, state[1]))
+		if self.min:
+			result['min'] = dict(zip(self.min, state[2]))
+		if self.max:
+			result['max'] = dict(zip(self.max, state[3]))
+		if self.histogram:
+			result['histogram'] = dict(zip(self.histogram, state[4]))
+		return result
+
+	def result(self) -> Dict[Any, Any]:
+		''' the aggregates, by group if there is a ``group_by`` '''
+		if self.group_by is None:
+			return self._result(self.groups.get(None) or self._new_group())
+		return {group: self._result(state) for group, state in self.groups.items()}
@@ -0,0 +1,113 @@
+'''
+asyncio versions of the :class:`levelorm.orm.BaseModel` methods. plyvel calls block, so these run them
+(and the decoding that follows) in the thread pool passed to :meth:`levelorm.db_base_model` as ``executor``
+(by default, a pool of :data:`DEFAULT_WORKERS` threads is created the first time one is used) ::
+
+	cow = await Animal.aget('cow')
+	async for animal in Animal.aiter(start='c', where=Animal.shouts):
+		...
+
+:meth:`levelorm.orm.BaseModel.batch` and :meth:`levelorm.orm.BaseModel.read_session` only apply to the thread
+that opened them, and these methods run in other threads, so an ``await x.asave()`` inside a ``with batch()``
+block is written right away and an ``aiter`` inside a ``with read_session()`` block doesn't read from its
+snapshot. use :meth:`AsyncMixin.asave_many` to write several records in one batch
+'''
+
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+import threading
+from typing import Any, AsyncIterator, Iterable, List, Optional
+
+DEFAULT_WORKERS = 4
+
+# python 3.6 doesn't have get_running_loop
+_get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+class AsyncMixin:
+	_executor: Optional[concurrent.futures.Executor] = None
+	_executor_lock: threading.Lock
+
+	__slots__ = ()
+
+	@classmethod
+	def _get_executor(cls) -> concurrent.futures.Executor:
+		if cls._executor is None:
+			with cls._executor_lock:
+				if cls._executor is None:
+					# store it where the lock is (the DBBaseModel) so every model shares it
+					owner: Any = next(base for base in cls.__mro__ if '_executor_lock' in vars(base))
+					owner._executor = concurrent.futures.ThreadPoolExecutor(DEFAULT_WORKERS, 'levelorm')
+		executor = cls._executor
+		assert executor is not None
+		return executor
+
+	@classmethod
+	async def _run(cls, func, *args, **kwargs):
+		loop = _get_running_loop()
+		return await loop.run_in_executor(cls._get_executor(), functools.partial(func, *args, **kwargs))
+
+	@classmethod
+	async def aget(cls, key, **kwargs):
+		''' :meth:`levelorm.orm.BaseModel.get` '''
+		return await cls._run(cls.get, key, **kwargs) # type: ignore
+
+	@classmethod
+	async def aget_many(cls, keys: Iterable, **kwargs) -> List[Any]:
+		''' :meth:`levelorm.orm.BaseModel.get_many` '''
+		return await cls._run(cls.get_many, list(keys), **kwargs) # type: ignore
+
+	async def asave(self, force: bool = False, expires_at: Optional[float] = None) -> None:
+		''' :meth:`levelorm.orm.BaseModel.save`. it isn't part of the calling thread's :meth:`levelorm.orm.BaseModel.batch` '''
+		await self._run(self.save, force, expires_at) # type: ignore
+
+	async def adelete(self) -> None:
+		''' :meth:`levelorm.orm.BaseModel.delete` '''
+		await self._run(self.delete) # type: ignore
+
+	@classmethod
+	async def asave_many(cls, instances: Iterable, **kwargs) -> None:
+		''' :meth:`levelorm.orm.BaseModel.save_many` (one write batch, written in one thread) '''
+		await cls._run(cls.save_many, list(instances), **kwargs) # type: ignore
+
+	@classmethod
+	async def adelete_many(cls, keys: Iterable, **kwargs) -> None:
+		''' :meth:`levelorm.orm.BaseModel.delete_many` '''
+		await cls._run(cls.delete_many, list(keys), **kwargs) # type: ignore
+
+	@classmethod
+	async def aiter(cls, chunk_size: int = 1000, **kwargs) -> AsyncIterator[Any]:
+		'''
+		:meth:`levelorm.orm.BaseModel.iter`. results are read and decoded ``chunk_size`` at a time in the
+		thread pool. the next chunk is fetched while the current one is being consumed but no further,
+		so a slow consumer doesn't buffer the whole range. the underlying iterator is closed when the
+		loop ends, breaks or is cancelled. it doesn't read through the calling thread's
+		:meth:`levelorm.orm.BaseModel.read_session`
+		'''
+		results = cls.iter(**kwargs) # type: ignore
+		def fetch():
+			return list(itertools.islice(results, chunk_size))
+
+		executor = cls._get_executor()
+		pending: Optional[concurrent.futures.Future] = None
+		def close():
+			# the generator can't be closed while another thread is advancing it
+			if pending is not None:
+				concurrent.futures.wait([pending])
+			results.close()
+
+		try:
+			pending = executor.submit(fetch)
+			while True:
+				chunk = await asyncio.wrap_future(pending)
+				if len(chunk) < chunk_size:
+					pending = None
+					for result in chunk:
+						yield result
+					break
+				pending = executor.submit(fetch)
+				for result in chunk:
+					yield result
+		finally:
+			await cls._run(close)
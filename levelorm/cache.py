@@ -0,0 +1,117 @@
+import collections
+import threading
+from typing import Any, Dict, Optional
+
+# returned by LRUCache.get for keys that are cached as missing
+ABSENT = object()
+
+# how many of the most recently invalidated keys an LRUCache remembers (see LRUCache.generation)
+INVALIDATIONS = 1024
+
+class LRUCache:
+	'''
+	a thread-safe least-recently-used cache of decoded records used by :meth:`levelorm.orm.BaseModel.get`.
+	bounded by ``max_entries`` and/or ``max_bytes`` (the sizes of the keys and raw values).
+	with ``negative=True``, keys that were not found are also cached (as :data:`ABSENT`).
+
+	a value read from the database can be replaced (and its key invalidated) before it is put in the cache.
+	readers call :meth:`generation` before reading and pass what it returned to :meth:`put`, which then
+	doesn't cache the value if its key was invalidated since
+	'''
+
+	def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+			negative: bool = False) -> None:
+		if max_entries is None and max_bytes is None:
+			raise ValueError('a cache needs max_entries or max_bytes')
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.negative = negative
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.size = 0
+		self._entries: 'collections.OrderedDict[bytes, Any]' = collections.OrderedDict()
+		self._lock = threading.Lock()
+		# incremented by every invalidation
+		self._generation = 0
+		# the generation of the last invalidation of the most recently invalidated keys
+		self._invalidations: 'collections.OrderedDict[bytes, int]' = collections.OrderedDict()
+		# values read before this generation can't be checked against _invalidations
+		self._oldest = 0
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def get(self, key: bytes) -> Any:
+		''' returns the cached value, :data:`ABSENT` for a cached miss or None if ``key`` is not cached '''
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return None
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return entry[0]
+
+	def generation(self) -> int:
+		''' the current generation, to pass to :meth:`put` along with a value read after calling this '''
+		with self._lock:
+			return self._generation
+
+	def put(self, key: bytes, value: Any, size: int, generation: Optional[int] = None) -> None:
+		'''
+		caches ``value``. if ``generation`` (from :meth:`generation`) is passed, nothing is cached if ``key``
+		was invalidated (or the cache cleared) since it was taken
+		'''
+		with self._lock:
+			if generation is not None and (generation < self._oldest or
+					self._invalidations.get(key, -1) > generation):
+				return
+			old = self._entries.pop(key, None)
+			if old is not None:
+				self.size -= old[1]
+			size += len(key)
+			self._entries[key] = (value, size)
+			self.size += size
+			self._evict()
+
+	def put_absent(self, key: bytes, generation: Optional[int] = None) -> None:
+		if self.negative:
+			self.put(key, ABSENT, 0, generation)
+
+	def invalidate(self, key: bytes) -> None:
+		with self._lock:
+			old = self._entries.pop(key, None)
+			if old is not None:
+				self.size -= old[1]
+			self._generation += 1
+			invalidations = self._invalidations
+			invalidations[key] = self._generation
+			invalidations.move_to_end(key)
+			if len(invalidations) > INVALIDATIONS:
+				_, self._oldest = invalidations.popitem(last=False)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._entries.clear()
+			self.size = 0
+			self._generation += 1
+			self._invalidations.clear()
+			self._oldest = self._generation
+
+	def stats(self) -> Dict[str, int]:
+		return {
+			'entries': len(self._entries),
+			'bytes': self.size,
+			'hits': self.hits,
+			'misses': self.misses,
+			'evictions': self.evictions,
+		}
+
+	def _evict(self) -> None:
+		entries = self._entries
+		while entries and ((self.max_entries is not None and len(entries) > self.max_entries) or
+				(self.max_bytes is not None and self.size > self.max_bytes)):
+			_, (_, size) = entries.popitem(last=False)
+			self.size -= size
+			self.evictions += 1
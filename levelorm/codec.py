@@ -0,0 +1,251 @@
+import struct
+from typing import Any, Callable, Dict, List, Sequence, Tuple, cast
+
+from . import fields
+
+# indexed by ``length & 3``; the number of zero bytes needed to reach the next 4-byte boundary
+PADDING = (b'', b'\0\0\0', b'\0\0', b'\0')
+# stands in for the values of fields :meth:`Codec.changes` should leave alone
+MISSING = object()
+
+def _run_format(field: fields.BaseField):
+	'''
+	returns the format (including alignment padding) this field contributes to a run of fixed-width fields
+	or None if it has to be packed by itself
+	'''
+	if not isinstance(field, fields.FixedWidthField):
+		return None
+	fmt = field.struct.format
+	if isinstance(fmt, bytes): # python 3.6
+		fmt = fmt.decode('ascii')
+	if fmt[0] == '@':
+		fmt = fmt[1:]
+	elif fmt[0] in '=<>!':
+		return None
+	if struct.calcsize('=' + fmt) != field.struct.size: # native and standard sizes differ on this platform
+		return None
+	return fmt + 'x' * (-field.struct.size & 3)
+
+def _field_size(field: fields.FixedWidthField) -> int:
+	''' the size of a fixed-width field including its alignment padding '''
+	return field.struct.size + (-field.struct.size & 3)
+
+class Codec:
+	'''
+	a specialized encoder/decoder for the non-key fields of a model, generated once by
+	:class:`levelorm.orm.ModelMeta`.
+
+	consecutive :class:`levelorm.fields.FixedWidthField` members (and their alignment padding) are packed
+	and unpacked with a single :class:`struct.Struct`. other fields are read with straight-line offset
+	arithmetic over the value instead of a stream. the output is byte-for-byte what
+	:meth:`levelorm.fields.BaseField.serialize` followed by 4-byte alignment produces.
+
+	:attr:`offsets` returns where each field starts in an encoded value without decoding any of them
+	and :meth:`projector` builds decoders for a subset of the fields.
+	:meth:`changes` and :meth:`splice` re-encode only some fields of an encoded value.
+
+	``header`` (a multiple of 4 bytes, so the fields' alignment doesn't change) is written before the fields.
+	it is skipped without being checked when decoding. see :mod:`levelorm.compact` for the unpadded format
+	'''
+
+	format = 'padded'
+
+	def __init__(self, value_fields: Sequence[Tuple[str, fields.BaseField]], header: bytes = b'') -> None:
+		if len(header) & 3:
+			raise ValueError('the header must be a multiple of 4 bytes long')
+		self.header = header
+		self.names = tuple(name for name, _ in value_fields)
+		self.fields = tuple(field for _, field in value_fields)
+		self.positions = {name: i for i, name in enumerate(self.names)}
+		# positions of fields whose decoded values can be mutated in place
+		self.mutable = tuple(i for i, field in enumerate(self.fields) if isinstance(field, fields.Array) and not field.view)
+		# unpack_from of each field: (encoded value, offset) to (value, offset just past it)
+		self.unpackers = tuple(field.unpack_from for field in self.fields)
+		self.encode: Callable[[Sequence[Any]], bytes]
+		self.decode: Callable[[Any], Tuple[Any, ...]]
+		self.offsets: Callable[[Any], Tuple[int, ...]]
+		# the offset of each field if it doesn't depend on the lengths of earlier fields, otherwise None
+		self.static_offsets: List[Any] = [None] * len(self.fields)
+		self._namespace: Dict[str, Any] = {'PADDING': PADDING, 'HEADER': header}
+		self._steps = self._group_steps()
+		self._projectors: Dict[Tuple[str, ...], Callable[[Any], Tuple[Any, ...]]] = {}
+		self.encode, self.decode, self.offsets = self._compile()
+
+	def _group_steps(self) -> List[Tuple[List[int], Any]]:
+		''' groups field indexes into runs of fixed-width fields (with a :class:`struct.Struct`) and single fields '''
+		steps: List[Tuple[List[int], Any]] = []
+		run: List[int] = []
+		run_format = ''
+		for i, field in enumerate(self.fields):
+			fmt = _run_format(field)
+			if fmt is None:
+				if run:
+					steps.append((run, struct.Struct('=' + run_format)))
+					run, run_format = [], ''
+				steps.append(([i], None))
+			else:
+				run.append(i)
+				run_format += fmt
+		if run:
+			steps.append((run, struct.Struct('=' + run_format)))
+		return steps
+
+	def _fixed(self, i: int) -> fields.FixedWidthField:
+		''' field ``i``, which is in a run of fixed-width fields '''
+		return cast(fields.FixedWidthField, self.fields[i])
+
+	def projector(self, wanted: Sequence[str]) -> Callable[[Any], Tuple[Any, ...]]:
+		'''
+		returns a function that decodes only the fields named in ``wanted`` (in that order) from an encoded value.
+		fields before them are skipped using their fixed widths and length prefixes and fields after the last one
+		aren't looked at
+		'''
+		wanted = tuple(wanted)
+		project = self._projectors.get(wanted)
+		if project is None:
+			indexes = []
+			for name in wanted:
+				if name not in self.positions:
+					raise ValueError('%r is not a value field' % name)
+				indexes.append(self.positions[name])
+			project = self._projectors[wanted] = self._compile_decode(indexes, 'project')
+		return project
+
+	def changes(self, data, offsets: Sequence[int], values: Sequence[Any]) -> Dict[int, bytes]:
+		'''
+		the positions and (padded) encodings of the fields whose value in ``values`` encodes differently from
+		the one in ``data``, an encoded value whose :attr:`offsets` are ``offsets``.
+		fields whose value is :data:`MISSING` are not looked at
+		'''
+		changes = {}
+		end = len(data)
+		for i in range(len(self.fields) - 1, -1, -1):
+			value = values[i]
+			start = offsets[i]
+			if value is not MISSING:
+				packed = self.fields[i].pack(value)
+				packed += PADDING[len(packed) & 3]
+				if data[start:end] != packed:
+					changes[i] = packed
+			end = start
+		return changes
+
+	def splice(self, data, offsets: Sequence[int], changes: Dict[int, bytes]) -> bytes:
+		''' ``data`` with the fields in ``changes`` (as returned by :meth:`changes`) replaced '''
+		if not changes:
+			return bytes(data)
+		parts = []
+		previous = 0
+		for i in sorted(changes):
+			parts.append(data[previous:offsets[i]])
+			parts.append(changes[i])
+			previous = offsets[i + 1] if i + 1 < len(offsets) else len(data)
+		parts.append(data[previous:])
+		return b''.join(parts)
+
+	def _compile(self):
+		for i, field in enumerate(self.fields):
+			self._namespace['pack%d' % i] = field.pack
+			self._namespace['unpack%d' % i] = field.unpack_from
+			self._namespace['skip%d' % i] = field.skip
+		for n, (_, run_struct) in enumerate(self._steps):
+			self._namespace['run%d' % n] = run_struct
+		return self._compile_encode(), self._compile_decode(range(len(self.fields)), 'decode'), self._compile_offsets()
+
+	def _exec(self, lines: List[str], name: str):
+		exec('\n'.join(lines), self._namespace) # pylint: disable=exec-used
+		return self._namespace.pop(name)
+
+	def _compile_encode(self):
+		all_vars = ''.join('v%d, ' % i for i in range(len(self.fields)))
+		lines = ['def encode(values):']
+		if self.fields:
+			lines.append('\t%s= values' % all_vars)
+		parts = ['HEADER'] if self.header else []
+		for n, (indexes, run_struct) in enumerate(self._steps):
+			if run_struct is None:
+				i = indexes[0]
+				lines.append('\tp%d = pack%d(v%d)' % (i, i, i))
+				parts.append('p%d, PADDING[len(p%d) & 3]' % (i, i))
+			else:
+				for i in indexes:
+					if isinstance(self.fields[i], fields.Boolean):
+						lines.append("\tif not isinstance(v%d, bool): raise TypeError('expected bool, got %%r' %% (v%d,))" % (i, i))
+				parts.append('run%d.pack(%s)' % (n, ', '.join('v%d' % i for i in indexes)))
+		lines.append("\treturn b''.join((%s))" % ''.join(part + ', ' for part in parts))
+		return self._exec(lines, 'encode')
+
+	def _compile_decode(self, wanted: Sequence[int], name: str):
+		wanted_set = set(wanted)
+		last = max(wanted_set, default=-1)
+		lines = ['def %s(data):' % name]
+		offset: Any = len(self.header) # statically known until the first variable-length field
+		for n, (indexes, run_struct) in enumerate(self._steps):
+			if indexes[0] > last:
+				break
+			if run_struct is None:
+				i = indexes[0]
+				field = self.fields[i]
+				if offset is not None:
+					lines.append('\toffset = %d' % offset)
+					offset = None
+				if i not in wanted_set:
+					lines.append('\toffset = skip%d(data, offset)' % i)
+					lines.append('\toffset += -offset & 3')
+				elif isinstance(field, (fields.String, fields.Blob)):
+					# inlined unpack_from
+					self._namespace['length%d' % i] = field.length_struct.unpack_from
+					lines.append('\tend = offset + 4 + length%d(data, offset)[0]' % i)
+					if isinstance(field, fields.String):
+						lines.append('\tv%d = str(data[offset + 4:end], %r)' % (i, field.encoding))
+					else:
+						lines.append('\tv%d = bytes(data[offset + 4:end])' % i)
+					lines.append('\toffset = end + (-end & 3)')
+				else:
+					lines.append('\tv%d, offset = unpack%d(data, offset)' % (i, i))
+					lines.append('\toffset += -offset & 3')
+			else:
+				position = str(offset) if offset is not None else 'offset'
+				if wanted_set.issuperset(indexes):
+					lines.append('\t%s, = run%d.unpack_from(data, %s)' % (', '.join('v%d' % i for i in indexes), n, position))
+				else:
+					relative = 0
+					for i in indexes:
+						if i in wanted_set:
+							self._namespace['struct%d' % i] = self._fixed(i).struct
+							lines.append('\tv%d, = struct%d.unpack_from(data, %s + %d)' % (i, i, position, relative))
+						relative += _field_size(self._fixed(i))
+				if offset is not None:
+					offset += run_struct.size
+				else:
+					lines.append('\toffset += %d' % run_struct.size)
+		lines.append('\treturn (%s)' % ''.join('v%d, ' % i for i in wanted))
+		return self._exec(lines, name)
+
+	def _compile_offsets(self):
+		lines = ['def offsets(data):']
+		offset: Any = len(self.header)
+		for indexes, run_struct in self._steps:
+			if run_struct is None:
+				i = indexes[0]
+				if offset is not None:
+					lines.append('\to%d = offset = %d' % (i, offset))
+					self.static_offsets[i] = offset
+					offset = None
+				else:
+					lines.append('\to%d = offset' % i)
+				lines.append('\toffset = skip%d(data, offset)' % i)
+				lines.append('\toffset += -offset & 3')
+			elif offset is not None:
+				for i in indexes:
+					lines.append('\to%d = %d' % (i, offset))
+					self.static_offsets[i] = offset
+					offset += _field_size(self._fixed(i))
+			else:
+				relative = 0
+				for i in indexes:
+					lines.append('\to%d = offset + %d' % (i, relative))
+					relative += _field_size(self.fields[i])
+				lines.append('\toffset += %d' % run_struct.size)
+		lines.append('\treturn (%s)' % ''.join('o%d, ' % i for i in range(len(self.fields))))
+		return self._exec(lines, 'offsets')
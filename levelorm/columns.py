@@ -0,0 +1,160 @@
+'''
+decodes fixed-width fields of many records straight into arrays. used by
+:meth:`levelorm.orm.BaseModel.scan_columns`.
+
+columns are `numpy <https://numpy.org/>`_ arrays if numpy is installed, otherwise :class:`array.array`
+'''
+
+import array
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import fields
+from .codec import Codec
+
+numpy: Any
+try:
+	import numpy as _numpy
+	numpy = _numpy
+except ImportError:
+	numpy = None
+
+def _format(field: fields.FixedWidthField) -> str:
+	fmt = field.struct.format
+	if isinstance(fmt, bytes): # python 3.6
+		fmt = fmt.decode('ascii')
+	return fmt.lstrip('@')
+
+def _typecode(field: fields.FixedWidthField) -> str:
+	''' the :class:`array.array` typecode a fixed-width field is decoded into '''
+	fmt = _format(field)
+	if fmt == '?':
+		return 'B'
+	if fmt not in array.typecodes or array.array(fmt).itemsize != field.struct.size:
+		raise ValueError('%s cannot be decoded into a column' % field.__class__.__name__)
+	return fmt
+
+def _finish(column: array.array, field: Optional[fields.BaseField]):
+	''' converts a filled :class:`array.array` into the returned column type '''
+	if numpy is None:
+		return column
+	result = numpy.frombuffer(column, dtype=column.typecode) if len(column) else numpy.empty(0, column.typecode)
+	if isinstance(field, fields.Boolean):
+		result = result.view(numpy.bool_)
+	return result
+
+class ColumnScanner:
+	'''
+	collects ``names`` (fixed-width fields or :class:`levelorm.fields.Array` of a fixed-width field)
+	from raw values. ``Array`` columns are returned as ``(offsets, values)`` where the elements of row ``i``
+	are ``values[offsets[i]:offsets[i + 1]]``
+	'''
+
+	def __init__(self, codec: Codec, names: Sequence[str]) -> None:
+		self.codec = codec
+		self.names = list(names)
+		self.indexes: List[int] = []
+		self.ragged: List[bool] = []
+		# the field of each column or, for Array columns, of its elements
+		self.elements: List[fields.FixedWidthField] = []
+		for name in self.names:
+			try:
+				i = codec.positions[name]
+			except KeyError as e:
+				raise ValueError('%r is not a value field' % name) from e
+			field = codec.fields[i]
+			if isinstance(field, fields.Array):
+				field = field.inner
+				ragged = True
+			else:
+				ragged = False
+			if not isinstance(field, fields.FixedWidthField):
+				raise ValueError('%r is not a fixed-width field or an Array of one' % name)
+			_typecode(field) # validate
+			self.indexes.append(i)
+			self.ragged.append(ragged)
+			self.elements.append(field)
+
+		# if every column is at a fixed offset, one struct unpacks a whole row
+		self.row_struct = None
+		if codec.format == 'padded' and not any(self.ragged) and all(codec.static_offsets[i] is not None for i in self.indexes):
+			fmt = '='
+			position = 0
+			element_fields = dict(zip(self.indexes, self.elements))
+			for i in sorted(element_fields):
+				fmt += 'x' * (codec.static_offsets[i] - position) + _format(element_fields[i])
+				position = codec.static_offsets[i] + element_fields[i].struct.size
+			self.row_struct = struct.Struct(fmt)
+			self.row_positions = [sorted(set(self.indexes)).index(i) for i in self.indexes]
+
+	def scan(self, values: Iterable[bytes]) -> Dict[str, Any]:
+		codec = self.codec
+		columns: List[Any] = []
+		for ragged, element in zip(self.ragged, self.elements):
+			if ragged:
+				columns.append((array.array('q', [0]), array.array(_typecode(element))))
+			else:
+				columns.append(array.array(_typecode(element)))
+
+		if self.row_struct is not None:
+			unpack_from = self.row_struct.unpack_from
+			appends = [column.append for column in columns]
+			pairs = list(zip(appends, self.row_positions))
+			for data in values:
+				row = unpack_from(data)
+				for append, position in pairs:
+					append(row[position])
+		else:
+			readers = [self._reader(i, ragged, element, column)
+					for i, ragged, element, column in zip(self.indexes, self.ragged, self.elements, columns)]
+			offsets = codec.offsets
+			for data in values:
+				field_offsets = offsets(data)
+				for reader in readers:
+					reader(data, field_offsets)
+
+		result = {}
+		for name, ragged, element, column in zip(self.names, self.ragged, self.elements, columns):
+			if ragged:
+				result[name] = (_finish(column[0], None), _finish(column[1], element))
+			else:
+				result[name] = _finish(column, element)
+		return result
+
+	def _reader(self, i: int, ragged: bool, element: fields.FixedWidthField, column):
+		''' a function that reads field ``i`` (of its elements if it is ``ragged``) from a value into ``column`` '''
+		if self.codec.format == 'compact':
+			unpack = self.codec.unpackers[i]
+			if not ragged:
+				append = column.append
+				def read_compact(data, offsets):
+					append(unpack(data, offsets[i])[0])
+				return read_compact
+			row_offsets, elements = column
+			def read_compact_ragged(data, offsets):
+				elements.extend(unpack(data, offsets[i])[0])
+				row_offsets.append(len(elements))
+			return read_compact_ragged
+		if not ragged:
+			unpack_from = element.struct.unpack_from
+			append = column.append
+			def read(data, offsets):
+				append(unpack_from(data, offsets[i])[0])
+			return read
+
+		row_offsets, elements = column
+		size = element.struct.size
+		length_unpack_from = fields.Array.length_struct.unpack_from
+		def read_ragged(data, offsets):
+			start = offsets[i] + 4
+			length = length_unpack_from(data, offsets[i])[0]
+			elements.frombytes(data[start:start + length * size])
+			row_offsets.append(len(elements))
+		return read_ragged
+
+def split_keys(items: Iterable[Tuple[bytes, bytes]], keys: list) -> Iterable[bytes]:
+	''' yields the values of ``(key, value)`` pairs, appending the keys to ``keys`` '''
+	append = keys.append
+	for key, data in items:
+		append(key)
+		yield data
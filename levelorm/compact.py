@@ -0,0 +1,467 @@
+'''
+the compact storage format. a model that sets ``format = 'compact'`` stores its values without the 4-byte
+alignment of :class:`levelorm.codec.Codec`: ::
+
+	class Reading(DBBaseModel):
+		prefix = 'reading'
+		format = 'compact'
+		sensor = String(key=True)
+		ok = Boolean()
+		value = Integer(bits=64)
+		label = String()
+
+a compact value is (after any :mod:`levelorm.schema` header) a bitmap of the model's ``Boolean`` fields
+(the first one in the lowest bit of the first byte, ``(n + 7) // 8`` bytes for ``n`` of them) followed by
+every other value field in the order they are defined, with nothing in between:
+
+* ``Integer``: a zigzag-encoded varint (LEB128, 7 bits per byte, least significant first), so small numbers of
+  either sign take one byte. values must still fit in the field's ``bits``
+* ``Float``: 8 bytes, little-endian
+* ``String`` and ``Blob``: a varint length and the bytes
+* ``Array``: a varint length and the elements encoded like fields of their type, except that ``Boolean``
+  elements are bit-packed like the bitmap and ``Float`` elements are packed together. arrays can't be views
+* other fields: however the field packs itself
+
+every byte order is explicit, so compact values read the same on every platform. keys and index entries are
+stored the same way in both formats.
+
+the offsets of ``Boolean`` fields and of ``Float`` fields that come before any ``Integer``, ``String``, ``Blob``
+or ``Array`` don't depend on the value, so conditions and columns on them read them directly.
+
+to convert a model's existing records, give it a new ``version`` and describe the old one as
+``schema.Version(fields, schema.unchanged, format='padded')``; they are converted when they are read with
+``migrate_on_read`` or by :meth:`levelorm.orm.BaseModel.migrator` (see :mod:`levelorm.schema`). as with other
+records without a version header, that only works if a padded record can't start with
+:data:`levelorm.schema.MAGIC`
+'''
+
+import array
+import struct
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, cast
+
+from . import fields
+from .codec import MISSING, Codec
+from .exceptions import InvalidModel
+
+FORMATS = ('padded', 'compact')
+
+_float = struct.Struct('<d')
+_byte = tuple(bytes((n,)) for n in range(0x100))
+
+def pack_uvarint(n: int) -> bytes:
+	if n < 0:
+		raise ValueError('varints cannot be negative: %d' % n)
+	if n < 0x80:
+		return _byte[n]
+	out = bytearray()
+	while n >= 0x80:
+		out.append(n & 0x7f | 0x80)
+		n >>= 7
+	out.append(n)
+	return bytes(out)
+
+def unpack_uvarint_from(data, offset: int) -> Tuple[int, int]:
+	''' returns the varint starting at ``offset`` and the offset just past it '''
+	b = data[offset]
+	if b < 0x80:
+		return b, offset + 1
+	n = b & 0x7f
+	shift = 7
+	while True:
+		offset += 1
+		b = data[offset]
+		n |= (b & 0x7f) << shift
+		if b < 0x80:
+			return n, offset + 1
+		shift += 7
+
+def skip_uvarint(data, offset: int) -> int:
+	while data[offset] >= 0x80:
+		offset += 1
+	return offset + 1
+
+def zigzag(n: int) -> int:
+	''' maps signed integers to unsigned ones so that small magnitudes stay small: 0, -1, 1, -2 to 0, 1, 2, 3 '''
+	return n << 1 if n >= 0 else (~n << 1) | 1
+
+def pack_bits(values: Sequence[bool]) -> bytes:
+	bits = 0
+	for i, value in enumerate(values):
+		if not isinstance(value, bool):
+			raise TypeError('expected bool, got %r' % (value,))
+		bits |= value << i
+	return bits.to_bytes((len(values) + 7) >> 3, 'little')
+
+def unpack_bits_from(data, offset: int, count: int) -> List[bool]:
+	end = offset + ((count + 7) >> 3)
+	bits = int.from_bytes(data[offset:end], 'little')
+	return [bits >> i & 1 != 0 for i in range(count)]
+
+def unpack_bytes_from(data, offset: int) -> Tuple[bytes, int]:
+	''' the bytes of a compact ``String`` or ``Blob`` (without decoding them) and the offset just past them '''
+	length = data[offset]
+	if length < 0x80:
+		offset += 1
+	else:
+		length, offset = unpack_uvarint_from(data, offset)
+	end = offset + length
+	return bytes(data[offset:end]), end
+
+def _skip_bytes(data, offset: int) -> int:
+	length, offset = unpack_uvarint_from(data, offset)
+	return offset + length
+
+# pack, unpack_from and skip for the compact encoding of one field
+Functions = Tuple[Callable[[Any], bytes], Callable[[Any, int], Tuple[Any, int]], Callable[[Any, int], int]]
+
+def _integer_functions(field: fields.Integer) -> Functions:
+	low = -1 << (field.bits - 1)
+	high = (1 << (field.bits - 1)) - 1
+
+	def pack(value):
+		if not low <= value <= high:
+			raise struct.error('%d does not fit in a %d-bit Integer' % (value, field.bits))
+		return pack_uvarint(zigzag(value))
+
+	def unpack_from(data, offset):
+		z = data[offset]
+		if z >= 0x80:
+			z, offset = unpack_uvarint_from(data, offset)
+		else:
+			offset += 1
+		return (z >> 1) ^ -(z & 1), offset
+
+	return pack, unpack_from, skip_uvarint
+
+def _string_functions(field: fields.String) -> Functions:
+	encoding = field.encoding
+
+	def pack(value):
+		encoded = value.encode(encoding)
+		return pack_uvarint(len(encoded)) + encoded
+
+	def unpack_from(data, offset):
+		length = data[offset]
+		if length < 0x80:
+			offset += 1
+		else:
+			length, offset = unpack_uvarint_from(data, offset)
+		end = offset + length
+		return str(data[offset:end], encoding), end
+
+	return pack, unpack_from, _skip_bytes
+
+def _pack_blob(value: bytes) -> bytes:
+	if not isinstance(value, (bytes, bytearray)):
+		raise TypeError('expected bytes, got %r' % (value,))
+	return pack_uvarint(len(value)) + value
+
+def _array_functions(field: fields.Array) -> Functions:
+	inner = field.inner
+	bulk_char = field.bulk_format[1] if field.bulk_format is not None else None
+
+	def as_list(value):
+		if bulk_char is not None and isinstance(value, (memoryview, array.array)):
+			value_format = value.format if isinstance(value, memoryview) else value.typecode
+			if value_format != bulk_char:
+				raise TypeError('expected elements of format %r, got %r' % (bulk_char, value_format))
+			return value.tolist()
+		if not isinstance(value, list):
+			raise TypeError('expected list, got %r' % (value,))
+		return value
+
+	if isinstance(inner, fields.Boolean):
+		def pack_bools(value):
+			value = as_list(value)
+			return pack_uvarint(len(value)) + pack_bits(value)
+
+		def unpack_bools(data, offset):
+			count, offset = unpack_uvarint_from(data, offset)
+			return unpack_bits_from(data, offset, count), offset + ((count + 7) >> 3)
+
+		def skip_bools(data, offset):
+			count, offset = unpack_uvarint_from(data, offset)
+			return offset + ((count + 7) >> 3)
+
+		return pack_bools, unpack_bools, skip_bools
+
+	if isinstance(inner, fields.Float):
+		def pack_floats(value):
+			value = as_list(value)
+			return pack_uvarint(len(value)) + struct.pack('<%dd' % len(value), *value)
+
+		def unpack_floats(data, offset):
+			count, offset = unpack_uvarint_from(data, offset)
+			return list(struct.unpack_from('<%dd' % count, data, offset)), offset + 8 * count
+
+		def skip_floats(data, offset):
+			count, offset = unpack_uvarint_from(data, offset)
+			return offset + 8 * count
+
+		return pack_floats, unpack_floats, skip_floats
+
+	pack_inner, unpack_inner, skip_inner = functions(inner)
+
+	def pack(value):
+		value = as_list(value)
+		return pack_uvarint(len(value)) + b''.join([pack_inner(element) for element in value])
+
+	def unpack_from(data, offset):
+		count, offset = unpack_uvarint_from(data, offset)
+		value = []
+		append = value.append
+		for _ in range(count):
+			element, offset = unpack_inner(data, offset)
+			append(element)
+		return value, offset
+
+	def skip(data, offset):
+		count, offset = unpack_uvarint_from(data, offset)
+		for _ in range(count):
+			offset = skip_inner(data, offset)
+		return offset
+
+	return pack, unpack_from, skip
+
+def functions(field: fields.BaseField) -> Functions:
+	''' the compact ``pack``, ``unpack_from`` and ``skip`` of a field that isn't stored in the bitmap '''
+	if isinstance(field, fields.Integer):
+		return _integer_functions(field)
+	if isinstance(field, fields.Float):
+		def unpack_float(data, offset):
+			return _float.unpack_from(data, offset)[0], offset + 8
+		def skip_float(data, offset):
+			return offset + 8
+		return _float.pack, unpack_float, skip_float
+	if isinstance(field, fields.String):
+		return _string_functions(field)
+	if isinstance(field, fields.Blob):
+		return _pack_blob, unpack_bytes_from, _skip_bytes
+	if isinstance(field, fields.Array):
+		if field.view:
+			raise InvalidModel('Arrays with view=True need the padded format')
+		return _array_functions(field)
+	return field.pack, field.unpack_from, field.skip
+
+def _fixed_size(field: fields.BaseField) -> Optional[int]:
+	''' the size of a field that always takes the same number of bytes in the compact format, otherwise None '''
+	if isinstance(field, fields.Float):
+		return 8
+	if isinstance(field, fields.FixedWidthField) and not isinstance(field, fields.Integer):
+		return field.struct.size
+	return None
+
+class CompactCodec(Codec):
+	'''
+	a :class:`levelorm.codec.Codec` for the compact format, with the same methods. ``header`` can be any length.
+	created by :class:`levelorm.orm.ModelMeta` for models with ``format = 'compact'``
+	'''
+
+	format = 'compact'
+	# reads a String or Blob without decoding it
+	unpack_bytes_from = staticmethod(unpack_bytes_from)
+
+	# pylint: disable=super-init-not-called
+	def __init__(self, value_fields: Sequence[Tuple[str, fields.BaseField]], header: bytes = b'') -> None:
+		self.header = header
+		self.names = tuple(name for name, _ in value_fields)
+		self.fields = tuple(field for _, field in value_fields)
+		self.positions = {name: i for i, name in enumerate(self.names)}
+		self.mutable = tuple(i for i, field in enumerate(self.fields) if isinstance(field, fields.Array))
+		self.static_offsets = [None] * len(self.fields)
+		# the bit of each Boolean field in the bitmap
+		booleans = [i for i, field in enumerate(self.fields) if isinstance(field, fields.Boolean)]
+		self.bits = {i: bit for bit, i in enumerate(booleans)}
+		self.bitmap_size = (len(self.bits) + 7) >> 3
+		# the other fields, in the order they are stored
+		self.stored = [i for i in range(len(self.fields)) if i not in self.bits]
+		self._namespace = {'HEADER': header, 'BYTE': _byte, 'pack_uvarint': pack_uvarint,
+				'unpack_uvarint_from': unpack_uvarint_from}
+		self._projectors = {}
+
+		packers: List[Any] = [None] * len(self.fields)
+		unpackers: List[Any] = [None] * len(self.fields)
+		for i, field in enumerate(self.fields):
+			if i in self.bits:
+				packers[i] = field.pack
+				unpackers[i] = self._bit_unpacker(self.bits[i])
+				continue
+			pack, unpack_from, skip = functions(field)
+			packers[i] = pack
+			unpackers[i] = unpack_from
+			self._namespace['pack%d' % i] = pack
+			self._namespace['unpack%d' % i] = unpack_from
+			self._namespace['skip%d' % i] = skip
+			if isinstance(field, fields.Float):
+				self._namespace['struct%d' % i] = _float
+			elif _fixed_size(field) is not None:
+				self._namespace['struct%d' % i] = cast(fields.FixedWidthField, field).struct
+		self.packers = tuple(packers)
+		self.unpackers = tuple(unpackers)
+		self.encode = self._compile_encode()
+		self.decode = self._compile_decode(range(len(self.fields)), 'decode')
+		self.offsets = self._compile_offsets()
+
+	@staticmethod
+	def _bit_unpacker(bit: int):
+		mask = 1 << (bit & 7)
+		def unpack_bit(data, offset):
+			# offset is the byte of the bitmap this field's bit is in
+			return data[offset] & mask != 0, offset + 1
+		return unpack_bit
+
+	def changes(self, data, offsets: Sequence[int], values: Sequence[Any]) -> Dict[int, bytes]:
+		changes = {}
+		end = len(data)
+		for i in reversed(self.stored):
+			value = values[i]
+			start = offsets[i]
+			if value is not MISSING:
+				packed = self.packers[i](value)
+				if data[start:end] != packed:
+					changes[i] = packed
+			end = start
+		for i, bit in self.bits.items():
+			value = values[i]
+			if value is not MISSING:
+				packed = self.packers[i](value)
+				if (data[offsets[i]] >> (bit & 7) & 1) != packed[0]:
+					changes[i] = packed
+		return changes
+
+	def splice(self, data, offsets: Sequence[int], changes: Dict[int, bytes]) -> bytes:
+		if not changes:
+			return bytes(data)
+		start = len(self.header)
+		previous = start + self.bitmap_size
+		bitmap = bytearray(data[start:previous])
+		parts: List[Any] = [data[:start], bitmap]
+		ends = dict(zip(self.stored, [offsets[i] for i in self.stored[1:]] + [len(data)]))
+		for i in sorted(changes):
+			if i in self.bits:
+				bit = self.bits[i]
+				if changes[i][0]:
+					bitmap[bit >> 3] |= 1 << (bit & 7)
+				else:
+					bitmap[bit >> 3] &= ~(1 << (bit & 7)) & 0xff
+				continue
+			parts.append(data[previous:offsets[i]])
+			parts.append(changes[i])
+			previous = ends[i]
+		parts.append(data[previous:])
+		return b''.join(parts)
+
+	def _bitmap_lines(self, wanted: Sequence[int]) -> List[str]:
+		''' lines setting v<i> for each wanted Boolean field from the bitmap '''
+		wanted_bits = [i for i in wanted if i in self.bits]
+		if not wanted_bits:
+			return []
+		start = len(self.header)
+		if self.bitmap_size == 1:
+			lines = ['\tbits = data[%d]' % start]
+		else:
+			lines = ["\tbits = int.from_bytes(data[%d:%d], 'little')" % (start, start + self.bitmap_size)]
+		for i in wanted_bits:
+			lines.append('\tv%d = bits & %d != 0' % (i, 1 << self.bits[i]))
+		return lines
+
+	def _compile_encode(self):
+		all_vars = ''.join('v%d, ' % i for i in range(len(self.fields)))
+		lines = ['def encode(values):']
+		if self.fields:
+			lines.append('\t%s= values' % all_vars)
+		parts = ['HEADER'] if self.header else []
+		if self.bits:
+			for i in self.bits:
+				lines.append("\tif not isinstance(v%d, bool): raise TypeError('expected bool, got %%r' %% (v%d,))" % (i, i))
+			bits = ' | '.join('v%d << %d' % (i, bit) if bit else 'v%d' % i for i, bit in self.bits.items())
+			if self.bitmap_size == 1:
+				parts.append('BYTE[%s]' % bits)
+			else:
+				parts.append("(%s).to_bytes(%d, 'little')" % (bits, self.bitmap_size))
+		for i in self.stored:
+			field = self.fields[i]
+			if isinstance(field, (fields.String, fields.Blob)):
+				# inlined pack
+				if isinstance(field, fields.String):
+					lines.append('	v%d = v%d.encode(%r)' % (i, i, field.encoding))
+				lines.append('	n%d = len(v%d)' % (i, i))
+				parts.append('BYTE[n%d] if n%d < 128 else pack_uvarint(n%d), v%d' % (i, i, i, i))
+			else:
+				parts.append('pack%d(v%d)' % (i, i))
+		lines.append("\treturn b''.join((%s))" % ''.join(part + ', ' for part in parts))
+		return self._exec(lines, 'encode')
+
+	def _compile_decode(self, wanted: Sequence[int], name: str):
+		wanted_set = set(wanted)
+		lines = ['def %s(data):' % name] + self._bitmap_lines(wanted)
+		last = max(wanted_set - set(self.bits), default=-1)
+		offset: Any = len(self.header) + self.bitmap_size # statically known until the first variable-length field
+		for i in self.stored:
+			if i > last:
+				break
+			size = _fixed_size(self.fields[i])
+			if size is not None:
+				position = str(offset) if offset is not None else 'offset'
+				if i in wanted_set:
+					lines.append('\tv%d, = struct%d.unpack_from(data, %s)' % (i, i, position))
+				if offset is not None:
+					offset += size
+				else:
+					lines.append('\toffset += %d' % size)
+				continue
+			if offset is not None:
+				lines.append('\toffset = %d' % offset)
+				offset = None
+			field = self.fields[i]
+			if i in wanted_set and isinstance(field, (fields.String, fields.Blob)):
+				# inlined unpack_from
+				lines.append('\tlength = data[offset]')
+				lines.append('\tif length < 128: offset += 1')
+				lines.append('\telse: length, offset = unpack_uvarint_from(data, offset)')
+				lines.append('\tend = offset + length')
+				if isinstance(field, fields.String):
+					lines.append('\tv%d = str(data[offset:end], %r)' % (i, field.encoding))
+				else:
+					lines.append('\tv%d = bytes(data[offset:end])' % i)
+				lines.append('\toffset = end')
+			elif i in wanted_set:
+				lines.append('\tv%d, offset = unpack%d(data, offset)' % (i, i))
+			else:
+				lines.append('\toffset = skip%d(data, offset)' % i)
+		lines.append('\treturn (%s)' % ''.join('v%d, ' % i for i in wanted))
+		return self._exec(lines, name)
+
+	def _compile_offsets(self):
+		lines = ['def offsets(data):']
+		start = len(self.header)
+		for i, bit in self.bits.items():
+			lines.append('\to%d = %d' % (i, start + (bit >> 3)))
+			self.static_offsets[i] = start + (bit >> 3)
+		offset: Any = start + self.bitmap_size
+		for i in self.stored:
+			size = _fixed_size(self.fields[i])
+			if offset is not None:
+				lines.append('\to%d = %d' % (i, offset))
+				self.static_offsets[i] = offset
+				if size is not None:
+					offset += size
+					continue
+				lines.append('\toffset = %d' % offset)
+				offset = None
+			else:
+				lines.append('\to%d = offset' % i)
+			if size is not None:
+				lines.append('\toffset += %d' % size)
+			else:
+				lines.append('\toffset = skip%d(data, offset)' % i)
+		lines.append('\treturn (%s)' % ''.join('o%d, ' % i for i in range(len(self.fields))))
+		return self._exec(lines, 'offsets')
+
+def new_codec(fmt: str, value_fields: Sequence[Tuple[str, fields.BaseField]], header: bytes = b'') -> Codec:
+	''' a :class:`levelorm.codec.Codec` for the values of a model in the format ``fmt`` (one of :data:`FORMATS`) '''
+	if fmt == 'compact':
+		return CompactCodec(value_fields, header)
+	if fmt == 'padded':
+		return Codec(value_fields, header)
+	raise InvalidModel('format must be one of %s, not %r' % (', '.join(FORMATS), fmt))
@@ -0,0 +1,234 @@
+'''
+value compression with zlib and preset dictionaries. set ``compression`` on a model to compress its values: ::
+
+	class Animal(DBBaseModel):
+		prefix = 'animal'
+		compression = compression.Zlib(level=6)
+		...
+
+	Animal.train_compression()  # build a dictionary from a sample of the stored values
+	Animal.migrator().start()   # recompress older values with it in the background
+	Animal.compression_stats()
+
+small, similar values compress much better with a dictionary of what they usually contain. dictionaries are
+stored in the database (under ``<prefix>:#zdict-``) and never deleted, so every value stays readable.
+values are written with the newest one.
+
+stored values start with a 4-byte header: :data:`MAGIC` and the big-endian uint16 id of the dictionary
+(:data:`NO_DICTIONARY` for plain zlib), or :data:`STORED` if the value is kept uncompressed because it is shorter
+than ``min_size`` or didn't get smaller. values without a header (written before the model had ``compression``)
+are read as they are; like with :mod:`levelorm.schema`, that only works if they can't start with :data:`MAGIC`.
+
+compression happens after :class:`levelorm.codec.Codec` encodes (and :mod:`levelorm.schema` adds its header),
+so ``where`` conditions, projections and columns decompress each value before reading it
+'''
+
+import collections
+import random
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .exceptions import WriteConflict
+
+MAGIC = b'z\xff'
+NO_DICTIONARY = 0
+STORED = 0xffff
+_header = struct.Struct('>2sH')
+_dictionary_id = struct.Struct('>H')
+
+class Zlib:
+	'''
+	``level`` is the zlib compression level. values shorter than ``min_size`` bytes are stored uncompressed.
+	:meth:`levelorm.orm.BaseModel.train_compression` builds dictionaries of up to ``dictionary_size`` bytes
+	'''
+
+	def __init__(self, level: int = 6, min_size: int = 32, dictionary_size: int = 16 * 1024) -> None:
+		self.level = level
+		self.min_size = min_size
+		self.dictionary_size = dictionary_size
+
+def header(dictionary: int) -> bytes:
+	return _header.pack(MAGIC, dictionary)
+
+def train(samples: Iterable[bytes], size: int, gram: int = 4) -> bytes:
+	'''
+	builds a dictionary of at most ``size`` bytes out of the ``samples`` whose ``gram``-byte substrings are the
+	most common across all of them. zlib finds matches closer to the end of the dictionary with shorter codes,
+	so the best ones go last
+	'''
+	samples = list(set(samples))
+	counts: 'collections.Counter[bytes]' = collections.Counter()
+	for value in samples:
+		counts.update({value[i:i + gram] for i in range(len(value) - gram + 1)})
+
+	def score(value: bytes) -> float:
+		grams = {value[i:i + gram] for i in range(len(value) - gram + 1)}
+		# substrings only this value has won't help compress anything else
+		return sum(counts[g] - 1 for g in grams) / max(len(value), 1)
+
+	chosen: List[bytes] = []
+	covered: Set[bytes] = set()
+	total = 0
+	for value in sorted(samples, key=score, reverse=True):
+		if total + len(value) > size:
+			continue
+		grams = {value[i:i + gram] for i in range(len(value) - gram + 1)}
+		if grams and grams <= covered:
+			continue # everything in it is already in the dictionary
+		covered |= grams
+		chosen.append(value)
+		total += len(value)
+	return b''.join(reversed(chosen))
+
+class Compressor:
+	''' compresses and decompresses the values of one model. created by :class:`levelorm.orm.ModelMeta` '''
+
+	def __init__(self, config: Zlib, db, prefix: str) -> None:
+		self.config = config
+		self.db = db
+		self.dictionary_prefix = ('%s:#zdict-' % prefix).encode('utf-8')
+		self.dictionaries: Optional[Dict[int, bytes]] = None
+		self.current = NO_DICTIONARY
+		self._lock = threading.Lock()
+		# the counters below are updated under their own lock so that compressing doesn't wait for load()
+		self._stats_lock = threading.Lock()
+		self.values = 0
+		self.stored = 0
+		self.bytes_in = 0
+		self.bytes_out = 0
+		self.compress_seconds = 0.0
+		self.decompressed = 0
+		self.decompress_seconds = 0.0
+
+	def load(self) -> Dict[int, bytes]:
+		''' (re)reads the dictionaries from the database '''
+		with self._lock:
+			dictionaries = {}
+			for key, dictionary in self.db.iterator(prefix=self.dictionary_prefix):
+				dictionaries[_dictionary_id.unpack(key[len(self.dictionary_prefix):])[0]] = dictionary
+			self.dictionaries = dictionaries
+			self.current = max(dictionaries, default=NO_DICTIONARY)
+		return dictionaries
+
+	def add_dictionary(self, dictionary: bytes) -> int:
+		'''
+		stores a new dictionary that values will be compressed with from now on. returns its id. through a
+		:class:`levelorm.server.RemoteDB`, the server checks that no other process stored one with that id first
+		'''
+		while True:
+			self.load()
+			with self._lock:
+				number = self.current + 1
+				if number >= STORED:
+					raise ValueError('out of dictionary ids')
+				key = self.dictionary_prefix + _dictionary_id.pack(number)
+				try:
+					with self.db.write_batch(sync=True) as write_batch:
+						if hasattr(write_batch, 'expect'):
+							write_batch.expect(key, None)
+						write_batch.put(key, dictionary)
+				except WriteConflict:
+					continue # load the other process's dictionary and take the next id
+				self.dictionaries[number] = dictionary # type: ignore
+				self.current = number
+			return number
+
+	def _dictionary(self, number: int) -> bytes:
+		dictionaries = self.dictionaries
+		if dictionaries is None or (number not in dictionaries and number != NO_DICTIONARY):
+			# it might have been trained by another process
+			dictionaries = self.load()
+		if number == NO_DICTIONARY:
+			return b''
+		try:
+			return dictionaries[number]
+		except KeyError as e:
+			raise ValueError('unknown compression dictionary %d' % number) from e
+
+	def compress(self, data: bytes) -> bytes:
+		started = time.perf_counter()
+		if self.dictionaries is None:
+			self.load()
+		config = self.config
+		result = None
+		if len(data) >= config.min_size:
+			number = self.current
+			dictionary = self._dictionary(number)
+			if dictionary:
+				compressor = zlib.compressobj(config.level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, dictionary)
+			else:
+				compressor = zlib.compressobj(config.level, zlib.DEFLATED, -15)
+			compressed = compressor.compress(data) + compressor.flush()
+			if len(compressed) + 4 < len(data):
+				result = header(number) + compressed
+		stored = 0
+		if result is None:
+			result = header(STORED) + data
+			stored = 1
+		elapsed = time.perf_counter() - started
+		with self._stats_lock:
+			self.stored += stored
+			self.values += 1
+			self.bytes_in += len(data)
+			self.bytes_out += len(result)
+			self.compress_seconds += elapsed
+		return result
+
+	def decompress(self, data) -> bytes:
+		''' returns the encoded value of a stored one '''
+		if data[:2] != MAGIC:
+			return data
+		number = _header.unpack_from(data)[1]
+		if number == STORED:
+			return data[4:]
+		started = time.perf_counter()
+		dictionary = self._dictionary(number)
+		if dictionary:
+			decompressor = zlib.decompressobj(-15, dictionary)
+		else:
+			decompressor = zlib.decompressobj(-15)
+		result = decompressor.decompress(data[4:]) + decompressor.flush()
+		elapsed = time.perf_counter() - started
+		with self._stats_lock:
+			self.decompressed += 1
+			self.decompress_seconds += elapsed
+		return result
+
+	def is_current(self, data) -> bool:
+		''' whether a stored value would be compressed the same way if it were written now '''
+		if data[:2] != MAGIC:
+			return False
+		number = _header.unpack_from(data)[1]
+		if self.dictionaries is None:
+			self.load()
+		return number in (self.current, STORED)
+
+	def stats(self) -> Dict[str, Any]:
+		with self._stats_lock:
+			return {
+				'dictionary': self.current,
+				'values': self.values,
+				'stored': self.stored,
+				'bytes_in': self.bytes_in,
+				'bytes_out': self.bytes_out,
+				'ratio': self.bytes_in / self.bytes_out if self.bytes_out else None,
+				'compress_seconds': self.compress_seconds,
+				'decompressed': self.decompressed,
+				'decompress_seconds': self.decompress_seconds,
+			}
+
+def sample(it: Iterable[bytes], n: int, seed: Optional[int] = None) -> List[bytes]:
+	''' a uniform random sample of ``n`` items (reservoir sampling) '''
+	rng = random.Random(seed)
+	result: List[bytes] = []
+	for i, item in enumerate(it):
+		if i < n:
+			result.append(item)
+		else:
+			j = rng.randrange(i + 1)
+			if j < n:
+				result[j] = item
+	return result
@@ -0,0 +1,85 @@
+'''
+the conditions built by comparing fields. they only record what was compared; :mod:`levelorm.query` compiles
+them into checks on raw records (and documents how to build them).
+
+comparing a field with ``==`` or ``!=`` builds a condition instead of comparing the fields themselves, and
+conditions can't be used as booleans. so ``field == other_field`` and ``field in some_list`` raise
+:class:`TypeError`; use ``is`` (or a set or dict of fields, which hash by identity) to compare fields
+'''
+
+import operator
+from typing import Any, Callable
+
+class Condition:
+	def __and__(self, other) -> 'Condition':
+		return And(self, as_condition(other))
+
+	def __rand__(self, other) -> 'Condition':
+		return And(as_condition(other), self)
+
+	def __or__(self, other) -> 'Condition':
+		return Or(self, as_condition(other))
+
+	def __ror__(self, other) -> 'Condition':
+		return Or(as_condition(other), self)
+
+	def __invert__(self) -> 'Condition':
+		return Not(self)
+
+	def __bool__(self):
+		raise TypeError('use & | ~ instead of and or not to combine conditions')
+
+	def fieldnames(self) -> set:
+		''' the names of the fields this condition reads '''
+		raise NotImplementedError
+
+class Comparison(Condition):
+	def __init__(self, field, op: Callable[[Any, Any], bool], value) -> None:
+		self.field = field
+		self.op = op
+		self.value = value
+
+	def __bool__(self):
+		if self.op in (operator.eq, operator.ne):
+			raise TypeError('comparing a field with == or != builds a condition; use "is" to compare fields')
+		return super().__bool__()
+
+	def fieldnames(self):
+		return {self.field.name}
+
+class StartsWith(Comparison):
+	def __init__(self, field, prefix) -> None:
+		super().__init__(field, _startswith, prefix)
+
+class BinaryCondition(Condition):
+	def __init__(self, left: Condition, right: Condition) -> None:
+		self.left = left
+		self.right = right
+
+	def fieldnames(self):
+		return self.left.fieldnames() | self.right.fieldnames()
+
+class And(BinaryCondition):
+	pass
+
+class Or(BinaryCondition):
+	pass
+
+class Not(Condition):
+	def __init__(self, condition: Condition) -> None:
+		self.condition = condition
+
+	def fieldnames(self):
+		return self.condition.fieldnames()
+
+def as_condition(value) -> Condition:
+	''' a :class:`levelorm.fields.Boolean` can be used as a condition by itself (see its ``as_condition``) '''
+	if isinstance(value, Condition):
+		return value
+	to_condition = getattr(value, 'as_condition', None)
+	if to_condition is not None:
+		return to_condition()
+	raise TypeError('expected a condition, got %r' % (value,))
+
+def _startswith(value, prefix) -> bool:
+	return value.startswith(prefix)
@@ -0,0 +1,283 @@
+'''
+dumps the records (and index entries) of models to a file and loads them back. ::
+
+	with dump.open_dump('animals.dump.gz', 'wb') as f:
+		dump.dump(db, f, [Animal, 'pet'])
+	with dump.open_dump('animals.dump.gz', 'rb') as f:
+		dump.load(other_db, f)
+
+or from the command line: ::
+
+	python3 -m levelorm.dump dump demodb animals.dump.gz animal pet
+	python3 -m levelorm.dump load otherdb animals.dump.gz
+
+a dump is either binary (:data:`MAGIC` followed by, for each key, its length and its value's length as
+big-endian uint32s and then the key and value) or NDJSON (one ``{"key": ..., "value": ...}`` object per line with
+base64-encoded bytes). both are written and read one record at a time. the file can be compressed with gzip,
+bz2 or lzma; :func:`open_dump` picks one from the filename.
+
+keys are written in order, so an interrupted dump or load can be resumed by passing the last key it reported
+(see :class:`Progress`) as ``after``. a resumed dump is written to a new file; load the files in order
+'''
+
+import argparse
+import ast
+import base64
+import bz2
+import gzip
+import io
+import json
+import lzma
+import struct
+import sys
+import time
+from typing import IO, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+import plyvel
+
+from .keys import prefix_stop
+
+MAGIC = b'levelorm dump 1\n'
+FORMATS = ('binary', 'ndjson')
+# call the progress callback after this many records
+PROGRESS_RECORDS = 100000
+# write batches of about this many bytes of keys and values
+BATCH_BYTES = 16 * 1024 * 1024
+
+_lengths = struct.Struct('>II')
+_compressors = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open, '.lzma': lzma.open}
+
+class Progress:
+	''' passed to the ``progress`` callback of :func:`dump` and :func:`load` '''
+
+	def __init__(self) -> None:
+		self.records = 0
+		self.bytes = 0
+		self.last_key: Optional[bytes] = None
+		self.started = time.monotonic()
+
+	@property
+	def elapsed(self) -> float:
+		return time.monotonic() - self.started
+
+	@property
+	def rate(self) -> float:
+		''' bytes of keys and values per second '''
+		elapsed = self.elapsed
+		return self.bytes / elapsed if elapsed else 0.0
+
+	def __repr__(self) -> str:
+		return '%d records, %.1f MiB in %.1fs (%.1f MiB/s), last key %r' % (
+				self.records, self.bytes / 2**20, self.elapsed, self.rate / 2**20, self.last_key)
+
+	def _add(self, key: bytes, value: bytes, progress: Optional[Callable[['Progress'], None]]) -> None:
+		self.records += 1
+		self.bytes += len(key) + len(value)
+		self.last_key = key
+		if progress is not None and self.records % PROGRESS_RECORDS == 0:
+			progress(self)
+
+def open_dump(path: str, mode: str) -> IO[bytes]:
+	''' opens ``path`` in binary ``mode``, compressed if it ends in ``.gz``, ``.bz2``, ``.xz`` or ``.lzma`` '''
+	for extension, opener in _compressors.items():
+		if path.endswith(extension):
+			return opener(path, mode) # type: ignore
+	return open(path, mode) # type: ignore
+
+def model_prefixes(models: Iterable[Union[type, str]]) -> List[bytes]:
+	'''
+	the key prefixes of ``models`` (model classes or their ``prefix`` strings): the records under
+	``<prefix>-`` and everything else the model stores (like index entries) under ``<prefix>:``
+	'''
+	prefixes = set()
+	for model in models:
+		name = model if isinstance(model, str) else model.prefix # type: ignore
+		prefixes.add(('%s-' % name).encode('utf-8'))
+		prefixes.add(('%s:' % name).encode('utf-8'))
+	return sorted(prefixes)
+
+def dump(db: plyvel.DB, out: IO[bytes], models: Optional[Iterable[Union[type, str]]] = None,
+		format: str = 'binary', after: Optional[bytes] = None,
+		progress: Optional[Callable[[Progress], None]] = None) -> Progress:
+	'''
+	writes the keys and values of ``models`` (every key in ``db`` if None) to ``out`` in key order,
+	skipping keys up to and including ``after``. ``progress`` is called every :data:`PROGRESS_RECORDS` records.
+	returns the final :class:`Progress`
+	'''
+	if format not in FORMATS:
+		raise ValueError('format must be one of %r' % (FORMATS,))
+	if format == 'binary':
+		out.write(MAGIC)
+		write = _write_binary
+	else:
+		write = _write_ndjson
+
+	state = Progress()
+	with db.snapshot() as snapshot:
+		for key, value in _ranges(snapshot, None if models is None else model_prefixes(models), after):
+			write(out, key, value)
+			state._add(key, value, progress)
+	if progress is not None:
+		progress(state)
+	return state
+
+def load(db: plyvel.DB, f: IO[bytes], after: Optional[bytes] = None, batch_bytes: int = BATCH_BYTES,
+		compact: bool = True, progress: Optional[Callable[[Progress], None]] = None) -> Progress:
+	'''
+	writes the keys and values dumped to ``f`` to ``db``, skipping keys up to and including ``after``.
+	records are written in unsynced write batches of about ``batch_bytes``, each sorted by key,
+	and the loaded range is compacted at the end unless ``compact=False``.
+	``progress`` is called after each batch is written (so every key up to its ``last_key`` has been written).
+	returns the final :class:`Progress`
+	'''
+	state = Progress()
+	first_key: Optional[bytes] = None
+	last_key: Optional[bytes] = None
+	batch: List[Tuple[bytes, bytes]] = []
+	size = 0
+
+	def flush():
+		batch.sort()
+		with db.write_batch(sync=False) as write_batch:
+			for key, value in batch:
+				write_batch.put(key, value)
+		batch.clear()
+		if progress is not None:
+			progress(state)
+
+	for key, value in read(f):
+		if after is not None and key <= after:
+			continue
+		batch.append((key, value))
+		size += len(key) + len(value)
+		if first_key is None or key < first_key:
+			first_key = key
+		if last_key is None or key > last_key:
+			last_key = key
+		state._add(key, value, None)
+		if size >= batch_bytes:
+			flush()
+			size = 0
+	if batch:
+		flush()
+	if compact and first_key is not None:
+		db.compact_range(start=first_key, stop=last_key)
+	return state
+
+def read(f: IO[bytes]) -> Iterator[Tuple[bytes, bytes]]:
+	''' yields the ``(key, value)`` pairs in a dump of either format '''
+	header = f.read(len(MAGIC))
+	if header == MAGIC:
+		yield from _read_binary(f)
+		return
+	lines = io.BufferedReader(_Prepended(header, f)) # type: ignore
+	for line in lines:
+		if not line.strip():
+			continue
+		record = json.loads(line)
+		yield base64.b64decode(record['key']), base64.b64decode(record['value'])
+
+def _ranges(snapshot, prefixes: Optional[List[bytes]], after: Optional[bytes]) -> Iterator[Tuple[bytes, bytes]]:
+	for prefix in prefixes if prefixes is not None else [b'']:
+		stop = prefix_stop(prefix)
+		if after is not None and stop is not None and after >= stop:
+			continue
+		if after is not None and after >= prefix:
+			it = snapshot.iterator(start=after, include_start=False, stop=stop)
+		else:
+			it = snapshot.iterator(start=prefix or None, stop=stop)
+		with it:
+			yield from it
+
+def _write_binary(out: IO[bytes], key: bytes, value: bytes) -> None:
+	out.write(_lengths.pack(len(key), len(value)))
+	out.write(key)
+	out.write(value)
+
+def _write_ndjson(out: IO[bytes], key: bytes, value: bytes) -> None:
+	line = '{"key": "%s", "value": "%s"}\n' % (base64.b64encode(key).decode('ascii'),
+			base64.b64encode(value).decode('ascii'))
+	out.write(line.encode('ascii'))
+
+def _read_binary(f: IO[bytes]) -> Iterator[Tuple[bytes, bytes]]:
+	size = _lengths.size
+	while True:
+		lengths = f.read(size)
+		if not lengths:
+			return
+		if len(lengths) < size:
+			raise ValueError('truncated dump')
+		key_length, value_length = _lengths.unpack(lengths)
+		key = f.read(key_length)
+		value = f.read(value_length)
+		if len(key) < key_length or len(value) < value_length:
+			raise ValueError('truncated dump')
+		yield key, value
+
+class _Prepended(io.RawIOBase):
+	''' a readable stream of ``head`` followed by the rest of ``f`` '''
+
+	def __init__(self, head: bytes, f: IO[bytes]) -> None:
+		self.head = head
+		self.f = f
+
+	def readable(self) -> bool:
+		return True
+
+	def readinto(self, buf) -> int:
+		if self.head:
+			n = min(len(buf), len(self.head))
+			buf[:n] = self.head[:n]
+			self.head = self.head[n:]
+			return n
+		data = self.f.read(len(buf))
+		buf[:len(data)] = data
+		return len(data)
+
+def _report(progress: Progress) -> None:
+	print(progress, file=sys.stderr)
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(prog='python3 -m levelorm.dump', description=__doc__.split('\n\n')[0].strip())
+	subparsers = parser.add_subparsers(dest='command')
+	subparsers.required = True
+	dump_parser = subparsers.add_parser('dump', help='dump models (or the whole database) to a file')
+	dump_parser.add_argument('db')
+	dump_parser.add_argument('path', help='- for stdout')
+	dump_parser.add_argument('prefixes', nargs='*', help='model prefixes (default: everything)')
+	dump_parser.add_argument('--format', choices=FORMATS, default='binary')
+	load_parser = subparsers.add_parser('load', help='load a dump into a database')
+	load_parser.add_argument('db')
+	load_parser.add_argument('path', help='- for stdin')
+	load_parser.add_argument('--no-compact', dest='compact', action='store_false')
+	for subparser in (dump_parser, load_parser):
+		subparser.add_argument('--after', help='resume after this key (as printed in the progress reports)')
+	args = parser.parse_args(argv)
+
+	after = None
+	if args.after is not None:
+		if args.after[:2] in ("b'", 'b"'): # pasted from a progress report
+			after = ast.literal_eval(args.after)
+		else:
+			after = args.after.encode('utf-8')
+
+	if args.command == 'dump':
+		db = plyvel.DB(args.db, create_if_missing=False)
+		out = sys.stdout.buffer if args.path == '-' else open_dump(args.path, 'wb')
+		try:
+			dump(db, out, args.prefixes or None, args.format, after, _report)
+		finally:
+			if out is not sys.stdout.buffer:
+				out.close()
+	else:
+		db = plyvel.DB(args.db, create_if_missing=True)
+		f = sys.stdin.buffer if args.path == '-' else open_dump(args.path, 'rb')
+		try:
+			load(db, f, after, compact=args.compact, progress=_report)
+		finally:
+			if f is not sys.stdin.buffer:
+				f.close()
+	db.close()
+
+if __name__ == '__main__':
+	main()
@@ -1,2 +1,8 @@
 class InvalidModel(Exception):
 	pass
+
+class RemoteError(Exception):
+	pass
+
+class WriteConflict(RemoteError):
+	''' a :class:`levelorm.server.RemoteWriteBatch` was refused because a value it expected had been replaced '''
@@ -0,0 +1,139 @@
+'''
+records that expire. a model that sets ``ttl`` (in seconds) expires each record that long after it was last
+saved; ``expires_at`` (a :func:`time.time` timestamp) on :meth:`levelorm.orm.BaseModel.save` sets a record's
+expiry itself. a model with ``expiring = True`` and no ``ttl`` only expires the records saved with one: ::
+
+	class Session(DBBaseModel):
+		prefix = 'session'
+		ttl = 3600
+		token = String(key=True)
+		user = String()
+
+	Session('abc', 'raylu').save()
+	Session('def', 'raylu').save(expires_at=time.time() + 60)
+
+every stored value of such a model starts with its expiry (milliseconds since the epoch as a big-endian uint64,
+:data:`NEVER` for records that don't expire), so reads skip expired records without another lookup:
+:meth:`levelorm.orm.BaseModel.get` returns None for them and ``iter``, ``count`` and the other scans leave them
+out. ``count`` has to read the values to do that, and the counter of a ``counted`` model includes expired records
+until they are deleted.
+
+expired records are deleted by :meth:`levelorm.orm.BaseModel.sweep` or a :class:`Sweeper` thread, which read the
+expiry index (``<prefix>:#expires-``, ordered by expiry) instead of scanning the records. unchanged records
+aren't written by ``save`` (see :meth:`levelorm.orm.BaseModel.changed_fields`), so saving one doesn't extend
+its expiry unless it is given ``expires_at`` or ``force=True``.
+
+the header changes how values are stored, so don't add ``ttl`` or ``expiring`` to a model that already has records
+'''
+
+import itertools
+import struct
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+# the expiry header of values and of the entries of the expiry index
+header = struct.Struct('>Q')
+HEADER_SIZE = header.size
+# the expiry of records that don't expire. they aren't in the expiry index
+NEVER = 2 ** 64 - 1
+NEVER_HEADER = header.pack(NEVER)
+
+def stamp(timestamp: float) -> int:
+	''' a :func:`time.time` timestamp in milliseconds '''
+	return max(int(timestamp * 1000), 0)
+
+def now() -> int:
+	return stamp(time.time())
+
+def expired(stored: bytes, when: int) -> bool:
+	''' whether a stored value (starting with its expiry header) has expired at ``when`` (see :func:`now`) '''
+	return header.unpack_from(stored)[0] <= when
+
+def sweep(model, batch_size: int = 1000, limit: Optional[int] = None) -> int:
+	'''
+	deletes the records of ``model`` that have expired, ``batch_size`` per write batch, and returns how many
+	were deleted. stops after ``limit`` records if it isn't None
+	'''
+	swept = 0
+	while limit is None or swept < limit:
+		size = batch_size if limit is None else min(batch_size, limit - swept)
+		deleted, scanned = sweep_batch(model, size)
+		swept += deleted
+		if scanned < size:
+			break
+	return swept
+
+def sweep_batch(model, batch_size: int, when: Optional[int] = None) -> Tuple[int, int]:
+	'''
+	deletes the records of up to ``batch_size`` entries of the expiry index that expired by ``when``
+	(by default, now) in one write batch. returns how many records were deleted and how many entries were read.
+	an entry whose record was saved again since (or deleted) is removed without touching the record, and a record
+	saved again after it was read here isn't deleted (saving it replaced its entry)
+	'''
+	if when is None:
+		when = now()
+	prefix = model._expiry_prefix
+	with model._base_db.iterator(start=prefix, stop=prefix + header.pack(when + 1), include_value=False) as it:
+		entries = list(itertools.islice(it, batch_size))
+	if not entries:
+		return 0, 0
+	start = len(prefix) + HEADER_SIZE
+	deleted = 0
+	with model.batch() as batch:
+		for entry in entries:
+			key = entry[start:]
+			full_key = model.db.prefix + key
+			if full_key in batch.pending:
+				stored = batch.pending[full_key]
+			else:
+				stored = model.db.get(key)
+			if stored is not None and stored[:HEADER_SIZE] == entry[len(prefix):start]:
+				# also deletes the entry, unless the record is no longer the one read
+				model._update_indexes(key, None, None, stored)
+				deleted += 1
+			else:
+				batch.write_batch.delete(entry)
+	return deleted - batch.conflicts, len(entries)
+
+class Sweeper(threading.Thread):
+	'''
+	a thread that deletes the expired records of ``model`` (see :func:`sweep`) every ``interval`` seconds,
+	``batch_size`` records per write batch, sleeping ``pause`` seconds between batches. :attr:`swept` counts
+	the records it deleted. call :meth:`stop` to stop after the current batch.
+	:meth:`run` can also be called directly to sweep once in the calling thread
+	'''
+
+	def __init__(self, model, interval: float = 60.0, batch_size: int = 1000, pause: float = 0.0,
+			progress: Optional[Callable[['Sweeper'], None]] = None) -> None:
+		super().__init__(name='levelorm-sweep-%s' % model.__name__, daemon=True)
+		if not model._expiring:
+			raise ValueError('%s does not expire records' % model.__name__)
+		self.model = model
+		self.interval = interval
+		self.batch_size = batch_size
+		self.pause = pause
+		self.progress = progress
+		self.swept = 0
+		self.batches = 0
+		self._stopping = threading.Event()
+
+	def stop(self) -> None:
+		self._stopping.set()
+
+	def run(self) -> None:
+		threaded = threading.current_thread() is self
+		while not self._stopping.is_set():
+			deleted, scanned = sweep_batch(self.model, self.batch_size)
+			if scanned:
+				self.swept += deleted
+				self.batches += 1
+				if self.progress is not None:
+					self.progress(self)
+			if scanned == self.batch_size:
+				if self.pause:
+					self._stopping.wait(self.pause)
+			elif not threaded:
+				break
+			else:
+				self._stopping.wait(self.interval)
@@ -1,119 +1,369 @@
 import abc
+import array
+import operator
 import struct
-from typing import BinaryIO
+from typing import Any, BinaryIO, Optional, Sequence, Tuple
 
+from . import conditions
 from .exceptions import InvalidModel
 
 # pylint: disable=abstract-method
 
+def _escape(value: bytes) -> bytes:
+	''' order-preserving, self-delimiting encoding of variable-length bytes '''
+	return value.replace(b'\0', b'\0\xff') + b'\0\0'
+
+def _unescape_from(data, offset: int) -> Tuple[bytes, int]:
+	data = bytes(data)
+	end = offset
+	while True:
+		end = data.index(b'\0', end)
+		if data[end + 1] == 0:
+			break
+		end += 2
+	return data[offset:end].replace(b'\0\xff', b'\0'), end + 2
+
 class BaseField(metaclass=abc.ABCMeta):
 	'''
-	every model must have exactly one :class:`String` or :class:`Blob` with ``key=True`` which will
-	not be included in the value and instead used as the key
+	every model must have a :class:`String`, :class:`Blob`, :class:`Integer` or :class:`Float` with ``key=True``
+	which will not be included in the value and instead used as the key. ``String`` and ``Blob`` keys are stored
+	as they are; ``Integer`` and ``Float`` keys with :meth:`pack_ordered` so they sort by value.
+	a model with several key fields has a :class:`CompositeKey`.
+
+	fields with ``index=True`` are also written to a secondary index (see
+	:meth:`levelorm.orm.BaseModel.iter_by`). only fields that implement :meth:`pack_ordered` can be indexed
 	'''
 
-	def __init__(self, key: bool = False) -> None:
+	name: str
+
+	def __init__(self, key: bool = False, index: bool = False) -> None:
 		self.key = key
+		self.index = index
+
+	def __set_name__(self, owner, name: str) -> None:
+		self.name = name
+
+	def __get__(self, instance, owner):
+		# only called when instance doesn't have a value for this field yet (records parsed with lazy=True)
+		if instance is None:
+			return self
+		return instance._load_field(self.name)
+
+	# comparing a field to a value builds a condition for levelorm.orm.BaseModel.iter's where (see levelorm.query).
+	# == and != too, so fields can't be compared with each other that way (see levelorm.conditions)
+	def __eq__(self, other) -> conditions.Condition: # type: ignore
+		return conditions.Comparison(self, operator.eq, other)
+
+	def __ne__(self, other) -> conditions.Condition: # type: ignore
+		return conditions.Comparison(self, operator.ne, other)
+
+	def __lt__(self, other) -> conditions.Condition:
+		return conditions.Comparison(self, operator.lt, other)
+
+	def __le__(self, other) -> conditions.Condition:
+		return conditions.Comparison(self, operator.le, other)
+
+	def __gt__(self, other) -> conditions.Condition:
+		return conditions.Comparison(self, operator.gt, other)
+
+	def __ge__(self, other) -> conditions.Condition:
+		return conditions.Comparison(self, operator.ge, other)
+
+	__hash__ = object.__hash__
+
+	def startswith(self, prefix) -> conditions.Condition:
+		return conditions.StartsWith(self, prefix)
 
-	@abc.abstractmethod
 	def serialize(self, buf: BinaryIO, value) -> None:
-		raise NotImplementedError
+		buf.write(self.pack(value))
 
 	@abc.abstractmethod
 	def deserialize(self, buf: BinaryIO):
 		raise NotImplementedError
 
+	@abc.abstractmethod
+	def pack(self, value) -> bytes:
+		''' serialize ``value`` to bytes. used by :class:`levelorm.codec.Codec` '''
+		raise NotImplementedError
+
+	@abc.abstractmethod
+	def unpack_from(self, data, offset: int) -> Tuple[Any, int]:
+		'''
+		deserialize a value from ``data`` (:class:`bytes` or :class:`memoryview`) starting at ``offset``.
+		returns the value and the offset just past it
+		'''
+		raise NotImplementedError
+
+	def skip(self, data, offset: int) -> int:
+		''' returns the offset just past the value starting at ``offset`` without fully deserializing it '''
+		return self.unpack_from(data, offset)[1]
+
 	def serialize_key(self, value) -> bytes:
 		raise NotImplementedError
 
 	def deserialize_key(self, value: bytes):
 		raise NotImplementedError
 
+	def pack_ordered(self, value) -> bytes:
+		'''
+		serialize ``value`` so that the bytewise order of the results matches the order of the values
+		and the result can be followed by other bytes (it is self-delimiting)
+		'''
+		raise NotImplementedError
+
+	def unpack_ordered_from(self, data, offset: int) -> Tuple[Any, int]:
+		''' the inverse of :meth:`pack_ordered`. returns the value and the offset just past it '''
+		raise NotImplementedError
+
+class CompositeKey:
+	'''
+	the key of a model with more than one field with ``key=True``: a tuple of their values in the order the fields
+	are defined. it is stored as the fields' :meth:`BaseField.pack_ordered` encodings one after another, so keys
+	sort like the tuples and the keys starting with some of the values (e.g. ``('acme',)`` for
+	``(tenant, timestamp)`` keys) are a contiguous range
+	'''
+
+	def __init__(self, key_fields: Sequence[Tuple[str, BaseField]]) -> None:
+		self.names = tuple(name for name, _ in key_fields)
+		self.fields = tuple(field for _, field in key_fields)
+
+	def serialize_key(self, value: Sequence) -> bytes:
+		''' also accepts the first few values, which serialize to the prefix of every key starting with them '''
+		if not isinstance(value, (tuple, list)):
+			raise TypeError('expected a tuple of %s, got %r' % (', '.join(self.names), value))
+		if len(value) > len(self.fields):
+			raise ValueError('expected at most %d key values, got %d' % (len(self.fields), len(value)))
+		return b''.join([field.pack_ordered(v) for field, v in zip(self.fields, value)])
+
+	def deserialize_key(self, value) -> tuple:
+		values = []
+		offset = 0
+		for field in self.fields:
+			v, offset = field.unpack_ordered_from(value, offset)
+			values.append(v)
+		return tuple(values)
+
+	def position(self, field: BaseField) -> Optional[int]:
+		''' where ``field`` is in the tuple (None if it isn't a key field) '''
+		for i, key_field in enumerate(self.fields):
+			if key_field is field:
+				return i
+		return None
+
+class SlotField:
+	'''
+	put on a model with ``slots = True`` by :class:`levelorm.orm.ModelMeta` in place of each of its fields.
+	on the model, it returns the field; on an instance, it reads and writes ``slot``, the member descriptor
+	of one of the model's ``__slots__``. the field itself is left alone, so it can be shared with other models
+	'''
+
+	def __init__(self, field: BaseField, slot) -> None:
+		self.field = field
+		self.slot = slot
+
+	def __get__(self, instance, owner):
+		if instance is None:
+			return self.field
+		return self.slot.__get__(instance, owner)
+
+	def __set__(self, instance, value) -> None:
+		self.slot.__set__(instance, value)
+
 class String(BaseField):
 	''' represents a :class:`str`. stored as an unsigned 4-byte length and encoded bytes '''
 
 	length_struct = struct.Struct('I')
 
-	def __init__(self, encoding: str = 'utf-8', key=False) -> None:
+	def __init__(self, encoding: str = 'utf-8', key=False, index=False) -> None:
 		self.encoding = encoding
-		super().__init__(key)
+		super().__init__(key, index)
 
-	def serialize(self, buf, value):
+	def pack(self, value):
 		encoded = value.encode(self.encoding)
-		buf.write(self.length_struct.pack(len(encoded)) + encoded)
+		return self.length_struct.pack(len(encoded)) + encoded
 
 	def deserialize(self, buf) -> str:
 		length = self.length_struct.unpack(buf.read(self.length_struct.size))[0]
 		b = buf.read(length)
 		return b.decode(self.encoding)
 
+	def unpack_from(self, data, offset):
+		length = self.length_struct.unpack_from(data, offset)[0]
+		offset += 4
+		end = offset + length
+		return str(data[offset:end], self.encoding), end
+
+	def skip(self, data, offset):
+		return offset + 4 + self.length_struct.unpack_from(data, offset)[0]
+
 	def serialize_key(self, value: str):
 		return value.encode(self.encoding)
 
 	def deserialize_key(self, value) -> str:
 		return value.decode(self.encoding)
 
+	def pack_ordered(self, value: str) -> bytes:
+		return _escape(value.encode(self.encoding))
+
+	def unpack_ordered_from(self, data, offset):
+		encoded, offset = _unescape_from(data, offset)
+		return encoded.decode(self.encoding), offset
+
 class Blob(BaseField):
 	''' represents a :class:`bytes`. stored as an unsigned 4-byte length and bytes '''
 
 	length_struct = struct.Struct('I')
 
-	def serialize(self, buf, value):
-		buf.write(self.length_struct.pack(len(value)) + value)
+	def pack(self, value):
+		return self.length_struct.pack(len(value)) + value
 
-	def deserialize(self, buf) -> str:
+	def deserialize(self, buf) -> bytes:
 		length = self.length_struct.unpack(buf.read(self.length_struct.size))[0]
 		return buf.read(length)
 
+	def unpack_from(self, data, offset):
+		length = self.length_struct.unpack_from(data, offset)[0]
+		offset += 4
+		end = offset + length
+		return bytes(data[offset:end]), end
+
+	def skip(self, data, offset):
+		return offset + 4 + self.length_struct.unpack_from(data, offset)[0]
+
 	def serialize_key(self, value: bytes):
 		return value
 
 	def deserialize_key(self, value) -> bytes:
 		return value
 
-class Boolean(BaseField):
+	def pack_ordered(self, value: bytes) -> bytes:
+		return _escape(value)
+
+	def unpack_ordered_from(self, data, offset):
+		return _unescape_from(data, offset)
+
+class FixedWidthField(BaseField):
+	'''
+	base class for fields that always serialize to the same number of bytes using :attr:`struct`.
+	:class:`levelorm.codec.Codec` packs runs of these with a single :class:`struct.Struct`
+	'''
+
+	struct: struct.Struct
+
+	def pack(self, value):
+		return self.struct.pack(value)
+
+	def deserialize(self, buf):
+		return self.struct.unpack(buf.read(self.struct.size))[0]
+
+	def unpack_from(self, data, offset):
+		return self.struct.unpack_from(data, offset)[0], offset + self.struct.size
+
+	def skip(self, data, offset):
+		return offset + self.struct.size
+
+	def serialize_key(self, value):
+		return self.pack_ordered(value)
+
+	def deserialize_key(self, value):
+		return self.unpack_ordered_from(value, 0)[0]
+
+class Boolean(FixedWidthField):
 	'''
 	represents a :class:`bool`.
-	stored as 1 byte (but :meth:`levelorm.orm.BaseModel.save` will pad to 4)
+	stored as 1 byte (but :meth:`levelorm.orm.BaseModel.save` will pad to 4, and the compact format
+	(see :mod:`levelorm.compact`) packs the Booleans of a record into a bitmap)
 	'''
 
 	struct = struct.Struct('?')
 
-	def serialize(self, buf, value: bool):
+	def pack(self, value: bool):
 		if not isinstance(value, bool):
 			raise TypeError('expected bool, got %r' % value)
-		buf.write(self.struct.pack(value))
+		return self.struct.pack(value)
 
-	def deserialize(self, buf) -> bool:
-		return self.struct.unpack(buf.read(self.struct.size))[0]
+	def pack_ordered(self, value: bool) -> bytes:
+		return self.pack(value)
+
+	# a Boolean field is a condition by itself
+	def as_condition(self) -> conditions.Condition:
+		return conditions.Comparison(self, operator.eq, True)
+
+	def __and__(self, other) -> conditions.Condition:
+		return self.as_condition() & other
 
-class Integer(BaseField):
+	def __rand__(self, other) -> conditions.Condition:
+		return other & self.as_condition()
+
+	def __or__(self, other) -> conditions.Condition:
+		return self.as_condition() | other
+
+	def __ror__(self, other) -> conditions.Condition:
+		return other | self.as_condition()
+
+	def __invert__(self) -> conditions.Condition:
+		return ~self.as_condition()
+
+	def unpack_ordered_from(self, data, offset):
+		return data[offset] != 0, offset + 1
+
+class Integer(FixedWidthField):
 	'''
 	represents an :class:`int`.
-	stored as a signed 4-byte int
+	stored as a signed 4-byte int, or 8-byte with ``bits=64``
 	'''
 
+	# these must come before struct shadows the module
+	ordered_struct = struct.Struct('>I')
+	ordered_struct64 = struct.Struct('>Q')
+	struct64 = struct.Struct('q')
 	struct = struct.Struct('i')
-
-	def serialize(self, buf, value: int):
-		buf.write(self.struct.pack(value))
-
-	def deserialize(self, buf) -> int:
-		return self.struct.unpack(buf.read(self.struct.size))[0]
-
-class Float(BaseField):
+	sign_bit = 1 << 31
+
+	def __init__(self, bits: int = 32, key=False, index=False) -> None:
+		if bits not in (32, 64):
+			raise InvalidModel('Integer bits must be 32 or 64, not %r' % (bits,))
+		self.bits = bits
+		if bits == 64:
+			self.struct = self.struct64
+			self.ordered_struct = self.ordered_struct64
+			self.sign_bit = 1 << 63
+		super().__init__(key, index)
+
+	def pack_ordered(self, value: int) -> bytes:
+		# big-endian with the sign bit flipped so negative numbers sort first
+		return self.ordered_struct.pack(value + self.sign_bit)
+
+	def unpack_ordered_from(self, data, offset):
+		return self.ordered_struct.unpack_from(data, offset)[0] - self.sign_bit, offset + self.ordered_struct.size
+
+class Float(FixedWidthField):
 	'''
 	represents a :class:`float`.
 	stored as a double precision (8 byte, binary64) float
 	'''
 
+	ordered_struct = struct.Struct('>Q') # must come before struct shadows the module
+	bits_struct = struct.Struct('>d')
 	struct = struct.Struct('d')
-
-	def serialize(self, buf, value: float):
-		buf.write(self.struct.pack(value))
-
-	def deserialize(self, buf) -> float:
-		return self.struct.unpack(buf.read(self.struct.size))[0]
+	sign_bit = 1 << 63
+
+	def pack_ordered(self, value: float) -> bytes:
+		# flip the sign bit of positive numbers and every bit of negative numbers
+		bits = self.ordered_struct.unpack(self.bits_struct.pack(value))[0]
+		if bits & self.sign_bit:
+			bits ^= 0xffffffffffffffff
+		else:
+			bits |= self.sign_bit
+		return self.ordered_struct.pack(bits)
+
+	def unpack_ordered_from(self, data, offset):
+		bits = self.ordered_struct.unpack_from(data, offset)[0]
+		if bits & self.sign_bit:
+			bits ^= self.sign_bit
+		else:
+			bits ^= 0xffffffffffffffff
+		return self.bits_struct.unpack(self.ordered_struct.pack(bits))[0], offset + self.ordered_struct.size
 
 class Array(BaseField):
 	'''
@@ -127,26 +377,98 @@ class Array(BaseField):
 			name = String(key=True)
 			numbers = Array(Array(Integer()))
 		identity = Matrices('identity', [[1, 0], [0, 1]])
+
+	arrays of :class:`Integer`, :class:`Float` or :class:`Boolean` are packed and unpacked with a single
+	counted :mod:`struct` format. with ``view=True``, they are instead deserialized as a read-only
+	:class:`memoryview` over the stored value (no copy is made, but the view keeps the whole value alive).
+	``numpy.asarray`` can wrap such a view without copying. these arrays also accept a :class:`memoryview` or
+	:class:`array.array` of the same format as a value
 	'''
 
 	length_struct = struct.Struct('I')
 
-	def __init__(self, inner: BaseField, key=False) -> None:
+	def __init__(self, inner: BaseField, key=False, view: bool = False) -> None:
 		if not isinstance(inner, BaseField):
 			raise InvalidModel('Array inner type is not a field: %r' % (inner))
 		self.inner = inner
+		# (byte order prefix, format character) if the elements can be (un)packed in bulk
+		self.bulk_format: Optional[Tuple[str, str]] = None
+		# the size of each element if they are fixed-width (otherwise 0)
+		self.element_size = 0
+		if isinstance(inner, FixedWidthField):
+			self.element_size = inner.struct.size
+			fmt = inner.struct.format
+			if isinstance(fmt, bytes): # python 3.6
+				fmt = fmt.decode('ascii')
+			prefix = ''
+			if fmt[0] in '@=<>!':
+				prefix, fmt = fmt[0], fmt[1:]
+			if len(fmt) == 1:
+				self.bulk_format = (prefix, fmt)
+		if view and (self.bulk_format is None or self.bulk_format[0] not in ('', '@')):
+			raise InvalidModel('only arrays of native fixed-width fields can be views')
+		self.view = view
 		super().__init__(key)
 
-	def serialize(self, buf, value: list):
+	def pack(self, value: list):
+		bulk_format = self.bulk_format
+		if bulk_format is not None:
+			if isinstance(value, (memoryview, array.array)):
+				value_format = value.format if isinstance(value, memoryview) else value.typecode
+				if bulk_format[0] in ('', '@') and value_format == bulk_format[1]:
+					return self.length_struct.pack(len(value)) + value.tobytes()
+				raise TypeError('expected elements of format %r, got %r' % (bulk_format[1], value_format))
+			if not isinstance(value, list):
+				raise TypeError('expected list, got %r' % value)
+			if isinstance(self.inner, Boolean):
+				for element in value:
+					if not isinstance(element, bool):
+						raise TypeError('expected bool, got %r' % element)
+			length = len(value)
+			return self.length_struct.pack(length) + struct.pack('%s%d%s' % (bulk_format[0], length, bulk_format[1]), *value)
+
 		if not isinstance(value, list):
 			raise TypeError('expected list, got %r' % value)
-		buf.write(self.length_struct.pack(len(value)))
-		for element in value:
-			self.inner.serialize(buf, element)
+		pack = self.inner.pack
+		return self.length_struct.pack(len(value)) + b''.join([pack(element) for element in value])
 
 	def deserialize(self, buf) -> list:
 		length = self.length_struct.unpack(buf.read(self.length_struct.size))[0]
+		if self.bulk_format is not None:
+			return self._unpack_bulk(buf.read(length * self.element_size), 0, length)[0]
 		value = []
 		for _ in range(length):
 			value.append(self.inner.deserialize(buf))
 		return value
+
+	def unpack_from(self, data, offset):
+		length = self.length_struct.unpack_from(data, offset)[0]
+		offset += 4
+		if self.bulk_format is not None:
+			return self._unpack_bulk(data, offset, length)
+
+		value = []
+		unpack_from = self.inner.unpack_from
+		for _ in range(length):
+			element, offset = unpack_from(data, offset)
+			value.append(element)
+		return value, offset
+
+	def _unpack_bulk(self, data, offset: int, length: int):
+		bulk_format = self.bulk_format
+		assert bulk_format is not None
+		prefix, char = bulk_format
+		end = offset + length * self.element_size
+		if self.view:
+			return memoryview(data)[offset:end].cast(char), end # type: ignore
+		return list(struct.unpack_from('%s%d%s' % (prefix, length, char), data, offset)), end
+
+	def skip(self, data, offset):
+		length = self.length_struct.unpack_from(data, offset)[0]
+		offset += 4
+		if self.element_size:
+			return offset + length * self.element_size
+		skip = self.inner.skip
+		for _ in range(length):
+			offset = skip(data, offset)
+		return offset
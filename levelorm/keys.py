@@ -0,0 +1,12 @@
+'''
+helpers for ranges of leveldb keys
+'''
+
+from typing import Optional
+
+def prefix_stop(prefix: bytes) -> Optional[bytes]:
+	''' the smallest key greater than every key starting with ``prefix`` (None if there is none) '''
+	prefix = prefix.rstrip(b'\xff')
+	if not prefix:
+		return None
+	return prefix[:-1] + bytes([prefix[-1] + 1])
@@ -0,0 +1,315 @@
+'''
+instrumentation of model operations. install a hook on a model or on the base returned by
+:meth:`levelorm.db_base_model` (which covers every model created from it) with
+:meth:`levelorm.orm.BaseModel.instrument`: ::
+
+	registry = metrics.Registry()
+	DBBaseModel.instrument(registry)
+	...
+	registry.snapshot()['Animal']['get']['p99']
+
+a hook is anything with an ``operation(operation)`` method. it is called with an :class:`Operation` after every
+``get``, ``get_many``, ``save``, ``delete``, ``save_many``, ``delete_many``, ``iter``, ``iter_by``,
+``scan_columns``, ``count`` and ``aggregate`` (operations called by another one, like the saves in a
+``save_many``, are part of the outer one).
+plyvel reads and writes of instrumented models are timed and counted towards the current operation, so its time
+is split into I/O and everything else (decoding). without a hook, the only cost is checking for one
+'''
+
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+class Operation:
+	''' one call of a model method '''
+	__slots__ = ('model', 'name', 'seconds', 'io_seconds', 'bytes_read', 'bytes_written', 'scanned', 'yielded')
+
+	def __init__(self, model: type, name: str) -> None:
+		self.model = model
+		self.name = name
+		self.seconds = 0.0
+		self.io_seconds = 0.0
+		self.bytes_read = 0
+		self.bytes_written = 0
+		# entries read from plyvel iterators
+		self.scanned = 0
+		# records returned (by iter, iter_by, get and get_many)
+		self.yielded = 0
+
+	@property
+	def decode_seconds(self) -> float:
+		''' the time not spent in plyvel '''
+		return max(0.0, self.seconds - self.io_seconds)
+
+	def __repr__(self) -> str:
+		return 'Operation(%s.%s, %.6fs, %.6fs I/O)' % (self.model.__name__, self.name, self.seconds, self.io_seconds)
+
+class Histogram:
+	''' counts of values in exponential buckets: the first holds values up to ``first`` and each is ``factor`` wider '''
+
+	def __init__(self, first: float = 1e-6, factor: float = 2.0, buckets: int = 28) -> None:
+		self.bounds = [first * factor ** i for i in range(buckets)]
+		# the last bucket holds everything greater than the last bound
+		self.counts = [0] * (buckets + 1)
+		self.count = 0
+		self.sum = 0.0
+
+	def add(self, value: float) -> None:
+		bounds = self.bounds
+		low = 0
+		high = len(bounds)
+		while low < high:
+			middle = (low + high) // 2
+			if value <= bounds[middle]:
+				high = middle
+			else:
+				low = middle + 1
+		self.counts[low] += 1
+		self.count += 1
+		self.sum += value
+
+	def percentile(self, q: float) -> float:
+		''' the upper bound of the bucket holding the ``q`` (between 0 and 1) quantile '''
+		if not self.count:
+			return 0.0
+		target = q * self.count
+		seen = 0
+		for i, count in enumerate(self.counts):
+			seen += count
+			if seen >= target and count:
+				return self.bounds[min(i, len(self.bounds) - 1)]
+		return self.bounds[-1]
+
+	def as_dict(self) -> Dict[str, Any]:
+		return {
+			'count': self.count,
+			'sum': self.sum,
+			'buckets': [(bound, count) for bound, count in zip(self.bounds + [float('inf')], self.counts) if count],
+		}
+
+class OperationStats:
+	''' totals of the operations of one name on one model '''
+
+	def __init__(self) -> None:
+		self.count = 0
+		self.latency = Histogram()
+		self.io_seconds = 0.0
+		self.decode_seconds = 0.0
+		self.bytes_read = 0
+		self.bytes_written = 0
+		self.scanned = 0
+		self.yielded = 0
+
+	def add(self, operation: Operation) -> None:
+		self.count += 1
+		self.latency.add(operation.seconds)
+		self.io_seconds += operation.io_seconds
+		self.decode_seconds += operation.decode_seconds
+		self.bytes_read += operation.bytes_read
+		self.bytes_written += operation.bytes_written
+		self.scanned += operation.scanned
+		self.yielded += operation.yielded
+
+	def as_dict(self) -> Dict[str, Any]:
+		result = {name: getattr(self, name) for name in
+				('count', 'io_seconds', 'decode_seconds', 'bytes_read', 'bytes_written', 'scanned', 'yielded')}
+		result['latency'] = self.latency.as_dict()
+		for q in (50, 90, 99):
+			result['p%d' % q] = self.latency.percentile(q / 100)
+		return result
+
+class Registry:
+	''' a hook that keeps :class:`OperationStats` per model and operation name '''
+
+	def __init__(self) -> None:
+		self._stats: Dict[str, Dict[str, OperationStats]] = {}
+		self._lock = threading.Lock()
+
+	def operation(self, operation: Operation) -> None:
+		with self._lock:
+			model_stats = self._stats.get(operation.model.__name__)
+			if model_stats is None:
+				model_stats = self._stats[operation.model.__name__] = {}
+			stats = model_stats.get(operation.name)
+			if stats is None:
+				stats = model_stats[operation.name] = OperationStats()
+			stats.add(operation)
+
+	def snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+		''' the stats as ``{model name: {operation name: OperationStats.as_dict()}}`` '''
+		with self._lock:
+			return {model: {name: stats.as_dict() for name, stats in model_stats.items()}
+					for model, model_stats in self._stats.items()}
+
+	def reset(self) -> None:
+		with self._lock:
+			self._stats.clear()
+
+class _LocalState(threading.local):
+	operation: Optional[Operation] = None
+
+_local = _LocalState()
+
+def current() -> Optional[Operation]:
+	''' the operation running in this thread on an instrumented model, if any '''
+	return _local.operation
+
+def add_io(seconds: float, bytes_read: int = 0, bytes_written: int = 0) -> None:
+	operation = _local.operation
+	if operation is not None:
+		operation.io_seconds += seconds
+		operation.bytes_read += bytes_read
+		operation.bytes_written += bytes_written
+
+def instrumented(name: str) -> Callable[[Callable], Callable]:
+	''' reports calls of a model method (a classmethod's function or an instance method) to the model's hook '''
+	def decorate(func):
+		@functools.wraps(func)
+		def wrapper(owner, *args, **kwargs):
+			model = owner if isinstance(owner, type) else owner.__class__
+			hook = model._hook
+			if hook is None or _local.operation is not None:
+				return func(owner, *args, **kwargs)
+
+			operation = _local.operation = Operation(model, name)
+			started = time.perf_counter()
+			try:
+				result = func(owner, *args, **kwargs)
+			finally:
+				operation.seconds = time.perf_counter() - started
+				_local.operation = None
+			if isinstance(result, list):
+				operation.yielded = sum(1 for item in result if item is not None)
+			elif result is not None and name == 'get':
+				operation.yielded = 1
+			hook.operation(operation)
+			return result
+		return wrapper
+	return decorate
+
+def instrumented_iter(name: str) -> Callable[[Callable], Callable]:
+	'''
+	like :func:`instrumented` for generators. the operation lasts until the generator is exhausted or closed
+	but only the time spent inside it (not in the loop consuming it) is counted
+	'''
+	def decorate(func):
+		@functools.wraps(func)
+		def wrapper(cls, *args, **kwargs):
+			hook = cls._hook
+			if hook is None or _local.operation is not None:
+				return func(cls, *args, **kwargs)
+			return _iterate(hook, Operation(cls, name), func(cls, *args, **kwargs))
+		return wrapper
+	return decorate
+
+def _iterate(hook, operation: Operation, results):
+	perf_counter = time.perf_counter
+	try:
+		while True:
+			previous = _local.operation
+			_local.operation = operation
+			started = perf_counter()
+			try:
+				result = next(results)
+			except StopIteration:
+				return
+			finally:
+				operation.seconds += perf_counter() - started
+				_local.operation = previous
+			operation.yielded += 1
+			yield result
+	finally:
+		previous = _local.operation
+		_local.operation = operation
+		started = perf_counter()
+		try:
+			results.close()
+		finally:
+			operation.seconds += perf_counter() - started
+			_local.operation = previous
+		hook.operation(operation)
+
+class InstrumentedDB:
+	''' wraps a ``plyvel.PrefixedDB`` (or snapshot) so reads and writes count towards the current :class:`Operation` '''
+
+	def __init__(self, db) -> None:
+		self.db = db
+		self.prefix = getattr(db, 'prefix', None)
+
+	def __getattr__(self, name: str):
+		return getattr(self.db, name)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		return self.db.__exit__(*exc_info)
+
+	def get(self, key: bytes, *args, **kwargs):
+		started = time.perf_counter()
+		data = self.db.get(key, *args, **kwargs)
+		add_io(time.perf_counter() - started, len(key) + (len(data) if data is not None else 0))
+		return data
+
+	def get_many(self, keys: list, *args, **kwargs) -> list:
+		''' see :meth:`levelorm.server.RemoteDB.get_many` '''
+		started = time.perf_counter()
+		values = self.db.get_many(keys, *args, **kwargs)
+		size = sum(len(key) for key in keys) + sum(len(data) for data in values if data is not None)
+		add_io(time.perf_counter() - started, size)
+		return values
+
+	def put(self, key: bytes, value: bytes, *args, **kwargs) -> None:
+		started = time.perf_counter()
+		self.db.put(key, value, *args, **kwargs)
+		add_io(time.perf_counter() - started, bytes_written=len(key) + len(value))
+
+	def delete(self, key: bytes, *args, **kwargs) -> None:
+		started = time.perf_counter()
+		self.db.delete(key, *args, **kwargs)
+		add_io(time.perf_counter() - started, bytes_written=len(key))
+
+	def iterator(self, *args, **kwargs) -> 'InstrumentedIterator':
+		return InstrumentedIterator(self.db.iterator(*args, **kwargs))
+
+	def snapshot(self) -> 'InstrumentedDB':
+		return InstrumentedDB(self.db.snapshot())
+
+class InstrumentedIterator:
+	def __init__(self, it) -> None:
+		self.it = it
+
+	def __getattr__(self, name: str):
+		return getattr(self.it, name)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		return self.it.__exit__(*exc_info)
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		started = time.perf_counter()
+		try:
+			entry = next(self.it)
+		finally:
+			seconds = time.perf_counter() - started
+			operation = _local.operation
+			if operation is not None:
+				operation.io_seconds += seconds
+		if operation is not None:
+			operation.scanned += 1
+			if isinstance(entry, tuple):
+				operation.bytes_read += sum(len(part) for part in entry if part is not None)
+			else:
+				operation.bytes_read += len(entry)
+		return entry
+
+	def seek(self, target: bytes) -> None:
+		started = time.perf_counter()
+		self.it.seek(target)
+		add_io(time.perf_counter() - started)
@@ -1,11 +1,24 @@
 import collections
-import io
-from typing import Iterator, List, Type, TypeVar, Union
+import concurrent.futures
+import contextlib
+import itertools
+import os
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, TypeVar, Union
 
 import plyvel
 
-from . import fields
-from .exceptions import InvalidModel
+from . import aggregate, compact, compression, expiry, fields, metrics, parallel, query, schema
+from .aio import AsyncMixin
+from .cache import ABSENT, LRUCache
+from .codec import MISSING, Codec
+from .columns import ColumnScanner, split_keys
+from .compression import Compressor, Zlib
+from .exceptions import InvalidModel, WriteConflict
+from .keys import prefix_stop
+from .session import ReadSession
 
 class ModelMeta(type):
 	@classmethod
@@ -17,42 +30,283 @@ class ModelMeta(type):
 			return type.__prepare__(mcs, name, bases, **kwds)
 
 	def __new__(mcs, clsname, bases, namespace, **kwds):
+		is_model = len(bases) == 1 and bases[0].__name__ == 'DBBaseModel'
+		slots = is_model and namespace.get('slots') is True
+		if slots:
+			if namespace.get('lazy') is True:
+				raise InvalidModel('%s has slots so it cannot be lazy' % clsname)
+			namespace = collections.OrderedDict(namespace)
+			namespace['__slots__'] = tuple(_SLOT_PREFIX + name
+					for name, field in namespace.items() if isinstance(field, fields.BaseField))
 		result = type.__new__(mcs, clsname, bases, dict(namespace))
 
 		# only set _fields for subclasses of DBBaseModel
-		if len(bases) == 1 and bases[0].__name__ == 'DBBaseModel':
+		if is_model:
 			all_fields = []
-			keyname = None
+			keynames = []
 			for name, field in namespace.items():
 				if not isinstance(field, fields.BaseField):
 					continue
 				all_fields.append(name)
 				if field.key:
-					if keyname is not None:
-						raise InvalidModel('%s has multiple keys; %r and %r' % (clsname, keyname, name))
-					if not isinstance(field, fields.String) and not isinstance(field, fields.Blob):
-						raise InvalidModel('keys must be Strings but %s is %s' % (name, field.__class__))
-					keyname = name
-			if keyname is None:
+					if field.index:
+						raise InvalidModel('%s is a key and cannot also be indexed' % name)
+					if not isinstance(field, (fields.String, fields.Blob, fields.Integer, fields.Float)):
+						raise InvalidModel('keys must be Strings, Blobs, Integers or Floats but %s is %s' %
+								(name, field.__class__))
+					keynames.append(name)
+			if not keynames:
 				raise InvalidModel('%s has no key' % clsname)
+			if slots:
+				for name in all_fields:
+					setattr(result, name, fields.SlotField(namespace[name], vars(result)[_SLOT_PREFIX + name]))
 
 			result._fields = tuple(all_fields)
-			result._keyname = keyname
+			result._keynames = tuple(keynames)
+			if len(keynames) == 1:
+				result._keyname = keynames[0]
+				result._keyfield = namespace[keynames[0]]
+			else:
+				result._keyname = None
+				result._keyfield = fields.CompositeKey([(name, namespace[name]) for name in keynames])
+			result._value_fields = tuple((name, namespace[name]) for name in all_fields if name not in keynames)
+			fmt = namespace.get('format', 'padded')
+			version = namespace.get('version')
+			if isinstance(version, int):
+				result._codec = compact.new_codec(fmt, result._value_fields, schema.header(version))
+				result._schema = schema.Schema(clsname, version, result._codec, namespace.get('old_versions', {}))
+			else:
+				result._codec = compact.new_codec(fmt, result._value_fields)
+			config = namespace.get('compression')
+			if isinstance(config, Zlib):
+				result._compressor = Compressor(config, result._base_db, result.prefix)
+			ttl = namespace.get('ttl')
+			if ttl is not None and (not isinstance(ttl, (int, float)) or ttl <= 0):
+				raise InvalidModel('%s.ttl must be a positive number of seconds' % clsname)
+			result._expiring = ttl is not None or namespace.get('expiring') is True
+			if result._expiring:
+				result._expiry_prefix = ('%s:#expires-' % result.prefix).encode('utf-8')
+			result._plain = result._schema is None and result._compressor is None and not result._expiring
+			result._projections = {}
+			result.Record = collections.namedtuple(clsname + 'Record', all_fields) # type: ignore
+			# the setters of the slots of the value fields, in the order of _value_fields
+			result._slot_setters = tuple(vars(result)[_SLOT_PREFIX + name].__set__
+					for name, _ in result._value_fields) if slots else None
+
+			indexes = {}
+			for i, (name, field) in enumerate(result._value_fields):
+				if not field.index:
+					continue
+				if not isinstance(field, (fields.String, fields.Blob, fields.FixedWidthField)):
+					raise InvalidModel('%s cannot be indexed because it is %s' % (name, field.__class__))
+				indexes[name] = (i, field, ('%s:%s-' % (result.prefix, name)).encode('utf-8'))
+			result._indexes = indexes
+			counted = namespace.get('counted') is True
+			if counted:
+				result._counter_key = ('%s:#count' % result.prefix).encode('utf-8')
+				result._counter_lock = threading.Lock()
+			result._maintained = bool(indexes) or counted or not result._plain
 		return result
 
+# models with slots = True keep their fields' values in these slots (the fields themselves stay on the class)
+_SLOT_PREFIX = '_v_'
+
 Model = TypeVar('Model', bound='BaseModel')
 
-class BaseModel(metaclass=ModelMeta):
+# the values of the counters of models with counted = True
+_counter = struct.Struct('>q')
+
+# passed as the expected value of writes that don't depend on the value they replace
+_UNCONDITIONAL: Any = object()
+
+class WriteBatch:
+	'''
+	returned by :meth:`BaseModel.batch`. saves and deletes of every model created from the same
+	:meth:`levelorm.db_base_model` are buffered here and written together when the ``with`` block exits
+	'''
+
+	def __init__(self, write_batch) -> None:
+		self.write_batch = write_batch
+		# whether it is a levelorm.server.RemoteWriteBatch, which other processes may write the same keys as
+		self.remote = hasattr(write_batch, 'expect')
+		# values of indexed records written in this batch so far (None for deletes), by full key
+		self.pending: Dict[bytes, Optional[bytes]] = {}
+		# (model, key, values, data, expected) of the records passed to BaseModel._update_indexes, in order
+		self.maintained: List[Tuple[Type['BaseModel'], bytes, Optional[Sequence[Any]], Optional[bytes], Any]] = []
+		# how many conditional writes were skipped because the value they expected had been replaced
+		self.conflicts = 0
+		# cache entries to invalidate again once the batch is written
+		self.invalidated: List[Tuple[LRUCache, bytes]] = []
+		# how much the record count of each counted model changes. write_maintained adds to it while it holds the
+		# write lock, so whether each record existed before can't change until the batch is written
+		self.counts: Dict[Type['BaseModel'], int] = collections.defaultdict(int)
+
+	def put(self, model: Type['BaseModel'], key: bytes, data: bytes) -> None:
+		self.write_batch.put(model.db.prefix + key, data)
+		if model._hook is not None:
+			metrics.add_io(0.0, bytes_written=len(model.db.prefix) + len(key) + len(data))
+
+	def delete(self, model: Type['BaseModel'], key: bytes) -> None:
+		self.write_batch.delete(model.db.prefix + key)
+		if model._hook is not None:
+			metrics.add_io(0.0, bytes_written=len(model.db.prefix) + len(key))
+
+	def invalidate(self, cache: LRUCache, key: bytes) -> None:
+		cache.invalidate(key)
+		self.invalidated.append((cache, key))
+
+	def write_maintained(self) -> None:
+		'''
+		adds the records of models with indexes, expiry or a counter to the batch along with their index
+		entries, which are updated against the values they replace. records written with an expected value are
+		skipped (and counted in :attr:`conflicts`) if the value they replace is a different one. the base's write
+		lock must be held until the batch is written so that no other batch replaces those values in between
+		'''
+		replaced: Dict[bytes, Optional[bytes]] = {}
+		for model, key, values, data, expected in self.maintained:
+			full_key = model.db.prefix + key
+			if full_key in replaced:
+				old_data = replaced[full_key]
+			elif expected is not _UNCONDITIONAL or model._indexes or model.counted or model._expiring:
+				old_data = model.db.get(key)
+				if self.remote:
+					self.write_batch.expect(full_key, old_data)
+			else:
+				old_data = None
+			if expected is not _UNCONDITIONAL and old_data != expected:
+				self.conflicts += 1
+				continue
+			model._write_maintained(self, key, old_data, values, data)
+			replaced[full_key] = data
+
+	def add_counts(self, locks: List[threading.Lock]) -> None:
+		'''
+		adds the new values of the counters that changed to the batch. the locks of their models are acquired and
+		appended to ``locks``; release them once the batch is written. a remote batch has the server add to them
+		'''
+		for model in sorted((model for model, delta in self.counts.items() if delta), key=id):
+			if self.remote:
+				self.write_batch.add(model._counter_key, self.counts[model])
+				continue
+			lock = model._counter_lock
+			lock.acquire()
+			locks.append(lock)
+			stored = model._base_db.get(model._counter_key)
+			# a missing counter is recounted by count()
+			if stored is not None:
+				self.write_batch.put(model._counter_key, _counter.pack(_counter.unpack(stored)[0] + self.counts[model]))
+
+	def add_maintained(self, write_lock: threading.Lock, locks: List[threading.Lock]) -> None:
+		'''
+		:meth:`write_maintained` (holding ``write_lock``, the base's) and :meth:`add_counts`. a remote batch is
+		written here, expecting the values write_maintained read; if another process replaced one of them
+		meanwhile, they are read and the records added again
+		'''
+		if not self.maintained:
+			return
+		write_lock.acquire()
+		locks.append(write_lock)
+		savepoint = self.write_batch.savepoint() if self.remote else 0
+		while True:
+			self.write_maintained()
+			if self.counts:
+				self.add_counts(locks)
+			if not self.remote:
+				return
+			started = time.perf_counter()
+			try:
+				self.write_batch.write()
+			except WriteConflict:
+				self.write_batch.rollback(savepoint)
+				self.counts.clear()
+				self.conflicts = 0
+				continue
+			metrics.add_io(time.perf_counter() - started)
+			return
+
+class _LocalState(threading.local):
+	''' per-thread state shared by all models of one :meth:`levelorm.db_base_model` '''
+	batch: Optional[WriteBatch] = None
+	session: Optional[ReadSession] = None
+
+class _Record:
+	''' what every instance of a model has, even one with ``slots = True`` '''
+
+	# the key of the instance and the value it was read or last saved as (None if it wasn't)
+	_key: Any
+	_raw: Optional[bytes]
+
+	__slots__ = ('_key', '_raw')
+
+class BaseModel(AsyncMixin, _Record, metaclass=ModelMeta):
 	'''
 	base model for ``DBBaseModel`` to inherit from.
-	user models should inherit from a class created by :meth:`levelorm.db_base_model`
+	user models should inherit from a class created by :meth:`levelorm.db_base_model`.
+	asyncio versions of its methods come from :class:`levelorm.aio.AsyncMixin`
 	'''
 
 	db: plyvel.DB = None
+	# records are stored under '<prefix>-' and index entries and counters under '<prefix>:', so it can't contain ':'
 	prefix: Union[str, None] = None
+	# set either of these on a model to give it its own cache instead of sharing the one from db_base_model
+	cache_size: Optional[int] = None
+	cache_bytes: Optional[int] = None
+	negative_cache: bool = False
+	# parse records lazily by default (see :meth:`parse`)
+	lazy: bool = False
+	# store instances' values in __slots__ instead of a __dict__. such models can't be lazy
+	slots: bool = False
+	# a collections.namedtuple of every field in the order they are defined; see iter(as_tuples=True)
+	Record: Any
+	# see levelorm.schema
+	version: Optional[int] = None
+	old_versions: Dict[int, schema.Version] = {}
+	# write records read in an older version or compressed with an older dictionary back in the current one
+	migrate_on_read: bool = False
+	# see levelorm.compression
+	compression: Optional[Zlib] = None
+	# keep a count of the records so that count() without a range doesn't scan them
+	counted: bool = False
+	# how values are stored: 'padded' (see levelorm.codec) or 'compact' (see levelorm.compact)
+	format: str = 'padded'
+	# seconds after which records expire (see levelorm.expiry)
+	ttl: Optional[float] = None
+	# let records expire without a ttl (only the ones saved with expires_at do)
+	expiring: bool = False
+
+	_base_db: plyvel.DB
+	_local: _LocalState
+	_cache: Optional[LRUCache] = None
+	# see instrument()
+	_hook: Any = None
 
-	_keyname: str
+	# the names of the key fields in the order they are defined; _keyname is the only one (None if there are several)
+	_keynames: Tuple[str, ...]
+	_keyname: Optional[str]
+	_keyfield: Union[fields.BaseField, fields.CompositeKey]
 	_fields: List[str]
+	_value_fields: Tuple[Tuple[str, fields.BaseField], ...]
+	_codec: Codec
+	_schema: Optional[schema.Schema] = None
+	_compressor: Optional[Compressor] = None
+	# whether values are stored exactly as _codec encodes them (no version, compression or expiry)
+	_plain: bool = True
+	# whether stored values start with an expiry header (see levelorm.expiry)
+	_expiring: bool = False
+	_expiry_prefix: bytes
+	# fieldname: (position in _value_fields, field, index prefix)
+	_indexes: Dict[str, Tuple[int, fields.BaseField, bytes]]
+	_projections: Dict[Tuple[str, ...], Tuple[Any, Callable[[Any], tuple]]]
+	# whether writes go through _update_indexes: to update index entries, the counter or the expiry index, or so
+	# that writing back an upgraded value can't replace a value saved after it was read
+	_maintained: bool = False
+	_counter_key: bytes
+	_counter_lock: threading.Lock
+	# held while the records of _maintained models in a batch are compared with the stored ones and written
+	_write_lock: threading.Lock
+	_slot_setters: Optional[Tuple[Callable[[Any, Any], None], ...]]
+
+	__slots__ = ()
 
 	def __init__(self, *args, **kwargs) -> None:
 		num_args = len(args) + len(kwargs)
@@ -68,34 +322,283 @@ class BaseModel(metaclass=ModelMeta):
 						(self.__class__.__name__, fieldname))
 			setattr(self, fieldname, value)
 
-		self._key = getattr(self, self._keyname)
+		if self._keyname is not None:
+			self._key = getattr(self, self._keyname)
+		else:
+			self._key = tuple(getattr(self, keyname) for keyname in self._keynames)
 
-	def save(self) -> None:
+	@metrics.instrumented('save')
+	def save(self, force: bool = False, expires_at: Optional[float] = None) -> None:
 		'''
 		writes this instance to the :attr:`db`.
 		members are serialized in the order they are defined on the model and are 4-byte aligned
-		'''
-		buf = io.BytesIO()
-		for fieldname in self._fields:
-			if fieldname == self._keyname:
-				continue
-			field = getattr(self.__class__, fieldname)
-			value = getattr(self, fieldname)
-			field.serialize(buf, value)
+		(unless the model has ``format = 'compact'``).
 
-			# alignment
-			remainder = buf.tell() % 4
-			if remainder != 0:
-				padding = 4 - remainder
-				buf.write(b'\0' * padding)
+		an instance read from the :attr:`db` (or already saved) remembers the value it was read as. saving it
+		does nothing if none of its fields changed (see :meth:`changed_fields`) and otherwise only re-encodes
+		the ones that did. pass ``force=True`` to write it anyway, e.g. if the record may have been deleted
+		by someone else since it was read.
 
-		keyfield = getattr(self.__class__, self._keyname)
-		self.db.put(keyfield.serialize_key(self._key), buf.getvalue())
+		``expires_at`` is a :func:`time.time` timestamp after which the record is treated as missing. it
+		overrides the model's ``ttl``; see :mod:`levelorm.expiry`
+		'''
+		cls = self.__class__
+		codec = cls._codec
+		if expires_at is not None:
+			if not cls._expiring:
+				raise ValueError('%s does not expire records' % cls.__name__)
+			force = True
+		raw = getattr(self, '_raw', None)
+		if raw is None:
+			values = [getattr(self, fieldname) for fieldname in codec.names]
+			data = codec.encode(values)
+		else:
+			values = self._values_or_missing()
+			if MISSING not in values:
+				data = codec.encode(values)
+				if data == raw and not force:
+					return
+			else:
+				# a lazy record: keep the encodings of the fields it hasn't loaded
+				offsets = self._field_offsets(raw)
+				changes = codec.changes(raw, offsets, values)
+				if not changes and not force:
+					return
+				data = codec.splice(raw, offsets, changes)
+				if cls._indexes:
+					values = [getattr(self, fieldname) for fieldname in codec.names]
+		stored = data
+		if cls._compressor is not None:
+			stored = cls._compressor.compress(data)
+		if cls._expiring:
+			if expires_at is None and cls.ttl is not None:
+				expires_at = time.time() + cls.ttl
+			stored = (expiry.NEVER_HEADER if expires_at is None else expiry.header.pack(expiry.stamp(expires_at))) + stored
+		key = cls._keyfield.serialize_key(self._key)
+		if cls._maintained:
+			with self.batch():
+				self._update_indexes(key, values, stored)
+		else:
+			self._put(key, stored)
+		self._raw = data
+		if not cls.slots:
+			self.__dict__.pop('_offsets', None)
 
+	@metrics.instrumented('delete')
 	def delete(self) -> None:
 		''' deletes this instance from the :attr:`db`. no error is raised if the key was not found '''
-		keyfield = getattr(self.__class__, self._keyname)
-		self.db.delete(keyfield.serialize_key(self._key))
+		self._delete(self.__class__._keyfield.serialize_key(self._key))
+		if getattr(self, '_raw', None) is not None:
+			# the next save() must write every field, so decode the ones a lazy record hasn't loaded yet
+			for fieldname in self._codec.names:
+				getattr(self, fieldname)
+			self._raw = None
+
+	def is_dirty(self) -> bool:
+		''' whether :meth:`save` would write anything (without ``force``) '''
+		return bool(self.changed_fields())
+
+	def changed_fields(self) -> List[str]:
+		'''
+		the value fields that were assigned or mutated since this instance was read or saved, in the order they are
+		defined. a field assigned a value equal to the one it had (or mutated back) doesn't count.
+		every value field has changed in an instance that was never read or saved
+		'''
+		codec = self._codec
+		raw = getattr(self, '_raw', None)
+		if raw is None:
+			return list(codec.names)
+		changes = codec.changes(raw, self._field_offsets(raw), self._values_or_missing())
+		return [fieldname for i, fieldname in enumerate(codec.names) if i in changes]
+
+	def _values_or_missing(self) -> list:
+		''' the values of the value fields, with :data:`levelorm.codec.MISSING` for fields a lazy record hasn't loaded '''
+		if self.slots:
+			return [getattr(self, fieldname) for fieldname in self._codec.names]
+		attrs = self.__dict__
+		return [attrs.get(fieldname, MISSING) for fieldname in self._codec.names]
+
+	def _field_offsets(self, raw) -> Tuple[int, ...]:
+		''' the offsets of the fields in ``raw``, the value this instance was read as '''
+		if self.slots:
+			return self._codec.offsets(raw)
+		attrs = self.__dict__
+		offsets = attrs.get('_offsets')
+		if offsets is None:
+			offsets = attrs['_offsets'] = self._codec.offsets(raw)
+		return offsets
+
+	@classmethod
+	def _put(cls, key: bytes, data: bytes) -> None:
+		batch = cls._local.batch
+		if batch is None:
+			cls.db.put(key, data)
+			cls._invalidate(key)
+		else:
+			batch.put(cls, key, data)
+			cls._invalidate(key, batch)
+
+	@classmethod
+	def _delete(cls, key: bytes) -> None:
+		if cls._maintained:
+			with cls.batch():
+				cls._update_indexes(key, None, None)
+			return
+		batch = cls._local.batch
+		if batch is None:
+			cls.db.delete(key)
+			cls._invalidate(key)
+		else:
+			batch.delete(cls, key)
+			cls._invalidate(key, batch)
+
+	@classmethod
+	def _invalidate(cls, key: bytes, batch: Optional[WriteBatch] = None) -> None:
+		cache = cls._cache
+		if cache is None:
+			return
+		if batch is None:
+			cache.invalidate(cls.db.prefix + key)
+		else:
+			batch.invalidate(cache, cls.db.prefix + key)
+
+	@classmethod
+	def _update_indexes(cls, key: bytes, values: Optional[Sequence[Any]], data: Optional[bytes],
+			expected: Any = _UNCONDITIONAL) -> None:
+		'''
+		writes (or, if ``data`` is None, deletes) a record and its index entries when the :meth:`batch` it is
+		called in is written (see :meth:`WriteBatch.write_maintained`), removing index entries for the value it
+		replaces then, and counts it if the model is ``counted``. if ``expected`` is passed, nothing is written
+		unless the stored value is still ``expected`` then. must be called inside :meth:`batch`
+		'''
+		batch = cls._local.batch
+		assert batch is not None
+		batch.maintained.append((cls, key, values, data, expected))
+		batch.pending[cls.db.prefix + key] = data
+		cls._invalidate(key, batch)
+
+	@classmethod
+	def _write_maintained(cls, batch: WriteBatch, key: bytes, old_data: Optional[bytes], values: Optional[Sequence[Any]],
+			data: Optional[bytes]) -> None:
+		''' used by :meth:`WriteBatch.write_maintained` to write a record that replaces ``old_data`` '''
+		write_batch = batch.write_batch
+		full_key = cls.db.prefix + key
+		old_values = None
+		# for records in an older version: {name: (field, value)} of the index entries it was written with
+		old_indexed = None
+		if cls._expiring:
+			cls._update_expiry(write_batch, key, old_data, data)
+		if cls.counted:
+			batch.counts[cls] += (data is not None) - (old_data is not None)
+		if old_data is not None:
+			if cls._expiring:
+				old_data = old_data[expiry.HEADER_SIZE:]
+			if cls._compressor is not None:
+				old_data = cls._compressor.decompress(old_data)
+			if cls._schema is not None and old_data[:4] != cls._schema.header:
+				old_indexed = cls._schema.indexed_values(old_data)
+			else:
+				old_values = cls._codec.decode(old_data)
+
+		for name, (i, field, index_prefix) in cls._indexes.items():
+			old_entry = new_entry = None
+			if old_values is not None:
+				old_entry = index_prefix + field.pack_ordered(old_values[i]) + key
+			elif old_indexed is not None and name in old_indexed:
+				old_field, old_value = old_indexed[name]
+				old_entry = index_prefix + old_field.pack_ordered(old_value) + key
+			if values is not None:
+				new_entry = index_prefix + field.pack_ordered(values[i]) + key
+			if old_entry != new_entry:
+				if old_entry is not None:
+					write_batch.delete(old_entry)
+				if new_entry is not None:
+					write_batch.put(new_entry, b'')
+
+		if data is None:
+			write_batch.delete(full_key)
+		else:
+			write_batch.put(full_key, data)
+		if cls._hook is not None:
+			metrics.add_io(0.0, bytes_written=len(full_key) + (len(data) if data is not None else 0))
+
+	@classmethod
+	def _update_expiry(cls, write_batch, key: bytes, old_data: Optional[bytes], data: Optional[bytes]) -> None:
+		''' replaces the expiry index entry of a record when :meth:`_update_indexes` writes it '''
+		old_header = old_data[:expiry.HEADER_SIZE] if old_data is not None else expiry.NEVER_HEADER
+		new_header = data[:expiry.HEADER_SIZE] if data is not None else expiry.NEVER_HEADER
+		if old_header == new_header:
+			return
+		if old_header != expiry.NEVER_HEADER:
+			write_batch.delete(cls._expiry_prefix + old_header + key)
+		if new_header != expiry.NEVER_HEADER:
+			write_batch.put(cls._expiry_prefix + new_header + key, b'')
+
+	@classmethod
+	@contextlib.contextmanager
+	def batch(cls, sync: bool = False, transaction: bool = True) -> Iterator[WriteBatch]:
+		'''
+		a context manager that buffers every :meth:`save` and :meth:`delete` in this thread (for any model
+		sharing this model's base) and writes them with one ``plyvel.DB.write_batch``.
+		with ``transaction=True``, nothing is written if the block raises. ::
+
+			with Animal.batch() as b:
+				Animal('cow', 'moo', True, 87.0).save()
+				Numbers('fibonacci', [1, 1, 2, 3]).save()
+
+		nested calls join the outermost batch
+		'''
+		local = cls._local
+		if local.batch is not None:
+			yield local.batch
+			return
+		locks: List[threading.Lock] = []
+		try:
+			with cls._base_db.write_batch(sync=sync, transaction=transaction) as write_batch:
+				batch = local.batch = WriteBatch(write_batch)
+				try:
+					yield batch
+				finally:
+					local.batch = None
+				batch.add_maintained(cls._write_lock, locks)
+				# the batch is written when the with block exits (unless add_maintained wrote it)
+				started = time.perf_counter()
+			metrics.add_io(time.perf_counter() - started)
+		finally:
+			for lock in locks:
+				lock.release()
+		# a get() while the batch was open may have cached the values it replaced
+		for cache, key in batch.invalidated:
+			cache.invalidate(key)
+
+	@classmethod
+	@metrics.instrumented('save_many')
+	def save_many(cls, instances: Iterable['BaseModel'], sync: bool = False, force: bool = False,
+			expires_at: Optional[float] = None) -> None:
+		''' :meth:`save` every instance in one :meth:`batch` '''
+		with cls.batch(sync=sync):
+			for instance in instances:
+				instance.save(force, expires_at)
+
+	@classmethod
+	@metrics.instrumented('delete_many')
+	def delete_many(cls, keys: Iterable[Union[str, bytes]], sync: bool = False) -> None:
+		''' delete every key in one :meth:`batch`. no error is raised for keys that were not found '''
+		serialize_key = cls._keyfield.serialize_key
+		with cls.batch(sync=sync):
+			for key in keys:
+				cls._delete(serialize_key(key))
+
+	def _load_field(self, fieldname: str):
+		''' decodes a field of a lazy record the first time it is accessed '''
+		attrs = self.__dict__
+		raw = getattr(self, '_raw', None)
+		if raw is None:
+			raise AttributeError('%r object has no attribute %r' % (self.__class__.__name__, fieldname))
+		i = self._codec.positions[fieldname]
+		value = self._codec.unpackers[i](raw, self._field_offsets(raw)[i])[0]
+		attrs[fieldname] = value
+		return value
 
 	def __repr__(self) -> str:
 		args = []
@@ -114,61 +617,830 @@ class BaseModel(metaclass=ModelMeta):
 		return True
 
 	@classmethod
-	def get(cls: Type[Model], key: Union[str, bytes]) -> Union[Model, None]:
-		''' return an instance of the model by querying :attr:`db` and parsing the result '''
-		keyfield = getattr(cls, cls._keyname)
-		data = cls.db.get(keyfield.serialize_key(key))
-		if data is None:
+	@metrics.instrumented('get')
+	def get(cls: Type[Model], key: Union[str, bytes], lazy: Optional[bool] = None,
+			fieldnames: Optional[Sequence[str]] = None) -> Union[Model, tuple, None]:
+		'''
+		return an instance of the model by querying :attr:`db` and parsing the result.
+		if a cache was configured (see :meth:`levelorm.db_base_model`), decoded records are cached.
+		see :meth:`parse` for ``lazy`` and :meth:`projection` for ``fieldnames``
+		'''
+		key_bytes = cls._keyfield.serialize_key(key)
+		source = cls._source()
+		if fieldnames is not None:
+			record, project = cls._projection(fieldnames)
+			data = source.get(key_bytes)
+			if data is None or cls._expiring and expiry.expired(data, expiry.now()):
+				return None
+			if not cls._plain:
+				data = cls._current(key_bytes, data)
+			return record._make(cls._key_values(key) + project(data))
+
+		cache = cls._session_cache()
+		if cache is None:
+			data = source.get(key_bytes)
+			if data is None or cls._expiring and expiry.expired(data, expiry.now()):
+				return None
+			return cls.parse(key, data, lazy)
+
+		cache_key = cls.db.prefix + key_bytes
+		entry = cache.get(cache_key)
+		if entry is None:
+			# a save can replace the value between the read and the put; the put is skipped then
+			generation = cache.generation()
+			data = source.get(key_bytes)
+			if data is None or cls._expiring and expiry.expired(data, expiry.now()):
+				cache.put_absent(cache_key, generation)
+				return None
+			entry = cls._cache_entry(key_bytes, data)
+			cache.put(cache_key, entry, len(entry[1]), generation)
+		elif entry is ABSENT:
+			return None
+		elif cls._expiring and entry[2] <= expiry.now():
+			cache.invalidate(cache_key)
 			return None
-		return cls.parse(key, data)
+		return cls._from_cached(key, entry)
 
 	@classmethod
-	def parse(cls: Type[Model], key: Union[str, bytes], data: bytes) -> Model:
-		''' used internally by :meth:`get` and :meth:`iter` to deserialize values '''
-		buf = io.BytesIO(data)
-		kwargs = {cls._keyname: key}
-		for fieldname in cls._fields:
-			if fieldname == cls._keyname:
-				continue
-			field = getattr(cls, fieldname)
-			kwargs[fieldname] = field.deserialize(buf)
+	def _cache_entry(cls, key: bytes, stored: bytes) -> tuple:
+		''' the cache entry of a stored value: its decoded values, the value :attr:`_codec` encodes and its expiry '''
+		data = stored if cls._plain else cls._current(key, stored)
+		if cls._expiring:
+			return (cls._codec.decode(data), data, expiry.header.unpack_from(stored)[0])
+		return (cls._codec.decode(data), data)
 
-			# alignment
-			remainder = buf.tell() % 4
-			if remainder != 0:
-				padding = 4 - remainder
-				buf.seek(padding, io.SEEK_CUR)
-		return cls(**kwargs)
+	@classmethod
+	def projection(cls, fieldnames: Sequence[str]) -> type:
+		'''
+		the :func:`collections.namedtuple` returned by ``get(key, fieldnames=fieldnames)`` and
+		``iter(fieldnames=fieldnames)``. its first members are the key fields, followed by the fields in ``fieldnames``.
+		only those fields are decoded; the others are skipped over without being decoded
+		'''
+		return cls._projection(fieldnames)[0]
 
 	@classmethod
+	def _projection(cls, fieldnames: Sequence[str]) -> Tuple[Any, Callable[[Any], tuple]]:
+		''' returns :meth:`projection` and a function decoding the fields it holds '''
+		fieldnames = tuple(fieldnames)
+		projection = cls._projections.get(fieldnames)
+		if projection is None:
+			project = cls._codec.projector(fieldnames)
+			record = collections.namedtuple(cls.__name__ + 'Projection', cls._keynames + fieldnames) # type: ignore
+			projection = cls._projections[fieldnames] = (record, project)
+		return projection
+
+	@classmethod
+	def cache_stats(cls) -> Optional[Dict[str, int]]:
+		''' entry count, size in bytes, hits, misses and evictions of this model's cache (None if there isn't one) '''
+		if cls._cache is None:
+			return None
+		return cls._cache.stats()
+
+	@classmethod
+	@metrics.instrumented('get_many')
+	def get_many(cls: Type[Model], keys: Iterable[Union[str, bytes]], snapshot: bool = True) -> List[Optional[Model]]:
+		'''
+		return an instance (or None if it was not found) for every key, in the same order as ``keys``.
+		duplicate keys are only fetched and parsed once (and share an instance).
+		keys are fetched in sorted order from one ``plyvel.DB.snapshot`` unless ``snapshot=False``
+		(or from the :meth:`read_session`'s).
+		when there are enough keys, they are read with a single bounded iterator that steps forward over
+		short gaps between keys and only seeks over long ones
+		'''
+		serialize_key = cls._keyfield.serialize_key
+		keys = list(keys)
+		serialized = [serialize_key(key) for key in keys]
+		wanted = sorted(set(serialized))
+		if not wanted:
+			return []
+
+		cache = cls._session_cache()
+		cached = {}
+		generation = None
+		if cache is not None:
+			generation = cache.generation()
+			now = expiry.now() if cls._expiring else 0
+			for key_bytes in wanted:
+				entry = cache.get(cls.db.prefix + key_bytes)
+				if entry is not None and not (cls._expiring and entry is not ABSENT and entry[2] <= now):
+					cached[key_bytes] = entry
+			wanted = [key_bytes for key_bytes in wanted if key_bytes not in cached]
+
+		found: Dict[bytes, bytes] = {}
+		session = cls._local.session
+		if wanted and session is not None:
+			found = cls._fetch_sorted(cls._source(), wanted, session)
+		elif wanted:
+			source = cls.db.snapshot() if snapshot else cls.db
+			try:
+				found = cls._fetch_sorted(source, wanted)
+			finally:
+				if snapshot:
+					source.release()
+		if cls._expiring:
+			now = expiry.now()
+			found = {key_bytes: data for key_bytes, data in found.items() if not expiry.expired(data, now)}
+
+		instances: Dict[bytes, Model] = {}
+		results: List[Optional[Model]] = []
+		for key, key_bytes in zip(keys, serialized):
+			instance = instances.get(key_bytes)
+			if instance is None:
+				entry = cached.get(key_bytes)
+				if entry is not None:
+					if entry is not ABSENT:
+						instance = instances[key_bytes] = cls._from_cached(key, entry)
+				elif key_bytes in found:
+					entry = cls._cache_entry(key_bytes, found[key_bytes])
+					if cache is not None:
+						cache.put(cls.db.prefix + key_bytes, entry, len(entry[1]), generation)
+					instance = instances[key_bytes] = cls._from_values(key, entry[0], entry[1])
+			results.append(instance)
+		if cache is not None:
+			for key_bytes in wanted:
+				if key_bytes not in found:
+					cache.put_absent(cls.db.prefix + key_bytes, generation)
+		return results
+
+	# get_many with fewer keys than this uses point gets instead of an iterator
+	_MIN_SWEEP_KEYS = 8
+	# how many entries get_many steps over before seeking to the next wanted key
+	_SWEEP_STEPS = 8
+
+	@classmethod
+	def _fetch_sorted(cls, source, wanted: List[bytes], session: Optional[ReadSession] = None) -> Dict[bytes, bytes]:
+		''' used internally by :meth:`get_many`. ``wanted`` must be sorted and unique '''
+		if hasattr(cls._base_db, 'get_many'):
+			# a levelorm.server.RemoteDB reads them all in one request
+			return {key: data for key, data in zip(wanted, source.get_many(wanted)) if data is not None}
+		found = {}
+		if len(wanted) < cls._MIN_SWEEP_KEYS:
+			for key in wanted:
+				data = source.get(key)
+				if data is not None:
+					found[key] = data
+			return found
+		if session is not None:
+			return cls._sweep_raw(session, wanted)
+
+		with source.iterator(start=wanted[0], stop=wanted[-1], include_stop=True) as it:
+			current = next(it, None)
+			for key in wanted:
+				steps = 0
+				while current is not None and current[0] < key and steps < cls._SWEEP_STEPS:
+					current = next(it, None)
+					steps += 1
+				if current is not None and current[0] < key:
+					it.seek(key)
+					current = next(it, None)
+				if current is not None and current[0] == key:
+					found[key] = current[1]
+		return found
+
+	@classmethod
+	def _sweep_raw(cls, session: ReadSession, wanted: List[bytes]) -> Dict[bytes, bytes]:
+		''' :meth:`_fetch_sorted` with one of the session's raw iterators instead of a new bounded one '''
+		found = {}
+		prefix = cls.db.prefix
+		started = time.perf_counter()
+		read = 0
+		with session.raw_iterator() as it:
+			it.seek(prefix + wanted[0])
+			for key in wanted:
+				full_key = prefix + key
+				steps = 0
+				while it.valid() and it.key() < full_key and steps < cls._SWEEP_STEPS:
+					it.next()
+					steps += 1
+				if it.valid() and it.key() < full_key:
+					it.seek(full_key)
+				if it.valid() and it.key() == full_key:
+					data = found[key] = it.value()
+					read += len(full_key) + len(data)
+		if cls._hook is not None:
+			metrics.add_io(time.perf_counter() - started, read)
+		return found
+
+	@classmethod
+	def parse(cls: Type[Model], key: Union[str, bytes, tuple], data: bytes, lazy: Optional[bool] = None) -> Model:
+		'''
+		used internally by :meth:`get` and :meth:`iter` to deserialize values.
+
+		with ``lazy=True`` (or, if ``lazy`` is None, when the model sets ``lazy = True``), only the offsets
+		of the fields are computed and each field is decoded the first time it is accessed.
+		like any record read from the :attr:`db`, saving it without changing any of its fields does nothing.
+		models with ``slots = True`` can't be parsed lazily.
+		records in an older version of the model are upgraded first (see :mod:`levelorm.schema`)
+		and compressed ones are decompressed (see :mod:`levelorm.compression`)
+		'''
+		if not cls._plain:
+			data = cls._current(cls._keyfield.serialize_key(key), data)
+		return cls._parse_current(key, data, lazy)
+
+	@classmethod
+	def _parse_current(cls: Type[Model], key, data: bytes, lazy: Optional[bool] = None) -> Model:
+		''' :meth:`parse` for ``data`` that is already in the form :attr:`_codec` encodes '''
+		if lazy is None:
+			lazy = cls.lazy
+		if not lazy:
+			return cls._from_values(key, cls._codec.decode(data), data)
+		if cls.slots:
+			raise ValueError('%s has slots so it cannot be parsed lazily' % cls.__name__)
+		instance = cls.__new__(cls)
+		attrs = instance.__dict__
+		if cls._keyname is not None:
+			attrs[cls._keyname] = key
+		else:
+			attrs.update(zip(cls._keynames, key))
+		attrs['_offsets'] = cls._codec.offsets(data)
+		instance._key = key
+		instance._raw = data
+		return instance
+
+	@classmethod
+	def _from_values(cls: Type[Model], key, values, data: bytes) -> Model:
+		'''
+		builds an instance from a key and the values decoded from ``data`` (which it remembers for
+		:meth:`changed_fields`) without going through ``__init__``
+		'''
+		instance = cls.__new__(cls)
+		setters = cls._slot_setters
+		if setters is None:
+			attrs = instance.__dict__
+			attrs.update(zip(cls._codec.names, values))
+			if cls._keyname is not None:
+				attrs[cls._keyname] = key
+			else:
+				attrs.update(zip(cls._keynames, key))
+		else:
+			for setter, value in zip(setters, values):
+				setter(instance, value)
+			for keyname, value in zip(cls._keynames, cls._key_values(key)):
+				setattr(instance, keyname, value)
+		instance._key = key
+		instance._raw = data
+		return instance
+
+	@classmethod
+	def _from_cached(cls: Type[Model], key, entry: tuple) -> Model:
+		''' like :meth:`_from_values` for a cache entry but copies values that could be mutated in the cache '''
+		values, data = entry[0], entry[1]
+		mutable = cls._codec.mutable
+		if mutable:
+			values = list(values)
+			for i in mutable:
+				values[i] = _copy_lists(values[i])
+		return cls._from_values(key, values, data)
+
+	@classmethod
+	@metrics.instrumented_iter('iter_by')
+	def iter_by(cls: Type[Model], fieldname: str, value=None, start=None, stop=None,
+			reverse: bool = False) -> Iterator[Model]:
+		'''
+		yields instances in the order of the ``index=True`` field ``fieldname``.
+		pass ``value`` to only yield instances where the field is equal to it, otherwise
+		``start`` (inclusive) and ``stop`` (exclusive) bound the range of field values.
+		index entries and records are read from one snapshot (the :meth:`read_session`'s if there is one).
+		records whose field no longer has the value of their index entry are skipped
+		'''
+		try:
+			_, field, index_prefix = cls._indexes[fieldname]
+		except KeyError as e:
+			raise InvalidModel('%s.%s is not indexed' % (cls.__name__, fieldname)) from e
+
+		if value is not None:
+			range_start = index_prefix + field.pack_ordered(value)
+			range_stop = prefix_stop(range_start)
+		else:
+			range_start = index_prefix
+			range_stop = prefix_stop(index_prefix)
+			if start is not None:
+				range_start = index_prefix + field.pack_ordered(start)
+			if stop is not None:
+				range_stop = index_prefix + field.pack_ordered(stop)
+
+		deserialize_key = cls._keyfield.deserialize_key
+		record_prefix = cls.db.prefix
+		session = cls._local.session
+		now = expiry.now() if cls._expiring else 0
+		with contextlib.ExitStack() as stack:
+			if session is None:
+				source: Any = stack.enter_context(cls._base_db.snapshot())
+			else:
+				source = session
+			it = stack.enter_context(source.iterator(start=range_start, stop=range_stop, reverse=reverse,
+					include_value=False))
+			for entry in it:
+				indexed, end = field.unpack_ordered_from(entry, len(index_prefix))
+				key = entry[end:]
+				data = source.get(record_prefix + key)
+				if data is None or cls._expiring and expiry.expired(data, now):
+					continue
+				instance = cls.parse(deserialize_key(key), data)
+				if getattr(instance, fieldname) == indexed:
+					yield instance
+
+	@classmethod
+	@metrics.instrumented_iter('iter')
 	def iter(cls: Type[Model], **kwargs) -> Iterator[Union[Model, str]]:
 		'''
 		proxies to `plyvel.DB.iterator <https://plyvel.readthedocs.io/en/latest/api.html#iterator>`_
-		but yields ``(str, BaseModel)`` pairs instead of ``(bytes, bytes)``
+		but yields ``(str, BaseModel)`` pairs instead of ``(bytes, bytes)``.
+		see :meth:`parse` for ``lazy`` and :meth:`projection` for ``fieldnames``.
+		with ``as_tuples=True``, records are yielded as :attr:`Record` namedtuples instead of instances.
+
+		``where`` is a condition built from the model's fields (see :mod:`levelorm.query`); it is checked
+		against the raw bytes and only matching records are decoded. ``limit`` stops after that many results.
+
+		``start``, ``stop`` and ``prefix`` are keys. for models with several key fields (see
+		:class:`levelorm.fields.CompositeKey`), they can be tuples of only the first few key values: ::
+
+			Event.iter(prefix=('acme',))                                  # every event of one tenant
+			Event.iter(start=('acme', 1500000000), stop=('acme', 1600000000))
 		'''
-		keyfield = getattr(cls, cls._keyname)
-		if 'start' in kwargs:
-			kwargs['start'] = keyfield.serialize_key(kwargs['start'])
+		lazy = kwargs.pop('lazy', None)
+		fieldnames = kwargs.pop('fieldnames', None)
+		where = kwargs.pop('where', None)
+		limit = kwargs.pop('limit', None)
+		as_tuples = kwargs.pop('as_tuples', False)
+		include_value = kwargs.get('include_value', True)
+		if as_tuples and (fieldnames is not None or not include_value):
+			raise ValueError('as_tuples cannot be combined with fieldnames or include_value=False')
+		test, needs_value = cls._prepare_scan(kwargs, where, include_value or fieldnames is not None)
+
+		deserialize_key = cls._keyfield.deserialize_key
+		if fieldnames is not None:
+			record, project = cls._projection(fieldnames)
+			make = record._make
+			key_values = cls._key_values
+			def result(key, data):
+				return make(key_values(deserialize_key(key)) + project(data))
+		elif as_tuples and cls._keyname is not None:
+			make = cls.Record._make
+			decode = cls._codec.decode
+			key_position = cls._fields.index(cls._keyname)
+			def result(key, data):
+				values = decode(data)
+				return make(values[:key_position] + (deserialize_key(key),) + values[key_position:])
+		elif as_tuples:
+			make = cls.Record._make
+			decode = cls._codec.decode
+			# (1 for key fields and 0 for value fields, position in the key or value) of every field
+			order = [(1, cls._keynames.index(name)) if name in cls._keynames else (0, cls._codec.positions[name])
+					for name in cls._fields]
+			def result(key, data):
+				parts = (decode(data), deserialize_key(key))
+				return make([parts[part][i] for part, i in order])
+		elif include_value:
+			parse = cls._parse_current
+			def result(key, data):
+				return parse(deserialize_key(key), data, lazy)
+		else:
+			def result(key, data):
+				return deserialize_key(key)
+
+		if limit is not None and limit <= 0:
+			return
+		count = 0
+		with cls._source().iterator(**kwargs) as it:
+			if not needs_value:
+				it = ((key, None) for key in it)
+			elif not cls._plain:
+				it = cls._upgrading(it)
+			for key, data in it:
+				if test is not None and not test(key, data):
+					continue
+				yield result(key, data)
+				count += 1
+				if count == limit:
+					break
+
+	@classmethod
+	def _prepare_scan(cls, kwargs: Dict[str, Any], where, needs_value: bool) -> Tuple[Optional[Callable], bool]:
+		'''
+		turns the arguments of :meth:`iter` left in ``kwargs`` into ``plyvel.DB.iterator`` arguments in place.
+		returns the compiled ``where`` (or None) and whether values have to be read
+		'''
+		cls._serialize_range(kwargs)
+		test = None
+		if where is not None:
+			test, test_needs_value = query.compile_condition(cls, where)
+			needs_value = needs_value or test_needs_value
+			prefix = query.key_prefix(cls, where)
+			if prefix is not None and 'start' not in kwargs and 'stop' not in kwargs and 'prefix' not in kwargs:
+				kwargs['prefix'] = prefix
+		# expired records are recognized by their values
+		needs_value = needs_value or cls._expiring
+		kwargs['include_value'] = needs_value
+		return test, needs_value
+
+	@classmethod
+	@metrics.instrumented('count')
+	def count(cls, where=None, **kwargs) -> int:
+		'''
+		the number of records in the range (``start``, ``stop``, ``prefix`` and the other arguments of
+		``plyvel.DB.iterator`` as in :meth:`iter`) that match ``where``. only the keys are read unless ``where``
+		needs values. counting every record of a model with ``counted = True`` only reads its counter
+		'''
+		if cls.counted and where is None and not kwargs:
+			return cls._read_counter()
+		test, needs_value = cls._prepare_scan(kwargs, where, False)
+		count = 0
+		with cls._source().iterator(**kwargs) as it:
+			if test is None:
+				if cls._expiring:
+					it = cls._unexpired(it)
+				for _ in it:
+					count += 1
+				return count
+			if not needs_value:
+				it = ((key, None) for key in it)
+			elif not cls._plain:
+				it = cls._upgrading(it)
+			for key, data in it:
+				if test(key, data):
+					count += 1
+		return count
+
+	@classmethod
+	def _read_counter(cls) -> int:
+		session = cls._local.session
+		stored = (session or cls._base_db).get(cls._counter_key)
+		if stored is not None:
+			return _counter.unpack(stored)[0]
+		if session is not None and session.snapshot is not None:
+			with cls._source().iterator(include_value=False) as it:
+				return sum(1 for _ in it)
+		return cls.recount()
+
+	@classmethod
+	def recount(cls) -> int:
+		'''
+		counts the records of a model with ``counted = True`` and stores the count. :meth:`count` does this the
+		first time it is called (after ``counted = True`` was added to a model with records, for example).
+		writes of the model by this process wait until it finishes
+		'''
+		if not cls.counted:
+			raise ValueError('%s is not counted' % cls.__name__)
+		with cls._counter_lock:
+			with cls.db.iterator(include_value=False) as it:
+				count = sum(1 for _ in it)
+			cls._base_db.put(cls._counter_key, _counter.pack(count))
+		return count
+
+	@classmethod
+	@metrics.instrumented('aggregate')
+	def aggregate(cls, sum=None, min=None, max=None, histogram=None, group_by=None, where=None,
+			**kwargs) -> Dict[Any, Any]:
+		'''
+		the count and the ``sum``, ``min``, ``max`` and ``histogram`` of fields of the records in the range
+		(see :meth:`count`) that match ``where``, by ``group_by`` if it is given. the values are decoded from
+		the raw records without building instances; see :mod:`levelorm.aggregate`. ::
+
+			Animal.aggregate(sum='decibels', max='decibels', group_by='shouts')
+		'''
+		aggregator = aggregate.Aggregator(cls, sum, min, max, histogram, group_by)
+		test, needs_value = cls._prepare_scan(kwargs, where, aggregator.needs_value)
+		add = aggregator.add
+		with cls._source().iterator(**kwargs) as it:
+			if not needs_value:
+				it = ((key, None) for key in it)
+			elif not cls._plain:
+				it = cls._upgrading(it)
+			for key, data in it:
+				if test is None or test(key, data):
+					add(key, data)
+		return aggregator.result()
+
+	@classmethod
+	@metrics.instrumented('scan_columns')
+	def scan_columns(cls, columns: Sequence[str], include_key: bool = False, **kwargs) -> Dict[str, Any]:
+		'''
+		decodes the ``Integer``, ``Float`` or ``Boolean`` fields named in ``columns`` (or an ``Array`` of one)
+		for every record in the range straight into arrays instead of building instances. ::
+
+			columns = Animal.scan_columns(['decibels', 'shouts'], start='a', stop='m')
+			columns['decibels'].mean()
+
+		returns a dict of field name to a numpy array (or :class:`array.array` if numpy isn't installed).
+		``Array`` fields are returned as ``(offsets, values)``; see :class:`levelorm.columns.ColumnScanner`.
+		with ``include_key=True``, the dict also has a list of the values of each key field under its name.
+		other arguments are passed to ``plyvel.DB.iterator`` as in :meth:`iter`
+		'''
+		scanner = ColumnScanner(cls._codec, columns)
+		cls._serialize_range(kwargs)
+		kwargs['include_value'] = True
+		kwargs['include_key'] = include_key or not cls._plain
+		with cls._source().iterator(**kwargs) as it:
+			if not cls._plain:
+				it = cls._upgrading(it)
+				if not include_key:
+					return scanner.scan(data for _, data in it)
+			if not include_key:
+				return scanner.scan(it)
+			keys: List[bytes] = []
+			result = scanner.scan(split_keys(it, keys))
+		deserialize_key = cls._keyfield.deserialize_key
+		if cls._keyname is not None:
+			result[cls._keyname] = [deserialize_key(key) for key in keys]
+		else:
+			key_values = [deserialize_key(key) for key in keys]
+			for i, keyname in enumerate(cls._keynames):
+				result[keyname] = [values[i] for values in key_values]
+		return result
+
+	@classmethod
+	def parallel_scan(cls, fn: Callable, workers: Optional[int] = None, mode: str = 'map', ordered: bool = True,
+			initial=None, combine: Optional[Callable] = None, start=None, stop=None) -> Any:
+		'''
+		applies ``fn`` to every record in the range in a pool of ``workers`` processes (by default, one per CPU). ::
+
+			loud = Animal.parallel_scan(is_loud, mode='filter', start='a', stop='m')
+			total = Animal.parallel_scan(add_decibels, mode='reduce', initial=0, combine=operator.add)
+
+		``mode='map'`` returns a list of ``fn(record)``, ``'filter'`` a list of the records for which ``fn`` is true
+		and ``'reduce'`` reduces each partition with ``fn(accumulated, record)`` starting from ``initial`` and then
+		the partition results with ``combine`` (``fn`` by default), so ``initial`` should be an identity for it.
+		lists are in key order unless ``ordered=False``, which returns them in the order partitions finish.
+
+		this process reads the range and sends the raw records to the workers to be decoded;
+		see :mod:`levelorm.parallel`. ``fn`` must be picklable (defined at the top level of a module)
+		'''
+		workers = workers or os.cpu_count() or 1
+		kwargs: Dict[str, Any] = {}
+		if start is not None:
+			kwargs['start'] = start
+		if stop is not None:
+			kwargs['stop'] = stop
+		cls._serialize_range(kwargs)
+
+		range_start = cls.db.prefix + kwargs.get('start', b'')
 		if 'stop' in kwargs:
-			kwargs['stop'] = keyfield.serialize_key(kwargs['stop'])
+			range_stop = cls.db.prefix + kwargs['stop']
+		else:
+			range_stop = prefix_stop(cls.db.prefix) or b'\xff' * 8
+		size = parallel.partition_bytes(cls._base_db.approximate_size(range_start, range_stop), workers)
+		with cls._source().iterator(**kwargs) as it:
+			if cls._expiring:
+				it = cls._unexpired(it)
+			return parallel.parallel_scan(cls, fn, it, workers, size, mode, ordered, initial, combine)
+
+	@classmethod
+	@contextlib.contextmanager
+	def read_session(cls, snapshot: bool = True, fill_cache: bool = False) -> Iterator[ReadSession]:
+		'''
+		a context manager that makes the reads of every model sharing this model's base in this thread go through
+		one :class:`levelorm.session.ReadSession`: from one ``plyvel.DB.snapshot`` with ``snapshot=True`` and
+		without filling leveldb's block cache or the model caches with ``fill_cache=False``. ::
+
+			with DBBaseModel.read_session():
+				pets = list(Pet.iter())
+				owners = Person.get_many({pet.owner for pet in pets})
+
+		nested calls join the outermost session
+		'''
+		local = cls._local
+		if local.session is not None:
+			yield local.session
+			return
+		session = local.session = ReadSession(cls._base_db, snapshot, fill_cache)
+		try:
+			yield session
+		finally:
+			local.session = None
+			session.close()
+
+	@classmethod
+	def _source(cls):
+		''' where this model reads from: :attr:`db` or the keys under its prefix in the :meth:`read_session` '''
+		session = cls._local.session
+		if session is None:
+			return cls.db
+		view = session.view(cls.db.prefix, prefix_stop(cls.db.prefix))
+		if cls._hook is not None:
+			return metrics.InstrumentedDB(view)
+		return view
+
+	@classmethod
+	def _session_cache(cls) -> Optional[LRUCache]:
+		''' the model's cache unless a :meth:`read_session` can't use it '''
+		session = cls._local.session
+		if session is not None and not session.use_cache:
+			return None
+		return cls._cache
+
+	@classmethod
+	def migrator(cls, **kwargs) -> schema.Migrator:
+		''' a :class:`levelorm.schema.Migrator` for this model (call ``start()`` on it) '''
+		return schema.Migrator(cls, **kwargs)
+
+	@classmethod
+	def sweep(cls, batch_size: int = 1000, limit: Optional[int] = None) -> int:
+		'''
+		deletes the records of a model with ``ttl`` or ``expiring`` that have expired (up to ``limit``),
+		``batch_size`` per write batch, and returns how many were deleted. only the expiry index is scanned;
+		see :mod:`levelorm.expiry`
+		'''
+		if not cls._expiring:
+			raise ValueError('%s does not expire records' % cls.__name__)
+		return expiry.sweep(cls, batch_size, limit)
+
+	@classmethod
+	def sweeper(cls, **kwargs) -> expiry.Sweeper:
+		''' a :class:`levelorm.expiry.Sweeper` for this model (call ``start()`` on it) '''
+		return expiry.Sweeper(cls, **kwargs)
+
+	@classmethod
+	def train_compression(cls, samples: int = 1000, scan: Optional[int] = 100000, seed: Optional[int] = None) -> int:
+		'''
+		builds a dictionary for the model's ``compression`` from ``samples`` values picked at random among the first
+		``scan`` (or all of them if None) and compresses values written from now on with it. returns its id.
+		existing values keep their dictionary until they are written again (see :meth:`migrator`)
+		'''
+		if cls._compressor is None:
+			raise ValueError('%s does not have compression' % cls.__name__)
+		compressor = cls._compressor
+		with cls.db.iterator() as it:
+			values = (data for _, data in cls._upgrading(itertools.islice(it, scan)))
+			picked = compression.sample(values, samples, seed)
+		dictionary = compression.train(picked, compressor.config.dictionary_size)
+		return compressor.add_dictionary(dictionary)
+
+	@classmethod
+	def compression_stats(cls) -> Optional[Dict[str, Any]]:
+		'''
+		the current dictionary, how many values this process compressed, how many of those were stored uncompressed,
+		their total size before and after, the ratio, how many values were decompressed and the time spent
+		(None if the model doesn't have ``compression``)
+		'''
+		if cls._compressor is None:
+			return None
+		return cls._compressor.stats()
+
+	@classmethod
+	def _current(cls, key: bytes, data: bytes) -> bytes:
+		'''
+		a stored value as :attr:`_codec` encodes it: decompressed and in the current version of the model.
+		with ``migrate_on_read``, it is written back if it is in an older version or uses an older dictionary
+		'''
+		plain = cls._decode_stored(data)
+		if cls.migrate_on_read and cls._is_stale(data):
+			cls._write_upgraded(key, plain, data)
+		return plain
+
+	@classmethod
+	def _decode_stored(cls, data: bytes) -> bytes:
+		if cls._expiring:
+			data = data[expiry.HEADER_SIZE:]
+		if cls._compressor is not None:
+			data = cls._compressor.decompress(data)
+		if cls._schema is not None:
+			data = cls._schema.upgrade(data)
+		return data
 
-		if kwargs.get('include_value', True):
-			with cls.db.iterator(**kwargs) as it:
-				for key, data in it:
-					yield cls.parse(keyfield.deserialize_key(key), data)
+	@classmethod
+	def _is_stale(cls, stored: bytes) -> bool:
+		''' whether a stored value would be stored differently if it were written now '''
+		if cls._expiring:
+			stored = stored[expiry.HEADER_SIZE:]
+		data = stored
+		if cls._compressor is not None:
+			if not cls._compressor.is_current(stored):
+				return True
+			if cls._schema is None:
+				return False
+			data = cls._compressor.decompress(stored)
+		return cls._schema is not None and data[:4] != cls._schema.header
+
+	@classmethod
+	def _stored_expiry(cls, stored: bytes) -> bytes:
+		''' the expiry header of a stored value (empty if the model isn't expiring) '''
+		return stored[:expiry.HEADER_SIZE] if cls._expiring else b''
+
+	@classmethod
+	def _unexpired(cls, it: Iterable[Tuple[bytes, bytes]]) -> Iterator[Tuple[bytes, bytes]]:
+		''' the ``(key, value)`` pairs of records that haven't expired '''
+		now = expiry.now()
+		expired = expiry.expired
+		for key, data in it:
+			if not expired(data, now):
+				yield key, data
+
+	@classmethod
+	def _upgrading(cls, it: Iterable[Tuple[bytes, bytes]]) -> Iterator[Tuple[bytes, bytes]]:
+		''' :meth:`_current` for every ``(key, value)`` pair, leaving out expired records '''
+		if cls._expiring:
+			it = cls._unexpired(it)
+		current = cls._current
+		for key, data in it:
+			yield key, current(key, data)
+
+	@classmethod
+	def _write_upgraded(cls, key: bytes, data: bytes, old_stored: bytes) -> None:
+		'''
+		replaces ``old_stored``, a value that was read, with ``data``, the same value in the form :attr:`_codec`
+		encodes, keeping its expiry. nothing is written if the record was saved or deleted since it was read
+		(see :meth:`WriteBatch.write_maintained`)
+		'''
+		if cls._compressor is not None:
+			stored = cls._stored_expiry(old_stored) + cls._compressor.compress(data)
 		else:
-			with cls.db.iterator(**kwargs) as it:
-				for key in it:
-					yield keyfield.deserialize_key(key)
+			stored = cls._stored_expiry(old_stored) + data
+		values = cls._codec.decode(data) if cls._indexes else None
+		with cls.batch():
+			cls._update_indexes(key, values, stored, old_stored)
+
+	@classmethod
+	def instrument(cls, hook) -> None:
+		'''
+		reports this model's operations to ``hook`` (see :mod:`levelorm.metrics`). called on the base returned by
+		:meth:`levelorm.db_base_model`, it applies to every model created from it that doesn't have its own hook.
+		``None`` removes the hook
+		'''
+		cls._hook = hook
+		models = [cls]
+		for model in models:
+			models.extend(model.__subclasses__())
+			if vars(model).get('db') is not None:
+				model._wrap_db()
 
-def db_base_model(db: plyvel.DB) -> Type[BaseModel]:
+	@classmethod
+	def _wrap_db(cls) -> None:
+		''' wraps :attr:`db` so its reads and writes are counted if the model is instrumented '''
+		db = cls.db
+		if isinstance(db, metrics.InstrumentedDB):
+			db = db.db
+		cls.db = db if cls._hook is None else metrics.InstrumentedDB(db)
+
+	@classmethod
+	def _serialize_range(cls, kwargs: Dict[str, Any]) -> None:
+		'''
+		serializes the ``start`` and ``stop`` keys of ``plyvel.DB.iterator`` arguments in place,
+		and ``prefix`` unless it is already bytes
+		'''
+		serialize_key = cls._keyfield.serialize_key
+		if 'start' in kwargs:
+			kwargs['start'] = serialize_key(kwargs['start'])
+		if 'stop' in kwargs:
+			kwargs['stop'] = serialize_key(kwargs['stop'])
+		if 'prefix' in kwargs and not isinstance(kwargs['prefix'], bytes):
+			kwargs['prefix'] = serialize_key(kwargs['prefix'])
+
+	@classmethod
+	def _key_values(cls, key) -> tuple:
+		''' the values of the key fields in ``key`` '''
+		if cls._keyname is not None:
+			return (key,)
+		return tuple(key)
+
+def _copy_lists(value):
+	''' copies (nested) lists, leaving their elements alone '''
+	if isinstance(value, list):
+		return [_copy_lists(element) for element in value]
+	return value
+
+def _make_cache(cache_size: Optional[int], cache_bytes: Optional[int], negative: bool) -> Optional[LRUCache]:
+	if not cache_size and not cache_bytes:
+		return None
+	return LRUCache(cache_size or None, cache_bytes or None, negative)
+
+def db_base_model(db: plyvel.DB, cache_size: Optional[int] = None, cache_bytes: Optional[int] = None,
+		negative_cache: bool = False, executor: Optional[concurrent.futures.Executor] = None) -> Type[BaseModel]:
 	'''
 	create a base model class that all user models should inherit from.
-	the returned base class holds a reference to the ``plyvel.DB``
+	the returned base class holds a reference to the ``plyvel.DB``.
+
+	with ``cache_size`` (a number of records) and/or ``cache_bytes`` (the total size of their keys and values),
+	:meth:`BaseModel.get` and :meth:`BaseModel.get_many` read through an LRU cache of decoded records shared by
+	all models. writes invalidate it. ``negative_cache=True`` also caches keys that were not found.
+	a model can set its own ``cache_size``, ``cache_bytes`` and ``negative_cache`` to get a separate cache
+	(``cache_size = 0`` turns caching off for that model).
+
+	``executor`` is the thread pool the asyncio methods (see :mod:`levelorm.aio`) run plyvel calls in
 	'''
 	def __init_subclass__(cls):
 		if not cls.prefix:
 			raise InvalidModel('models must have prefixes')
+		if ':' in cls.prefix:
+			# the keys of index entries, the expiry index and the counter are the prefix, ':' and a name, so
+			# 'pet:owner-...' could be a record of 'pet:owner' or an index entry of 'pet'
+			raise InvalidModel("%s.prefix can't contain ':'" % cls.__name__)
 		cls.db = db.prefixed_db(('%s-' % cls.prefix).encode('utf-8'))
-	base_model = type('DBBaseModel', (BaseModel,), {'__init_subclass__': __init_subclass__})
+		if cls._hook is not None:
+			cls._wrap_db()
+		if 'cache_size' in vars(cls) or 'cache_bytes' in vars(cls):
+			cls._cache = _make_cache(cls.cache_size, cls.cache_bytes, cls.negative_cache)
+	base_model = type('DBBaseModel', (BaseModel,), {
+		'__init_subclass__': __init_subclass__,
+		'cache_size': cache_size,
+		'cache_bytes': cache_bytes,
+		'negative_cache': negative_cache,
+		'_base_db': db,
+		'_local': _LocalState(),
+		'_cache': _make_cache(cache_size, cache_bytes, negative_cache),
+		'_executor': executor,
+		'_executor_lock': threading.Lock(),
+		'_write_lock': threading.Lock(),
+		'__slots__': (),
+	})
 	return base_model
@@ -0,0 +1,87 @@
+'''
+decodes and processes a range of records in a pool of worker processes. used by
+:meth:`levelorm.orm.BaseModel.parallel_scan`.
+
+leveldb only lets one process open a database, so the calling process reads raw ``(key, value)`` pairs
+in partitions of roughly equal size (estimated with ``plyvel.DB.approximate_size``) and the workers decode
+them and apply the function. both the model and the function are pickled by reference, so they must be
+importable (defined at the top level of a module)
+'''
+
+import functools
+import multiprocessing
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+MODES = ('map', 'filter', 'reduce')
+# partitions are at least this many bytes of keys and values
+MIN_PARTITION_BYTES = 64 * 1024
+# aim for this many partitions per worker so that a slow partition doesn't leave the others idle
+PARTITIONS_PER_WORKER = 4
+
+def _process(model, mode: str, fn: Callable, initial, pairs: List[Tuple[bytes, bytes]]):
+	'''
+	runs in a worker process. records are only decoded: the database handle inherited across ``fork()`` can't
+	be used, so even with ``migrate_on_read``, nothing is written back
+	'''
+	parse = model._parse_current
+	deserialize_key = model._keyfield.deserialize_key
+	if model._plain:
+		instances = (parse(deserialize_key(key), data) for key, data in pairs)
+	else:
+		decode = model._decode_stored
+		instances = (parse(deserialize_key(key), decode(data)) for key, data in pairs)
+	if mode == 'map':
+		return [fn(instance) for instance in instances]
+	elif mode == 'filter':
+		return [instance for instance in instances if fn(instance)]
+	else:
+		return functools.reduce(fn, instances, initial)
+
+def _partitions(it, size_limit: int) -> Iterator[List[Tuple[bytes, bytes]]]:
+	partition: List[Tuple[bytes, bytes]] = []
+	size = 0
+	for key, data in it:
+		partition.append((key, data))
+		size += len(key) + len(data)
+		if size >= size_limit:
+			yield partition
+			partition = []
+			size = 0
+	if partition:
+		yield partition
+
+def _pool_context():
+	# forked workers already have the models imported; spawned ones would import the caller's modules again
+	if 'fork' in multiprocessing.get_all_start_methods():
+		return multiprocessing.get_context('fork')
+	return multiprocessing.get_context()
+
+def partition_bytes(estimate: int, workers: int) -> int:
+	''' the size of the partitions a range of ``estimate`` bytes is split into '''
+	return max(MIN_PARTITION_BYTES, estimate // (workers * PARTITIONS_PER_WORKER))
+
+def parallel_scan(model, fn: Callable, it, workers: int, size: int, mode: str = 'map', ordered: bool = True,
+		initial=None, combine: Optional[Callable] = None) -> Any:
+	''' partitions the raw ``(key, value)`` pairs of ``it`` into chunks of ``size`` bytes and processes them '''
+	if mode not in MODES:
+		raise ValueError('mode must be one of %r' % (MODES,))
+	if combine is None:
+		combine = fn
+
+	if model._compressor is not None:
+		# so the workers don't have to read the dictionaries
+		model._compressor.load()
+	process = functools.partial(_process, model, mode, fn, initial)
+	with _pool_context().Pool(workers) as pool:
+		partitions = _partitions(it, size)
+		if ordered:
+			results = pool.imap(process, partitions)
+		else:
+			results = pool.imap_unordered(process, partitions)
+
+		if mode == 'reduce':
+			return functools.reduce(combine, results, initial)
+		merged: List[Any] = []
+		for result in results:
+			merged.extend(result)
+		return merged
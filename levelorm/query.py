@@ -0,0 +1,188 @@
+'''
+conditions for :meth:`levelorm.orm.BaseModel.iter`'s ``where``. they are built by comparing fields on a model: ::
+
+	Animal.iter(where=(Animal.decibels > 80) & Animal.shouts)
+	Animal.iter(where=Animal.name.startswith('c') | (Animal.onomatopoeia == 'moo'))
+
+conditions are compiled into checks on the raw key and value bytes so that only matching records are decoded.
+``Integer``, ``Float`` and ``Boolean`` fields are unpacked where they are stored and ``String`` and ``Blob``
+fields are compared without being decoded (except ``String`` orderings in encodings whose bytes don't sort
+like their text). the fields of a :class:`levelorm.fields.CompositeKey` are decoded from the key and ``==`` on
+its first fields limits the scan to the keys starting with them.
+
+the conditions themselves are in :mod:`levelorm.conditions`. because ``==`` and ``!=`` on a field build
+conditions, fields can't be compared with each other or looked up in lists with them; see there
+'''
+
+import codecs
+import operator
+from typing import Any, Callable, Optional, Tuple
+
+from . import fields
+from .conditions import And, Comparison, Condition, Not, Or, StartsWith, as_condition
+
+# encodings whose byte order matches code point order
+ORDERED_ENCODINGS = {'utf-8', 'ascii', 'latin-1', 'iso8859-1'}
+
+def _compile(model, condition: Condition) -> Callable[[bytes, Any, Any], bool]:
+	''' returns a function of ``(key bytes, value bytes, field offsets)`` checking ``condition`` '''
+	if isinstance(condition, Comparison):
+		op = condition.op
+		get = _getter(model, condition.field, op not in (operator.eq, operator.ne))
+		value = condition.value
+		if get.raw: # type: ignore
+			value = _raw_value(condition.field, value)
+		def compare(key, data, offsets):
+			return op(get(key, data, offsets), value)
+		return compare
+	if isinstance(condition, And):
+		left = _compile(model, condition.left)
+		right = _compile(model, condition.right)
+		def both(key, data, offsets):
+			return left(key, data, offsets) and right(key, data, offsets)
+		return both
+	if isinstance(condition, Or):
+		left = _compile(model, condition.left)
+		right = _compile(model, condition.right)
+		def either(key, data, offsets):
+			return left(key, data, offsets) or right(key, data, offsets)
+		return either
+	if isinstance(condition, Not):
+		negate = _compile(model, condition.condition)
+		def negated(key, data, offsets):
+			return not negate(key, data, offsets)
+		return negated
+	raise TypeError('expected a condition, got %r' % (condition,))
+
+def _raw_value(field: 'fields.BaseField', value) -> bytes:
+	if isinstance(field, fields.String):
+		return value.encode(field.encoding)
+	return value
+
+def _getter(model, field: 'fields.BaseField', ordered: bool):
+	'''
+	returns a function of ``(key bytes, value bytes, field offsets)`` that reads the field.
+	if ``getter.raw`` is set, the function returns the stored bytes instead of the value
+	'''
+	raw = isinstance(field, fields.Blob) or (isinstance(field, fields.String) and
+			(not ordered or codecs.lookup(field.encoding).name in ORDERED_ENCODINGS))
+
+	keyfield = model._keyfield
+	if isinstance(keyfield, fields.CompositeKey) and keyfield.position(field) is not None:
+		position = keyfield.position(field)
+		deserialize_key = keyfield.deserialize_key
+		def get_key_value(key, data, offsets):
+			return deserialize_key(key)[position]
+		get_key_value.raw = False # type: ignore
+		return get_key_value
+
+	if field is keyfield:
+		if raw:
+			def get_raw_key(key, data, offsets):
+				return key
+			getter = get_raw_key
+		else:
+			deserialize_key = field.deserialize_key
+			def get_key(key, data, offsets):
+				return deserialize_key(key)
+			getter = get_key
+		getter.raw = raw # type: ignore
+		return getter
+
+	codec = model._codec
+	i = codec.positions.get(field.name)
+	if i is None or codec.fields[i] is not field:
+		raise ValueError('%r is not a field of %s' % (field.name, model.__name__))
+	static_offset = codec.static_offsets[i]
+
+	if codec.format == 'compact' and isinstance(field, (fields.FixedWidthField, fields.String, fields.Blob)):
+		unpack = codec.unpack_bytes_from if raw else codec.unpackers[i]
+		if static_offset is not None:
+			def get_compact_static(key, data, offsets):
+				return unpack(data, static_offset)[0]
+			getter = get_compact_static
+		else:
+			def get_compact(key, data, offsets):
+				return unpack(data, offsets[i])[0]
+			getter = get_compact
+	elif isinstance(field, fields.FixedWidthField):
+		unpack_from = field.struct.unpack_from
+		if static_offset is not None:
+			def get_static(key, data, offsets):
+				return unpack_from(data, static_offset)[0]
+			getter = get_static
+		else:
+			def get_fixed(key, data, offsets):
+				return unpack_from(data, offsets[i])[0]
+			getter = get_fixed
+	elif isinstance(field, (fields.String, fields.Blob)):
+		length_unpack_from = field.length_struct.unpack_from
+		def get_bytes(key, data, offsets):
+			offset = static_offset if static_offset is not None else offsets[i]
+			start = offset + 4
+			return bytes(data[start:start + length_unpack_from(data, offset)[0]])
+		getter = get_bytes
+		if not raw:
+			encoding = field.encoding # type: ignore
+			def get_str(key, data, offsets):
+				return get_bytes(key, data, offsets).decode(encoding)
+			getter = get_str
+	else:
+		raise ValueError('%s fields cannot be used in conditions' % field.__class__.__name__)
+	getter.raw = raw # type: ignore
+	return getter
+
+def compile_condition(model, condition) -> Tuple[Callable[[bytes, Any], bool], bool]:
+	'''
+	returns a function of ``(key bytes, value bytes)`` and whether it needs the value
+	(it doesn't if the condition only reads the key)
+	'''
+	condition = as_condition(condition)
+	test = _compile(model, condition)
+	names = condition.fieldnames() - set(model._keynames)
+	needs_offsets = any(model._codec.static_offsets[model._codec.positions[name]] is None
+			for name in names if name in model._codec.positions)
+	if needs_offsets:
+		offsets = model._codec.offsets
+		def test_offsets(key, data):
+			return test(key, data, offsets(data))
+		return test_offsets, True
+
+	def test_static(key, data):
+		return test(key, data, None)
+	return test_static, bool(names)
+
+def key_prefix(model, condition) -> Optional[bytes]:
+	'''
+	a prefix every matching key must start with if ``condition`` (or one side of an ``&``) requires one:
+	a ``startswith`` on a ``String`` or ``Blob`` key or, for a :class:`levelorm.fields.CompositeKey`,
+	``==`` on its first key fields
+	'''
+	keyfield = model._keyfield
+	if isinstance(keyfield, fields.CompositeKey):
+		values = _leading_key_values(keyfield, condition)
+		if not values:
+			return None
+		return keyfield.serialize_key(values)
+	if isinstance(condition, StartsWith) and condition.field is keyfield:
+		return keyfield.serialize_key(condition.value)
+	if isinstance(condition, And):
+		return key_prefix(model, condition.left) or key_prefix(model, condition.right)
+	return None
+
+def _leading_key_values(keyfield: 'fields.CompositeKey', condition: Condition) -> list:
+	''' the values ``condition`` requires the first few fields of ``keyfield`` to be equal to '''
+	required: dict = {}
+	conditions = [condition]
+	while conditions:
+		condition = conditions.pop()
+		if isinstance(condition, And):
+			conditions.extend((condition.left, condition.right))
+		elif isinstance(condition, Comparison) and condition.op is operator.eq:
+			position = keyfield.position(condition.field)
+			if position is not None:
+				required[position] = condition.value
+	values: list = []
+	while len(values) in required:
+		values.append(required[len(values)])
+	return values
@@ -0,0 +1,178 @@
+'''
+versioned schemas. a model that sets ``version`` writes a 4-byte header (:data:`MAGIC` and the version as a
+big-endian uint16) before its fields. when its fields change, bump ``version`` and describe each older version
+in ``old_versions`` with its value fields (not the key) and a function that takes a dict of that version's values
+and returns a dict of the next version's: ::
+
+	def add_legs(values):
+		return dict(values, legs=4)
+
+	class Animal(DBBaseModel):
+		prefix = 'animal'
+		version = 2
+		old_versions = {
+			# records written before the model had a version
+			0: schema.Version([('onomatopoeia', String())], schema.unchanged),
+			1: schema.Version([('onomatopoeia', String())], add_legs),
+		}
+		name = String(key=True)
+		onomatopoeia = String()
+		legs = Integer()
+
+older records are upgraded when they are read. with ``migrate_on_read = True`` on the model, they are also
+written back. :class:`Migrator` upgrades every record in the background. give the old versions' fields the same
+``index`` as they had so the index entries they were written with are replaced; until a record is written back,
+:meth:`levelorm.orm.BaseModel.iter_by` finds it by those entries.
+
+records without a header are version 0. a record without a header is only mistaken for a newer one if its
+first field starts with :data:`MAGIC`, so only declare version 0 if the old first field can't (a ``Boolean``,
+or a ``String``, ``Blob`` or ``Array`` that is always shorter than 30462)
+'''
+
+import itertools
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from . import compact, fields
+from .codec import Codec
+from .exceptions import InvalidModel
+
+MAGIC = b'\xfev'
+_header = struct.Struct('>2sH')
+
+def header(version: int) -> bytes:
+	return _header.pack(MAGIC, version)
+
+def unchanged(values: Dict[str, Any]) -> Dict[str, Any]:
+	''' an upgrade function for versions that only differ in having a header '''
+	return values
+
+class Version:
+	'''
+	an old version of a model's value fields and the function upgrading its values to the next version.
+	``format`` is the format it was stored in (see :mod:`levelorm.compact`) if it isn't the model's
+	'''
+
+	def __init__(self, value_fields: Sequence[Tuple[str, fields.BaseField]],
+			upgrade: Callable[[Dict[str, Any]], Dict[str, Any]], format: Optional[str] = None) -> None:
+		self.value_fields = tuple(value_fields)
+		self.upgrade = upgrade
+		self.format = format
+
+class Schema:
+	''' created by :class:`levelorm.orm.ModelMeta` for models that set ``version`` '''
+
+	def __init__(self, model_name: str, version: int, codec: Codec, old_versions: Dict[int, Version]) -> None:
+		if not 1 <= version <= 0xffff:
+			raise InvalidModel('%s version must be between 1 and 65535' % model_name)
+		self.model_name = model_name
+		self.version = version
+		self.codec = codec
+		self.header = codec.header
+		# version: (codec, upgrade, next version)
+		self.old: Dict[int, Tuple[Codec, Callable, int]] = {}
+		numbers = sorted(old_versions)
+		for n, number in enumerate(numbers):
+			if number >= version:
+				raise InvalidModel('%s has an old version %d that is not older than version %d' %
+						(model_name, number, version))
+			old = old_versions[number]
+			codec = compact.new_codec(old.format or self.codec.format, old.value_fields, header(number) if number else b'')
+			following = numbers[n + 1] if n + 1 < len(numbers) else version
+			self.old[number] = (codec, old.upgrade, following)
+
+	def version_of(self, data) -> int:
+		if data[:2] != MAGIC:
+			return 0
+		return _header.unpack_from(data)[1]
+
+	def upgrade_values(self, data) -> Tuple[Any, ...]:
+		''' decodes a record of any version into the current version's values '''
+		number = self.version_of(data)
+		if number == self.version:
+			return self.codec.decode(data)
+		try:
+			codec, upgrade, following = self.old[number]
+		except KeyError as e:
+			raise ValueError('%s has no version %d' % (self.model_name, number)) from e
+		values = dict(zip(codec.names, codec.decode(data)))
+		while True:
+			values = upgrade(values)
+			if following == self.version:
+				break
+			_, upgrade, following = self.old[following]
+		try:
+			return tuple(values[name] for name in self.codec.names)
+		except KeyError as e:
+			raise ValueError('upgrading %s to version %d did not set %s' % (self.model_name, self.version, e)) from e
+
+	def indexed_values(self, data) -> Dict[str, Tuple[fields.BaseField, Any]]:
+		''' the fields with ``index=True`` in the version of a record and their values in it '''
+		number = self.version_of(data)
+		if number == self.version:
+			codec = self.codec
+		else:
+			try:
+				codec = self.old[number][0]
+			except KeyError as e:
+				raise ValueError('%s has no version %d' % (self.model_name, number)) from e
+		return {name: (field, value) for name, field, value in zip(codec.names, codec.fields, codec.decode(data))
+				if field.index}
+
+	def upgrade(self, data) -> bytes:
+		''' a record of any version re-encoded in the current version '''
+		if data[:4] == self.header:
+			return data
+		return self.codec.encode(self.upgrade_values(data))
+
+class Migrator(threading.Thread):
+	'''
+	a thread that rewrites every record of ``model`` in an older version (or, with :mod:`levelorm.compression`,
+	compressed with an older dictionary), ``batch_size`` records per write batch,
+	sleeping ``pause`` seconds between batches. after each batch, :attr:`checkpoint` is the last key it
+	looked at; pass it as ``after`` to resume from there. records saved while it runs are left as they were saved.
+	call :meth:`stop` to stop after the current batch.
+	:meth:`run` can also be called directly to migrate in the calling thread
+	'''
+
+	def __init__(self, model, batch_size: int = 1000, after: Optional[bytes] = None, pause: float = 0.0,
+			progress: Optional[Callable[['Migrator'], None]] = None) -> None:
+		super().__init__(name='levelorm-migrate-%s' % model.__name__, daemon=True)
+		if model._schema is None and model._compressor is None:
+			raise ValueError('%s does not have a version or compression' % model.__name__)
+		self.model = model
+		self.batch_size = batch_size
+		self.checkpoint = after
+		self.pause = pause
+		self.progress = progress
+		self.scanned = 0
+		self.migrated = 0
+		self._stopping = threading.Event()
+
+	def stop(self) -> None:
+		self._stopping.set()
+
+	def run(self) -> None:
+		model = self.model
+		while not self._stopping.is_set():
+			# a new iterator for every batch, so that records saved while the migration runs aren't read from an
+			# older snapshot. records saved between the read and the write are skipped (see _write_upgraded)
+			with model.db.iterator(start=self.checkpoint, include_start=False) as it:
+				batch = list(itertools.islice(it, self.batch_size))
+			if not batch:
+				break
+			stale = 0
+			with model.batch() as write_batch:
+				for key, data in batch:
+					if model._is_stale(data):
+						model._write_upgraded(key, model._decode_stored(data), data)
+						stale += 1
+			self.migrated += stale - write_batch.conflicts
+			self.scanned += len(batch)
+			self.checkpoint = batch[-1][0]
+			if self.progress is not None:
+				self.progress(self)
+			if self.pause:
+				time.sleep(self.pause)
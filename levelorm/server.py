@@ -0,0 +1,890 @@
+'''
+shares one database between local processes. leveldb only lets one process open a database, so a
+:class:`Server` owns it and serves requests from other processes over a Unix socket: ::
+
+	python3 -m levelorm.server demodb /run/levelorm.sock
+
+each process then uses a :class:`RemoteDB` instead of a ``plyvel.DB``. it has the methods of a ``plyvel.DB`` that
+levelorm uses, so models work unchanged: ::
+
+	DBBaseModel = levelorm.db_base_model(server.RemoteDB('/run/levelorm.sock'))
+
+the server only reads and writes bytes; decoding happens in the clients, so reads scale with the number of client
+processes. writes from every connection go through one writer thread that merges the writes waiting for it into a
+single ``plyvel.WriteBatch`` (synced if any of them asked to be). a client's write batch is never split.
+iterators are read in chunks (a few entries at first, then up to ``chunk_size``) as they are consumed, and
+:meth:`levelorm.orm.BaseModel.get_many` fetches all of its keys in one request.
+
+every request and response is a big-endian uint32 length and then that many bytes: an opcode (requests) or a
+status (responses) followed by the arguments. integers are varints and byte strings are a varint length and
+the bytes (see :mod:`levelorm.compact`). snapshots and iterators live in the server until they are closed or the
+connection that created them is. each thread of a client has its own connection (a forked process makes new ones)
+
+the locks that keep index entries and counters right only hold within a process, so the writer thread also checks
+and adds for the clients: a write batch can expect keys to still have the values its client read (or to be
+missing), and is refused with :class:`levelorm.exceptions.WriteConflict` if one doesn't, and it can add to
+counters, which are read when the batch is written. :meth:`levelorm.orm.BaseModel.batch` reads the values it
+replaces and writes again when it is refused
+'''
+
+import argparse
+import collections
+import itertools
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import plyvel
+
+from .compact import pack_uvarint, unpack_bytes_from, unpack_uvarint_from
+from .exceptions import RemoteError, WriteConflict
+from .keys import prefix_stop
+
+GET = 1
+GET_MANY = 2
+PUT = 3
+DELETE = 4
+WRITE = 5
+ITERATE = 6
+NEXT = 7
+SEEK = 8
+CLOSE = 9
+SNAPSHOT = 10
+APPROXIMATE_SIZE = 11
+COMPACT_RANGE = 12
+# ops of WRITE requests besides PUT and DELETE
+EXPECT = 13
+ADD = 14
+
+OK = 0
+ERROR = 1
+CONFLICT = 2
+
+# flags of ITERATE requests
+REVERSE = 1
+INCLUDE_START = 2
+INCLUDE_STOP = 4
+INCLUDE_KEY = 8
+INCLUDE_VALUE = 16
+FILL_CACHE = 32
+HAS_START = 64
+HAS_STOP = 128
+HAS_PREFIX = 256
+
+# a chunk of iterator entries is cut off once it holds this many bytes
+CHUNK_BYTES = 256 * 1024
+
+_length = struct.Struct('>I')
+# the counters ADD adds to
+_int64 = struct.Struct('>q')
+
+def _pack_bytes(value: bytes) -> bytes:
+	return pack_uvarint(len(value)) + value
+
+def _read_frame(f) -> Optional[bytes]:
+	''' the next request or response from a buffered reader, or None at the end of the stream '''
+	header = f.read(4)
+	if len(header) < 4:
+		return None
+	length = _length.unpack(header)[0]
+	payload = f.read(length)
+	if len(payload) < length:
+		return None
+	return payload
+
+class _PendingWrite:
+	__slots__ = ('ops', 'sync', 'expected', 'adds', 'size', 'done', 'error')
+
+	def __init__(self, ops: List[Tuple[bytes, Optional[bytes]]], sync: bool,
+			expected: List[Tuple[bytes, Optional[bytes]]], adds: List[Tuple[bytes, int]]) -> None:
+		self.ops = ops
+		self.sync = sync
+		self.expected = expected
+		self.adds = adds
+		self.size = len(ops) + len(adds)
+		self.done = threading.Event()
+		self.error: Optional[BaseException] = None
+
+class _Writer(threading.Thread):
+	''' writes the ops submitted by every connection, merging the ones waiting into one write batch '''
+
+	def __init__(self, db: plyvel.DB, max_ops: int) -> None:
+		super().__init__(name='levelorm-server-writer', daemon=True)
+		self.db = db
+		self.max_ops = max_ops
+		self.queue: Deque[_PendingWrite] = collections.deque()
+		self.condition = threading.Condition()
+		self.stopping = False
+		self.writes = 0
+		self.batches = 0
+
+	def submit(self, ops: List[Tuple[bytes, Optional[bytes]]], sync: bool,
+			expected: Optional[List[Tuple[bytes, Optional[bytes]]]] = None,
+			adds: Optional[List[Tuple[bytes, int]]] = None) -> None:
+		'''
+		blocks until ``ops`` (``(key, value)`` pairs, with None values for deletes) are written, then ``adds``
+		(``(key, delta)`` pairs for counters, which are left alone if they don't exist). raises
+		:class:`levelorm.exceptions.WriteConflict` without writing anything unless every ``(key, value)`` pair of
+		``expected`` has that value then (None for missing keys)
+		'''
+		pending = _PendingWrite(ops, sync, expected or [], adds or [])
+		with self.condition:
+			if self.stopping:
+				raise RemoteError('the server is closing')
+			self.queue.append(pending)
+			self.condition.notify()
+		pending.done.wait()
+		if pending.error is not None:
+			raise pending.error
+
+	def stop(self) -> None:
+		with self.condition:
+			self.stopping = True
+			self.condition.notify()
+		self.join()
+
+	def run(self) -> None:
+		queue = self.queue
+		while True:
+			with self.condition:
+				while not queue and not self.stopping:
+					self.condition.wait()
+				if not queue:
+					return
+				group = [queue.popleft()]
+				count = group[0].size
+				while queue and count + queue[0].size <= self.max_ops:
+					count += queue[0].size
+					group.append(queue.popleft())
+			try:
+				with self.db.write_batch(sync=any(pending.sync for pending in group)) as write_batch:
+					# the values written by the group so far, which the writes after them have to see
+					written: Dict[bytes, Optional[bytes]] = {}
+					for pending in group:
+						self._write(write_batch, written, pending)
+			except Exception as e:
+				for pending in group:
+					pending.error = e
+			self.writes += len(group)
+			self.batches += 1
+			for pending in group:
+				pending.done.set()
+
+	def _write(self, write_batch, written: Dict[bytes, Optional[bytes]], pending: _PendingWrite) -> None:
+		def current(key: bytes) -> Optional[bytes]:
+			return written[key] if key in written else self.db.get(key)
+
+		for key, value in pending.expected:
+			if current(key) != value:
+				pending.error = WriteConflict('%r was replaced' % key)
+				return
+		for key, value in pending.ops:
+			if value is None:
+				write_batch.delete(key)
+			else:
+				write_batch.put(key, value)
+			written[key] = value
+		for key, delta in pending.adds:
+			stored = current(key)
+			if stored is not None:
+				value = _int64.pack(_int64.unpack(stored)[0] + delta)
+				write_batch.put(key, value)
+				written[key] = value
+
+class _Handler(socketserver.StreamRequestHandler):
+	''' serves the requests of one connection '''
+
+	server: '_SocketServer'
+
+	def setup(self) -> None:
+		super().setup()
+		self.owner = self.server.owner
+		# the ids of the snapshots and iterators this connection created
+		self.snapshots: List[int] = []
+		self.iterators: List[int] = []
+		self.owner._connected(self.request)
+
+	def handle(self) -> None:
+		owner = self.owner
+		handlers = owner._handlers
+		rfile = self.rfile
+		wfile = self.wfile
+		while True:
+			payload = _read_frame(rfile)
+			if payload is None:
+				return
+			try:
+				response = bytes((OK,)) + handlers[payload[0]](owner, self, payload, 1)
+			except WriteConflict as e:
+				response = bytes((CONFLICT,)) + str(e).encode('utf-8')
+			except KeyError as e:
+				if payload[0] in handlers:
+					response = bytes((ERROR,)) + ('unknown id %s' % e).encode('utf-8')
+				else:
+					response = bytes((ERROR,)) + ('unknown opcode %d' % payload[0]).encode('utf-8')
+			except Exception as e:
+				response = bytes((ERROR,)) + ('%s: %s' % (e.__class__.__name__, e)).encode('utf-8')
+			owner.requests += 1
+			wfile.write(_length.pack(len(response)) + response)
+
+	def finish(self) -> None:
+		owner = self.owner
+		for iterator_id in self.iterators:
+			state = owner.iterators.pop(iterator_id, None)
+			if state is not None:
+				state[0].close()
+		for snapshot_id in self.snapshots:
+			snapshot = owner.snapshots.pop(snapshot_id, None)
+			if snapshot is not None:
+				snapshot.close()
+		owner._disconnected(self.request)
+		try:
+			super().finish()
+		except OSError: # the client is gone
+			pass
+
+class _SocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+	owner: 'Server'
+
+class Server:
+	'''
+	serves ``db`` on a Unix socket at ``path`` (a stale socket left by a server that is no longer running is
+	replaced). at most ``max_batch_ops`` puts and deletes are written in one merged write batch. ``db`` is not
+	closed by :meth:`close`
+	'''
+
+	def __init__(self, db: plyvel.DB, path: str, max_batch_ops: int = 10000) -> None:
+		self.db = db
+		self.path = path
+		self.snapshots: Dict[int, Any] = {}
+		# id: (iterator, whether it yields keys, whether it yields values)
+		self.iterators: Dict[int, Tuple[Any, bool, bool]] = {}
+		self._ids = itertools.count(1)
+		self.requests = 0
+		self._writer = _Writer(db, max_batch_ops)
+		self._sockets: set = set()
+		self._sockets_lock = threading.Lock()
+		self._thread: Optional[threading.Thread] = None
+		_remove_stale(path)
+		self._server = _SocketServer(path, _Handler)
+		self._server.owner = self
+		self._writer.start()
+
+	def serve_forever(self) -> None:
+		self._server.serve_forever()
+
+	def start(self) -> 'Server':
+		''' serves in a background thread '''
+		self._thread = threading.Thread(target=self.serve_forever, name='levelorm-server', daemon=True)
+		self._thread.start()
+		return self
+
+	def close(self) -> None:
+		''' stops serving (call it from another thread than :meth:`serve_forever`), disconnecting every client '''
+		if self._thread is not None:
+			self._server.shutdown()
+			self._thread.join()
+		self._server.server_close()
+		with self._sockets_lock:
+			sockets = list(self._sockets)
+		for sock in sockets:
+			try:
+				sock.shutdown(socket.SHUT_RDWR)
+			except OSError:
+				pass
+		self._writer.stop()
+		try:
+			os.unlink(self.path)
+		except FileNotFoundError:
+			pass
+
+	def stats(self) -> Dict[str, int]:
+		''' the requests served, the writes received and the write batches they were merged into '''
+		return {'requests': self.requests, 'writes': self._writer.writes, 'batches': self._writer.batches}
+
+	def _connected(self, sock) -> None:
+		with self._sockets_lock:
+			self._sockets.add(sock)
+
+	def _disconnected(self, sock) -> None:
+		with self._sockets_lock:
+			self._sockets.discard(sock)
+
+	def _source(self, snapshot_id: int):
+		return self.db if snapshot_id == 0 else self.snapshots[snapshot_id]
+
+	def _get(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		snapshot_id, offset = unpack_uvarint_from(payload, offset)
+		fill_cache = payload[offset] != 0
+		data = self._source(snapshot_id).get(payload[offset + 1:], fill_cache=fill_cache)
+		if data is None:
+			return b'\0'
+		return b'\1' + data
+
+	def _get_many(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		snapshot_id, offset = unpack_uvarint_from(payload, offset)
+		fill_cache = payload[offset] != 0
+		count, offset = unpack_uvarint_from(payload, offset + 1)
+		get = self._source(snapshot_id).get
+		parts = []
+		for _ in range(count):
+			key, offset = unpack_bytes_from(payload, offset)
+			data = get(key, fill_cache=fill_cache)
+			parts.append(b'\0' if data is None else b'\1' + _pack_bytes(data))
+		return b''.join(parts)
+
+	def _put(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		sync = payload[offset] != 0
+		key, offset = unpack_bytes_from(payload, offset + 1)
+		self._writer.submit([(key, payload[offset:])], sync)
+		return b''
+
+	def _delete(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		sync = payload[offset] != 0
+		self._writer.submit([(payload[offset + 1:], None)], sync)
+		return b''
+
+	def _write(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		sync = payload[offset] != 0
+		count, offset = unpack_uvarint_from(payload, offset + 1)
+		ops: List[Tuple[bytes, Optional[bytes]]] = []
+		expected: List[Tuple[bytes, Optional[bytes]]] = []
+		adds: List[Tuple[bytes, int]] = []
+		for _ in range(count):
+			op = payload[offset]
+			key, offset = unpack_bytes_from(payload, offset + 1)
+			if op == PUT:
+				value, offset = unpack_bytes_from(payload, offset)
+				ops.append((key, value))
+			elif op == DELETE:
+				ops.append((key, None))
+			elif op == EXPECT:
+				if payload[offset]:
+					expected_value, offset = unpack_bytes_from(payload, offset + 1)
+					expected.append((key, expected_value))
+				else:
+					expected.append((key, None))
+					offset += 1
+			elif op == ADD:
+				adds.append((key, _int64.unpack_from(payload, offset)[0]))
+				offset += _int64.size
+			else:
+				raise ValueError('unknown write op %d' % op)
+		if ops or adds:
+			self._writer.submit(ops, sync, expected, adds)
+		return b''
+
+	def _iterate(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		snapshot_id, offset = unpack_uvarint_from(payload, offset)
+		flags, offset = unpack_uvarint_from(payload, offset)
+		count, offset = unpack_uvarint_from(payload, offset)
+		kwargs: Dict[str, Any] = {
+			'reverse': bool(flags & REVERSE),
+			'include_start': bool(flags & INCLUDE_START),
+			'include_stop': bool(flags & INCLUDE_STOP),
+			'include_key': bool(flags & INCLUDE_KEY),
+			'include_value': bool(flags & INCLUDE_VALUE),
+			'fill_cache': bool(flags & FILL_CACHE),
+		}
+		for flag, name in ((HAS_START, 'start'), (HAS_STOP, 'stop'), (HAS_PREFIX, 'prefix')):
+			if flags & flag:
+				kwargs[name], offset = unpack_bytes_from(payload, offset)
+		it = self._source(snapshot_id).iterator(**kwargs)
+		iterator_id = next(self._ids)
+		self.iterators[iterator_id] = (it, kwargs['include_key'], kwargs['include_value'])
+		handler.iterators.append(iterator_id)
+		return pack_uvarint(iterator_id) + self._chunk(iterator_id, count)
+
+	def _next(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		iterator_id, offset = unpack_uvarint_from(payload, offset)
+		count, offset = unpack_uvarint_from(payload, offset)
+		return self._chunk(iterator_id, count)
+
+	def _seek(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		iterator_id, offset = unpack_uvarint_from(payload, offset)
+		count, offset = unpack_uvarint_from(payload, offset)
+		self.iterators[iterator_id][0].seek(payload[offset:])
+		return self._chunk(iterator_id, count)
+
+	def _chunk(self, iterator_id: int, count: int) -> bytes:
+		''' up to ``count`` entries (but not many more than :data:`CHUNK_BYTES`) and whether there are no more '''
+		it, include_key, include_value = self.iterators[iterator_id]
+		parts = []
+		size = 0
+		n = 0
+		done = False
+		while n < count and size < CHUNK_BYTES:
+			try:
+				entry = next(it)
+			except StopIteration:
+				done = True
+				break
+			if include_key and include_value:
+				part = _pack_bytes(entry[0]) + _pack_bytes(entry[1])
+			else:
+				part = _pack_bytes(entry)
+			parts.append(part)
+			size += len(part)
+			n += 1
+		return pack_uvarint(n) + (b'\1' if done else b'\0') + b''.join(parts)
+
+	def _close(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		count, offset = unpack_uvarint_from(payload, offset)
+		for _ in range(count):
+			iterator_id, offset = unpack_uvarint_from(payload, offset)
+			state = self.iterators.pop(iterator_id, None)
+			if state is not None:
+				state[0].close()
+		count, offset = unpack_uvarint_from(payload, offset)
+		for _ in range(count):
+			snapshot_id, offset = unpack_uvarint_from(payload, offset)
+			snapshot = self.snapshots.pop(snapshot_id, None)
+			if snapshot is not None:
+				snapshot.close()
+		return b''
+
+	def _snapshot(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		snapshot_id = next(self._ids)
+		self.snapshots[snapshot_id] = self.db.snapshot()
+		handler.snapshots.append(snapshot_id)
+		return pack_uvarint(snapshot_id)
+
+	def _approximate_size(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		start, offset = unpack_bytes_from(payload, offset)
+		stop, offset = unpack_bytes_from(payload, offset)
+		return pack_uvarint(self.db.approximate_size(start, stop))
+
+	def _compact_range(self, handler: _Handler, payload: bytes, offset: int) -> bytes:
+		flags = payload[offset]
+		offset += 1
+		kwargs = {}
+		for flag, name in ((HAS_START, 'start'), (HAS_STOP, 'stop')):
+			if flags & flag:
+				kwargs[name], offset = unpack_bytes_from(payload, offset)
+		self.db.compact_range(**kwargs)
+		return b''
+
+	_handlers = {
+		GET: _get,
+		GET_MANY: _get_many,
+		PUT: _put,
+		DELETE: _delete,
+		WRITE: _write,
+		ITERATE: _iterate,
+		NEXT: _next,
+		SEEK: _seek,
+		CLOSE: _close,
+		SNAPSHOT: _snapshot,
+		APPROXIMATE_SIZE: _approximate_size,
+		COMPACT_RANGE: _compact_range,
+	}
+
+def _remove_stale(path: str) -> None:
+	''' removes the socket at ``path`` if no server is listening on it '''
+	if not os.path.exists(path):
+		return
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		sock.connect(path)
+	except ConnectionRefusedError:
+		os.unlink(path)
+	else:
+		raise RemoteError('a server is already listening on %s' % path)
+	finally:
+		sock.close()
+
+class _Connection:
+	def __init__(self, path: str) -> None:
+		self.pid = os.getpid()
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.connect(path)
+		self.rfile = self.sock.makefile('rb')
+
+	def call(self, request: bytes) -> bytes:
+		self.sock.sendall(_length.pack(len(request)) + request)
+		response = _read_frame(self.rfile)
+		if response is None:
+			raise RemoteError('the server closed the connection')
+		if response[0] == CONFLICT:
+			raise WriteConflict(response[1:].decode('utf-8', 'replace'))
+		if response[0] != OK:
+			raise RemoteError(response[1:].decode('utf-8', 'replace'))
+		return response[1:]
+
+	def close(self) -> None:
+		self.rfile.close()
+		self.sock.close()
+
+class _Reader:
+	''' the reading methods of :class:`RemoteDB`, its prefixed databases and its snapshots '''
+
+	def __init__(self, client: 'RemoteDB', prefix: bytes, snapshot_id: int) -> None:
+		self._client = client
+		self.prefix = prefix
+		self._snapshot_id = snapshot_id
+
+	def get(self, key: bytes, default=None, verify_checksums: bool = False, fill_cache: bool = True):
+		response = self._client._call(bytes((GET,)) + pack_uvarint(self._snapshot_id) +
+				(b'\1' if fill_cache else b'\0') + self.prefix + key)
+		if response[0] == 0:
+			return default
+		return response[1:]
+
+	def get_many(self, keys: Iterable[bytes], fill_cache: bool = True) -> List[Optional[bytes]]:
+		''' the value of each key (or None) in one request '''
+		keys = list(keys)
+		prefix = self.prefix
+		response = self._client._call(bytes((GET_MANY,)) + pack_uvarint(self._snapshot_id) +
+				(b'\1' if fill_cache else b'\0') + pack_uvarint(len(keys)) +
+				b''.join([_pack_bytes(prefix + key) for key in keys]))
+		values: List[Optional[bytes]] = []
+		offset = 0
+		for _ in keys:
+			if response[offset] == 0:
+				values.append(None)
+				offset += 1
+			else:
+				data, offset = unpack_bytes_from(response, offset + 1)
+				values.append(data)
+		return values
+
+	def iterator(self, reverse: bool = False, start: Optional[bytes] = None, stop: Optional[bytes] = None,
+			include_start: bool = True, include_stop: bool = False, prefix: Optional[bytes] = None,
+			include_key: bool = True, include_value: bool = True, verify_checksums: bool = False,
+			fill_cache: bool = True) -> 'RemoteIterator':
+		if self.prefix:
+			if prefix is not None:
+				prefix = self.prefix + prefix
+			elif start is None and stop is None:
+				prefix = self.prefix
+			else:
+				start = self.prefix + start if start is not None else self.prefix
+				stop = self.prefix + stop if stop is not None else prefix_stop(self.prefix)
+		flags = ((REVERSE if reverse else 0) | (INCLUDE_START if include_start else 0) |
+				(INCLUDE_STOP if include_stop else 0) | (INCLUDE_KEY if include_key else 0) |
+				(INCLUDE_VALUE if include_value else 0) | (FILL_CACHE if fill_cache else 0))
+		args = b''
+		for flag, value in ((HAS_START, start), (HAS_STOP, stop), (HAS_PREFIX, prefix)):
+			if value is not None:
+				flags |= flag
+				args += _pack_bytes(value)
+		return RemoteIterator(self._client, self._snapshot_id, flags, args, self.prefix)
+
+	def raw_iterator(self, verify_checksums: bool = False, fill_cache: bool = True) -> 'RemoteRawIterator':
+		return RemoteRawIterator(self.iterator(prefix=b'' if self.prefix else None, fill_cache=fill_cache))
+
+class _Writable(_Reader):
+	def put(self, key: bytes, value: bytes, sync: bool = False) -> None:
+		self._client._call(bytes((PUT, sync)) + _pack_bytes(self.prefix + key) + value)
+
+	def delete(self, key: bytes, sync: bool = False) -> None:
+		self._client._call(bytes((DELETE, sync)) + self.prefix + key)
+
+	def write_batch(self, transaction: bool = False, sync: bool = False) -> 'RemoteWriteBatch':
+		return RemoteWriteBatch(self._client, self.prefix, transaction, sync)
+
+	def snapshot(self) -> 'RemoteSnapshot':
+		snapshot_id = unpack_uvarint_from(self._client._call(bytes((SNAPSHOT,))), 0)[0]
+		return RemoteSnapshot(self._client, self.prefix, snapshot_id)
+
+	def prefixed_db(self, prefix: bytes) -> 'RemotePrefixedDB':
+		return RemotePrefixedDB(self._client, self.prefix + prefix)
+
+class RemoteDB(_Writable):
+	'''
+	a connection to the :class:`Server` at ``path`` with the methods of a ``plyvel.DB`` that levelorm uses.
+	iterators read up to ``chunk_size`` entries per request
+	'''
+
+	def __init__(self, path: str, chunk_size: int = 1024) -> None:
+		super().__init__(self, b'', 0)
+		self.path = path
+		self.chunk_size = chunk_size
+		self.closed = False
+		self._local = threading.local()
+		self._connections: List[_Connection] = []
+		self._lock = threading.Lock()
+		# iterators and snapshots that were garbage collected without being closed. they are deques so that
+		# __del__ can add to them without a lock, which the thread it runs in might hold
+		self._abandoned_iterators: Deque[int] = collections.deque()
+		self._abandoned_snapshots: Deque[int] = collections.deque()
+		self._call(bytes((CLOSE, 0, 0))) # fail early if there is no server
+
+	def _connection(self) -> _Connection:
+		connection = getattr(self._local, 'connection', None)
+		if connection is None or connection.pid != os.getpid():
+			if self.closed:
+				raise RemoteError('the RemoteDB is closed')
+			connection = self._local.connection = _Connection(self.path)
+			with self._lock:
+				self._connections.append(connection)
+		return connection
+
+	def _call(self, request: bytes) -> bytes:
+		connection = self._connection()
+		if self._abandoned_iterators or self._abandoned_snapshots:
+			connection.call(self._close_request(_drain(self._abandoned_iterators), _drain(self._abandoned_snapshots)))
+		return connection.call(request)
+
+	@staticmethod
+	def _close_request(iterators: List[int], snapshots: List[int]) -> bytes:
+		return (bytes((CLOSE,)) + pack_uvarint(len(iterators)) + b''.join(map(pack_uvarint, iterators)) +
+				pack_uvarint(len(snapshots)) + b''.join(map(pack_uvarint, snapshots)))
+
+	def _abandon(self, iterator_id: Optional[int] = None, snapshot_id: Optional[int] = None) -> None:
+		''' closes an iterator or snapshot with the next request (it may be called from any thread) '''
+		if iterator_id is not None:
+			self._abandoned_iterators.append(iterator_id)
+		if snapshot_id is not None:
+			self._abandoned_snapshots.append(snapshot_id)
+
+	def approximate_size(self, start: bytes, stop: bytes) -> int:
+		response = self._call(bytes((APPROXIMATE_SIZE,)) + _pack_bytes(start) + _pack_bytes(stop))
+		return unpack_uvarint_from(response, 0)[0]
+
+	def compact_range(self, start: Optional[bytes] = None, stop: Optional[bytes] = None) -> None:
+		flags = 0
+		args = b''
+		for flag, value in ((HAS_START, start), (HAS_STOP, stop)):
+			if value is not None:
+				flags |= flag
+				args += _pack_bytes(value)
+		self._call(bytes((COMPACT_RANGE, flags)) + args)
+
+	def close(self) -> None:
+		''' closes the connections of every thread. the server keeps running '''
+		with self._lock:
+			connections, self._connections = self._connections, []
+			self.closed = True
+		for connection in connections:
+			connection.close()
+
+def _drain(ids: Deque[int]) -> List[int]:
+	''' removes and returns the ids in ``ids``, which other threads may be adding to '''
+	drained = []
+	while True:
+		try:
+			drained.append(ids.popleft())
+		except IndexError:
+			return drained
+
+class RemotePrefixedDB(_Writable):
+	''' returned by :meth:`RemoteDB.prefixed_db`, like ``plyvel.PrefixedDB`` '''
+
+	def __init__(self, client: RemoteDB, prefix: bytes) -> None:
+		super().__init__(client, prefix, 0)
+		self.db = client
+
+class RemoteSnapshot(_Reader):
+	''' returned by :meth:`RemoteDB.snapshot`, like ``plyvel.Snapshot`` '''
+
+	def __enter__(self) -> 'RemoteSnapshot':
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.close()
+
+	def close(self) -> None:
+		if self._snapshot_id:
+			snapshot_id, self._snapshot_id = self._snapshot_id, 0
+			self._client._abandon(snapshot_id=snapshot_id)
+
+	release = close
+
+	def __del__(self) -> None:
+		self.close()
+
+class RemoteWriteBatch:
+	''' returned by :meth:`RemoteDB.write_batch`. buffers puts and deletes and sends them in one request '''
+
+	def __init__(self, client: RemoteDB, prefix: bytes, transaction: bool, sync: bool) -> None:
+		self._client = client
+		self.prefix = prefix
+		self.transaction = transaction
+		self.sync = sync
+		self._ops: List[bytes] = []
+
+	def put(self, key: bytes, value: bytes) -> None:
+		self._ops.append(bytes((PUT,)) + _pack_bytes(self.prefix + key) + _pack_bytes(value))
+
+	def delete(self, key: bytes) -> None:
+		self._ops.append(bytes((DELETE,)) + _pack_bytes(self.prefix + key))
+
+	def expect(self, key: bytes, value: Optional[bytes]) -> None:
+		'''
+		makes the server refuse the batch, which raises :class:`levelorm.exceptions.WriteConflict`, unless ``key``
+		has ``value`` (or doesn't exist, if it is None) when the batch is written
+		'''
+		self._ops.append(bytes((EXPECT,)) + _pack_bytes(self.prefix + key) +
+				(b'\0' if value is None else b'\1' + _pack_bytes(value)))
+
+	def add(self, key: bytes, delta: int) -> None:
+		''' adds ``delta`` to the big-endian int64 at ``key`` when the batch is written, unless it doesn't exist '''
+		self._ops.append(bytes((ADD,)) + _pack_bytes(self.prefix + key) + _int64.pack(delta))
+
+	def savepoint(self) -> int:
+		''' pass it to :meth:`rollback` to remove the ops added after it '''
+		return len(self._ops)
+
+	def rollback(self, savepoint: int) -> None:
+		del self._ops[savepoint:]
+
+	def clear(self) -> None:
+		self._ops = []
+
+	def write(self) -> None:
+		''' sends the ops. they are kept if the batch is refused, so that it can be rolled back and written again '''
+		ops = self._ops
+		if ops:
+			self._client._call(bytes((WRITE, self.sync)) + pack_uvarint(len(ops)) + b''.join(ops))
+		self._ops = []
+
+	def __enter__(self) -> 'RemoteWriteBatch':
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback) -> None:
+		if exc_type is None or not self.transaction:
+			self.write()
+
+class RemoteIterator:
+	''' returned by :meth:`RemoteDB.iterator`, like ``plyvel.Iterator`` (with ``seek``) '''
+
+	# the first chunk is this small in case only a few entries are read
+	FIRST_CHUNK = 16
+
+	def __init__(self, client: RemoteDB, snapshot_id: int, flags: int, args: bytes, prefix: bytes) -> None:
+		self._client = client
+		self._pairs = bool(flags & INCLUDE_KEY) and bool(flags & INCLUDE_VALUE)
+		# how much of the keys to strip
+		self._strip = len(prefix) if flags & INCLUDE_KEY else 0
+		self._prefix = prefix
+		self._chunk_size = self.FIRST_CHUNK
+		self._id = 0
+		self._entries: List[Any] = []
+		self._position = 0
+		self._done = False
+		response = client._call(bytes((ITERATE,)) + pack_uvarint(snapshot_id) + pack_uvarint(flags) +
+				pack_uvarint(self._chunk_size) + args)
+		self._id, offset = unpack_uvarint_from(response, 0)
+		self._read_chunk(response, offset)
+
+	def _read_chunk(self, response: bytes, offset: int) -> None:
+		count, offset = unpack_uvarint_from(response, offset)
+		self._done = response[offset] != 0
+		offset += 1
+		strip = self._strip
+		entries: List[Any] = []
+		for _ in range(count):
+			first, offset = unpack_bytes_from(response, offset)
+			if self._pairs:
+				second, offset = unpack_bytes_from(response, offset)
+				entries.append((first[strip:], second))
+			elif strip:
+				entries.append(first[strip:])
+			else:
+				entries.append(first)
+		self._entries = entries
+		self._position = 0
+		self._chunk_size = min(self._chunk_size * 4, self._client.chunk_size)
+
+	def __iter__(self) -> 'RemoteIterator':
+		return self
+
+	def __next__(self):
+		if self._position == len(self._entries):
+			if self._done or not self._id:
+				raise StopIteration
+			self._read_chunk(self._client._call(bytes((NEXT,)) + pack_uvarint(self._id) + pack_uvarint(self._chunk_size)), 0)
+			if not self._entries:
+				raise StopIteration
+		entry = self._entries[self._position]
+		self._position += 1
+		return entry
+
+	def seek(self, target: bytes) -> None:
+		if not self._id:
+			raise RemoteError('the iterator is closed')
+		self._chunk_size = self.FIRST_CHUNK
+		self._read_chunk(self._client._call(bytes((SEEK,)) + pack_uvarint(self._id) + pack_uvarint(self._chunk_size) +
+				self._prefix + target), 0)
+
+	def close(self) -> None:
+		if self._id:
+			iterator_id, self._id = self._id, 0
+			self._entries = []
+			self._client._abandon(iterator_id=iterator_id)
+
+	def __enter__(self) -> 'RemoteIterator':
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.close()
+
+	def __del__(self) -> None:
+		self.close()
+
+class RemoteRawIterator:
+	''' returned by :meth:`RemoteDB.raw_iterator`, like ``plyvel.RawIterator`` (forward only) '''
+
+	def __init__(self, it: RemoteIterator) -> None:
+		self._it = it
+		self._current: Optional[Tuple[bytes, bytes]] = None
+
+	def seek(self, target: bytes) -> None:
+		self._it.seek(target)
+		self._current = next(self._it, None)
+
+	def seek_to_start(self) -> None:
+		self.seek(b'')
+
+	def valid(self) -> bool:
+		return self._current is not None
+
+	def key(self) -> bytes:
+		if self._current is None:
+			raise plyvel.IteratorInvalidError()
+		return self._current[0]
+
+	def value(self) -> bytes:
+		if self._current is None:
+			raise plyvel.IteratorInvalidError()
+		return self._current[1]
+
+	def next(self) -> None:
+		if self._current is None:
+			raise plyvel.IteratorInvalidError()
+		self._current = next(self._it, None)
+
+	def close(self) -> None:
+		self._it.close()
+
+	def __enter__(self) -> 'RemoteRawIterator':
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.close()
+
+def main(argv: Optional[List[str]] = None) -> None:
+	parser = argparse.ArgumentParser(prog='python3 -m levelorm.server', description=__doc__.split('\n\n')[0].strip())
+	parser.add_argument('db')
+	parser.add_argument('socket')
+	parser.add_argument('--create', action='store_true', help='create the database if it is missing')
+	parser.add_argument('--max-batch-ops', type=int, default=10000)
+	args = parser.parse_args(argv)
+
+	db = plyvel.DB(args.db, create_if_missing=args.create)
+	server = Server(db, args.socket, args.max_batch_ops)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.close()
+		db.close()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,286 @@
+'''
+read sessions. every :meth:`levelorm.orm.BaseModel.get`, :meth:`~levelorm.orm.BaseModel.get_many`,
+:meth:`~levelorm.orm.BaseModel.iter`, :meth:`~levelorm.orm.BaseModel.iter_by` and
+:meth:`~levelorm.orm.BaseModel.scan_columns` of any model sharing a :meth:`levelorm.db_base_model` that runs in
+the ``with`` block of :meth:`levelorm.orm.BaseModel.read_session` (in the same thread) reads through it: ::
+
+	with DBBaseModel.read_session(snapshot=True, fill_cache=False):
+		owners = {pet.owner for pet in Pet.iter()}
+		people = Person.get_many(owners)
+
+with ``snapshot=True``, they all read from one ``plyvel.DB.snapshot`` taken when the session starts, so they see
+the database as it was then even if it is written meanwhile (writes, which go to the database as usual, included),
+and the model caches (see :meth:`levelorm.db_base_model`) are bypassed since they may hold newer values.
+with ``fill_cache=False``, the blocks read aren't added to leveldb's block cache and the decoded records aren't
+added to the model caches, so a large scan doesn't evict what the rest of the process is using.
+
+creating a leveldb iterator costs about as much as reading a few entries with one, so the scans and the sweeps of
+:meth:`~levelorm.orm.BaseModel.get_many` in a session with ``snapshot=True`` seek and step raw iterators the
+session keeps instead of creating a bounded iterator each time. an iterator only sees what was written before it
+was created, so sessions with ``snapshot=False`` (and sessions through a :class:`levelorm.server.RemoteDB`, whose
+raw iterators can't go backwards) create a new one for each scan
+'''
+
+from typing import Any, Dict, List, Optional
+
+from .keys import prefix_stop
+
+class ReadSession:
+	''' created by :meth:`levelorm.orm.BaseModel.read_session` '''
+
+	def __init__(self, db, snapshot: bool = True, fill_cache: bool = False) -> None:
+		self.snapshot: Optional[Any] = db.snapshot() if snapshot else None
+		# what every read goes to: the snapshot or the database itself
+		self.source: Any = self.snapshot if self.snapshot is not None else db
+		self.fill_cache = fill_cache
+		# whether reads can use (and fill) the model caches
+		self.use_cache = not snapshot and fill_cache
+		self._views: Dict[bytes, 'PrefixedView'] = {}
+		self._raw_iterators: List[Any] = []
+		self._pool_iterators = self.snapshot is not None and not hasattr(db, 'get_many')
+
+	def view(self, prefix: bytes, stop: Optional[bytes]) -> 'PrefixedView':
+		''' the keys under ``prefix`` (which are all less than ``stop``), like ``plyvel.DB.prefixed_db`` '''
+		view = self._views.get(prefix)
+		if view is None:
+			view = self._views[prefix] = PrefixedView(self, prefix, stop)
+		return view
+
+	def get(self, key: bytes, default=None):
+		return self.source.get(key, default, fill_cache=self.fill_cache)
+
+	def iterator(self, reverse: bool = False, start: Optional[bytes] = None, stop: Optional[bytes] = None,
+			include_start: bool = True, include_stop: bool = False, prefix: Optional[bytes] = None,
+			include_key: bool = True, include_value: bool = True):
+		''' like ``plyvel.DB.iterator``. use it in a ``with`` block (or close it) to return its raw iterator '''
+		if not self._pool_iterators:
+			return self.source.iterator(reverse=reverse, start=start, stop=stop, include_start=include_start,
+					include_stop=include_stop, prefix=prefix, include_key=include_key, include_value=include_value,
+					fill_cache=self.fill_cache)
+		if prefix is not None:
+			start, stop, include_start, include_stop = prefix, prefix_stop(prefix), True, False
+		return SessionIterator(self, self._take_raw_iterator(), reverse, start, stop, include_start, include_stop,
+				include_key, include_value)
+
+	def get_many(self, keys: List[bytes]) -> List[Any]:
+		''' only for sources that have it (a :class:`levelorm.server.RemoteDB`) '''
+		return self.source.get_many(keys, fill_cache=self.fill_cache)
+
+	def raw_iterator(self) -> 'PooledRawIterator':
+		''' a ``plyvel.RawIterator`` from the session's pool (if it has one). use it in a ``with`` block to return it '''
+		return PooledRawIterator(self, self._take_raw_iterator())
+
+	def _take_raw_iterator(self):
+		if self._raw_iterators:
+			return self._raw_iterators.pop()
+		return self.source.raw_iterator(fill_cache=self.fill_cache)
+
+	def _return_raw_iterator(self, it) -> None:
+		if self._pool_iterators:
+			self._raw_iterators.append(it)
+		else:
+			it.close()
+
+	def close(self) -> None:
+		for it in self._raw_iterators:
+			it.close()
+		self._raw_iterators = []
+		if self.snapshot is not None:
+			self.snapshot.close()
+
+class PooledRawIterator:
+	def __init__(self, session: ReadSession, it) -> None:
+		self.session = session
+		self.it = it
+
+	def __enter__(self):
+		return self.it
+
+	def __exit__(self, *exc_info) -> None:
+		self.session._return_raw_iterator(self.it)
+
+class SessionIterator:
+	'''
+	returned by :meth:`ReadSession.iterator`: the entries from ``start`` to ``stop`` of one of the session's raw
+	iterators, like a ``plyvel.Iterator`` (with ``seek``). closing it returns the raw iterator to the pool
+	'''
+
+	def __init__(self, session: ReadSession, it, reverse: bool, start: Optional[bytes], stop: Optional[bytes],
+			include_start: bool, include_stop: bool, include_key: bool, include_value: bool) -> None:
+		self.session = session
+		self.it = it
+		self.reverse = reverse
+		self.start = start
+		self.stop = stop
+		self.include_start = include_start
+		self.include_stop = include_stop
+		self.include_key = include_key
+		self.include_value = include_value
+		# whether the raw iterator is on the entry to return next rather than on the one returned last
+		self._positioned = True
+		if reverse:
+			self._seek_below(stop, include_stop)
+		else:
+			self._seek_from(start)
+
+	def _seek_from(self, target: Optional[bytes]) -> None:
+		it = self.it
+		start = self.start
+		if start is not None and (target is None or target <= start):
+			it.seek(start)
+			if not self.include_start and it.valid() and it.key() == start:
+				it.next()
+		elif target is None:
+			it.seek_to_first()
+		else:
+			it.seek(target)
+		self._positioned = True
+
+	def _seek_below(self, target: Optional[bytes], inclusive: bool) -> None:
+		''' moves to the last entry before ``target`` (or on it, if ``inclusive``) '''
+		it = self.it
+		if target is None:
+			it.seek_to_last()
+		else:
+			it.seek(target)
+			if not it.valid():
+				it.seek_to_last()
+			elif it.key() > target or not inclusive:
+				it.prev()
+		self._positioned = True
+
+	def __enter__(self) -> 'SessionIterator':
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.close()
+
+	def __iter__(self) -> 'SessionIterator':
+		return self
+
+	def __next__(self):
+		it = self.it
+		if it is None:
+			raise StopIteration
+		if not self._positioned:
+			if self.reverse:
+				it.prev()
+			else:
+				it.next()
+		if not it.valid():
+			self._positioned = True
+			raise StopIteration
+		key = it.key()
+		if self.reverse:
+			start = self.start
+			done = start is not None and (key < start or key == start and not self.include_start)
+		else:
+			stop = self.stop
+			done = stop is not None and (key > stop or key == stop and not self.include_stop)
+		# stay on the entry past the range so that further calls stop too
+		self._positioned = done
+		if done:
+			raise StopIteration
+		if not self.include_value:
+			return key
+		if not self.include_key:
+			return it.value()
+		return key, it.value()
+
+	def seek(self, target: bytes) -> None:
+		''' like ``plyvel.Iterator.seek``: iterating continues from ``target`` (below it in reverse) '''
+		if self.it is None:
+			raise ValueError('the iterator is closed')
+		if not self.reverse:
+			self._seek_from(target)
+		elif self.stop is not None and target > self.stop:
+			self._seek_below(self.stop, self.include_stop)
+		else:
+			self._seek_below(target, False)
+
+	def close(self) -> None:
+		if self.it is not None:
+			self.session._return_raw_iterator(self.it)
+			self.it = None
+
+class PrefixedView:
+	'''
+	reads the keys under ``prefix`` through a :class:`ReadSession`. it has the reading methods of a
+	``plyvel.PrefixedDB`` (``snapshot`` returns the view itself, since it already reads from one)
+	'''
+
+	def __init__(self, session: ReadSession, prefix: bytes, stop: Optional[bytes]) -> None:
+		self.session = session
+		self.prefix = prefix
+		self.stop = stop
+
+	def get(self, key: bytes, default=None):
+		return self.session.get(self.prefix + key, default)
+
+	def get_many(self, keys: List[bytes]) -> List[Any]:
+		return self.session.get_many([self.prefix + key for key in keys])
+
+	def iterator(self, reverse: bool = False, start: Optional[bytes] = None, stop: Optional[bytes] = None,
+			include_start: bool = True, include_stop: bool = False, prefix: Optional[bytes] = None,
+			include_key: bool = True, include_value: bool = True) -> 'PrefixedIterator':
+		kwargs: Dict[str, Any] = {'reverse': reverse, 'include_key': include_key, 'include_value': include_value}
+		if prefix is not None:
+			kwargs['prefix'] = self.prefix + prefix
+		elif start is None and stop is None:
+			kwargs['prefix'] = self.prefix
+		else:
+			if start is not None:
+				kwargs['start'] = self.prefix + start
+				kwargs['include_start'] = include_start
+			else:
+				kwargs['start'] = self.prefix
+			if stop is not None:
+				kwargs['stop'] = self.prefix + stop
+				kwargs['include_stop'] = include_stop
+			else:
+				kwargs['stop'] = self.stop
+		return PrefixedIterator(self.session.iterator(**kwargs), self.prefix, include_key, include_value)
+
+	def snapshot(self) -> 'PrefixedView':
+		return self
+
+	def release(self) -> None:
+		pass
+
+	def __enter__(self) -> 'PrefixedView':
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		pass
+
+class PrefixedIterator:
+	''' strips the prefix off the keys of a ``plyvel.Iterator`` '''
+
+	def __init__(self, it, prefix: bytes, include_key: bool, include_value: bool) -> None:
+		self.it = it
+		self.prefix = prefix
+		self.strip = len(prefix) if include_key else 0
+		self.pairs = include_key and include_value
+
+	def __enter__(self) -> 'PrefixedIterator':
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.it.close()
+
+	def __iter__(self) -> 'PrefixedIterator':
+		return self
+
+	def __next__(self):
+		entry = next(self.it)
+		if self.pairs:
+			return entry[0][self.strip:], entry[1]
+		if self.strip:
+			return entry[self.strip:]
+		return entry
+
+	def seek(self, target: bytes) -> None:
+		self.it.seek(self.prefix + target)
+
+	def close(self) -> None:
+		self.it.close()
@@ -13,5 +13,14 @@ setup(name='levelorm',
 		install_requires=[
 			'plyvel',
 		],
+		extras_require={
+			'numpy': ['numpy'],
+		},
+		entry_points={
+			'console_scripts': [
+				'levelorm-dump=levelorm.dump:main',
+				'levelorm-server=levelorm.server:main',
+			],
+		},
 		test_suite='tests',
 		zip_safe=True)
@@ -0,0 +1,139 @@
+import io
+import struct
+
+from levelorm import fields
+from levelorm.codec import MISSING, Codec
+from levelorm.compact import CompactCodec, pack_uvarint
+from levelorm.orm import InvalidModel
+from .base import BaseTest
+
+def serialize_aligned(value_fields, values):
+	''' the stream-based format that :class:`Codec` must stay compatible with '''
+	buf = io.BytesIO()
+	for (_, field), value in zip(value_fields, values):
+		field.serialize(buf, value)
+		remainder = buf.tell() % 4
+		if remainder != 0:
+			buf.write(b'\0' * (4 - remainder))
+	return buf.getvalue()
+
+class TestCodec(BaseTest):
+	value_fields = (
+		('shouts', fields.Boolean()),
+		('decibels', fields.Float()),
+		('onomatopoeia', fields.String()),
+		('legs', fields.Integer()),
+		('calm', fields.Boolean()),
+		('raw', fields.Blob()),
+		('matrix', fields.Array(fields.Array(fields.Integer()))),
+		('flags', fields.Array(fields.Boolean())),
+		('jis', fields.String(encoding='shift-jis')),
+	)
+	values = (True, 87.5, 'moo', -4, False, b'\xde\xad', [[1, 2], [3]], [True, False, True], 'もー')
+
+	def test_format(self):
+		codec = Codec(self.value_fields)
+		data = codec.encode(self.values)
+		assert data == serialize_aligned(self.value_fields, self.values)
+		assert codec.decode(data) == self.values
+		assert codec.decode(memoryview(data)) == self.values
+
+	def test_offsets(self):
+		codec = Codec(self.value_fields)
+		data = codec.encode(self.values)
+		offsets = codec.offsets(data)
+		for field, offset, value in zip(codec.fields, offsets, self.values):
+			assert field.unpack_from(data, offset)[0] == value
+
+	def test_projector(self):
+		codec = Codec(self.value_fields)
+		data = codec.encode(self.values)
+		for wanted in [('jis',), ('legs', 'shouts'), ('calm', 'raw', 'decibels'), ()]:
+			project = codec.projector(wanted)
+			assert project(data) == tuple(self.values[codec.positions[name]] for name in wanted)
+			assert codec.projector(wanted) is project
+
+	def test_header(self):
+		codec = Codec(self.value_fields, header=b'\xfev\0\1')
+		data = codec.encode(self.values)
+		assert data == b'\xfev\0\1' + serialize_aligned(self.value_fields, self.values)
+		assert codec.decode(data) == self.values
+		assert codec.projector(('legs', 'jis'))(data) == (-4, 'もー')
+		assert codec.offsets(data)[0] == codec.static_offsets[0] == 4
+		with self.assert_raises(ValueError):
+			Codec(self.value_fields, header=b'v1')
+
+	def test_empty(self):
+		codec = Codec(())
+		assert codec.encode(()) == b''
+		assert codec.decode(b'') == ()
+
+	def test_invalid_value(self):
+		codec = Codec(self.value_fields[:2])
+		with self.assert_raises(TypeError):
+			codec.encode((1, 87.5))
+
+class TestCompactCodec(BaseTest):
+	value_fields = TestCodec.value_fields + (
+		('big', fields.Integer(bits=64)),
+		('samples', fields.Array(fields.Float())),
+	)
+	values = TestCodec.values + (-2**63, [1.5, -2.0])
+
+	def test_format(self):
+		codec = CompactCodec(self.value_fields[:5])
+		data = codec.encode(self.values[:5])
+		# the Booleans' bitmap, the Float, the String's varint length and bytes, then -4 zigzagged
+		assert data == b'\x01' + struct.pack('<d', 87.5) + b'\x03moo' + b'\x07'
+		codec = CompactCodec(self.value_fields)
+		data = codec.encode(self.values)
+		assert len(data) < len(Codec(TestCodec.value_fields).encode(TestCodec.values))
+		assert codec.decode(data) == self.values
+		assert codec.decode(memoryview(data)) == self.values
+
+	def test_integers(self):
+		codec = CompactCodec([('small', fields.Integer()), ('big', fields.Integer(bits=64))])
+		for value in [0, -1, 1, 63, -64, 64, 2**31 - 1, -2**31]:
+			assert codec.decode(codec.encode((value, value * 2**32))) == (value, value * 2**32)
+		assert len(codec.encode((-64, 63))) == 2
+		with self.assert_raises(struct.error):
+			codec.encode((2**31, 0))
+		with self.assert_raises(ValueError):
+			pack_uvarint(-1)
+
+	def test_offsets(self):
+		codec = CompactCodec(self.value_fields)
+		data = codec.encode(self.values)
+		offsets = codec.offsets(data)
+		for unpack_from, offset, value in zip(codec.unpackers, offsets, self.values):
+			assert unpack_from(data, offset)[0] == value
+		# the bitmap and the Float before the first varint
+		assert codec.static_offsets[:3] == [0, 1, 9]
+		assert codec.static_offsets[4] == 0
+
+	def test_projector(self):
+		codec = CompactCodec(self.value_fields, header=b'v1')
+		data = codec.encode(self.values)
+		assert data[:2] == b'v1'
+		for wanted in [('jis',), ('legs', 'shouts'), ('calm', 'raw', 'decibels'), ('samples', 'big'), ()]:
+			assert codec.projector(wanted)(data) == tuple(self.values[codec.positions[name]] for name in wanted)
+
+	def test_splice(self):
+		codec = CompactCodec(self.value_fields)
+		data = codec.encode(self.values)
+		values = list(self.values)
+		values[0] = False
+		values[3] = 300
+		values[6] = MISSING
+		values[4] = True
+		changes = codec.changes(data, codec.offsets(data), values)
+		assert sorted(changes) == [0, 3, 4]
+		values[6] = self.values[6]
+		assert codec.splice(data, codec.offsets(data), changes) == codec.encode(values)
+
+	def test_invalid(self):
+		codec = CompactCodec(self.value_fields[:2])
+		with self.assert_raises(TypeError):
+			codec.encode((1, 87.5))
+		with self.assert_raises(InvalidModel):
+			CompactCodec([('view', fields.Array(fields.Float(), view=True))])
@@ -0,0 +1,85 @@
+import io
+from os import path
+import shutil
+import tempfile
+import typing
+
+import plyvel
+
+import levelorm
+from levelorm import dump
+from levelorm.fields import String, Integer
+from .base import BaseTest
+
+class TestDump(BaseTest):
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.db = plyvel.DB(path.join(self.tmpdir, 'source'), create_if_missing=True)
+		self.target = plyvel.DB(path.join(self.tmpdir, 'target'), create_if_missing=True)
+		DBBaseModel: typing.Any = levelorm.db_base_model(self.db)
+
+		class Cow(DBBaseModel):
+			prefix = 'cow'
+			name = String(key=True)
+			age = Integer(index=True)
+		self.Cow = Cow
+
+		Cow.save_many(Cow('cow%d' % i, i) for i in range(10))
+		self.db.put(b'other-key', b'value')
+		self.cow_keys = [key for key, _ in self.db.iterator() if key.startswith((b'cow-', b'cow:'))]
+
+	def tearDown(self):
+		self.db.close()
+		self.target.close()
+		shutil.rmtree(self.tmpdir)
+
+	def test_round_trip(self):
+		for format in dump.FORMATS:
+			out = io.BytesIO()
+			state = dump.dump(self.db, out, [self.Cow], format=format)
+			assert state.records == len(self.cow_keys) == 20 # records and index entries
+
+			state = dump.load(self.target, io.BytesIO(out.getvalue()), batch_bytes=100)
+			assert state.records == 20
+			assert list(self.target.iterator()) == list(self.db.iterator(stop=b'other'))
+
+			for key, _ in self.target.iterator():
+				self.target.delete(key)
+
+	def test_everything(self):
+		out = io.BytesIO()
+		dump.dump(self.db, out)
+		assert list(dump.read(io.BytesIO(out.getvalue()))) == list(self.db.iterator())
+
+	def test_resume(self):
+		after = self.cow_keys[4]
+		out = io.BytesIO()
+		dump.dump(self.db, out, ['cow'], after=after)
+		assert [key for key, _ in dump.read(io.BytesIO(out.getvalue()))] == self.cow_keys[5:]
+
+		out = io.BytesIO()
+		dump.dump(self.db, out, ['cow'], format='ndjson')
+		reports: typing.List[bytes] = []
+		dump.load(self.target, io.BytesIO(out.getvalue()), after=after, compact=False,
+				progress=lambda progress: reports.append(progress.last_key))
+		assert [key for key, _ in self.target.iterator()] == self.cow_keys[5:]
+		assert reports == [self.cow_keys[-1]]
+
+	def test_compressed(self):
+		filename = path.join(self.tmpdir, 'cows.dump.gz')
+		with dump.open_dump(filename, 'wb') as f:
+			dump.dump(self.db, f, ['cow'])
+		with open(filename, 'rb') as f:
+			assert f.read(2) == b'\x1f\x8b'
+		dump.main(['load', path.join(self.tmpdir, 'loaded'), filename])
+		loaded = plyvel.DB(path.join(self.tmpdir, 'loaded'))
+		try:
+			assert [key for key, _ in loaded.iterator()] == self.cow_keys
+		finally:
+			loaded.close()
+
+	def test_truncated(self):
+		out = io.BytesIO()
+		dump.dump(self.db, out, ['cow'])
+		with self.assert_raises(ValueError):
+			list(dump.read(io.BytesIO(out.getvalue()[:-1])))
@@ -60,6 +60,16 @@ class TestFields(BaseTest):
 		with self.assert_raises(struct.error):
 			blob_field.serialize(buf, LongBytes())
 
+	def test_64_bit_integer(self):
+		int_field = fields.Integer(bits=64)
+		assert int_field.unpack_from(int_field.pack(-2**63), 0) == (-2**63, 8)
+		assert int_field.pack_ordered(-1) < int_field.pack_ordered(0) < int_field.pack_ordered(2**40)
+		assert int_field.deserialize_key(int_field.serialize_key(2**63 - 1)) == 2**63 - 1
+		with self.assert_raises(struct.error):
+			int_field.pack(2**63)
+		with self.assert_raises(InvalidModel):
+			fields.Integer(bits=16)
+
 	def test_range(self):
 		buf = io.BytesIO()
 		f = 2**128 + 1.0 # the maximum representable binary32 is about 2**128
@@ -67,3 +77,32 @@ class TestFields(BaseTest):
 		float_field.serialize(buf, f)
 		buf.seek(0)
 		assert float_field.deserialize(buf) == f
+
+	def test_bulk_array(self):
+		matrix_field = fields.Array(fields.Array(fields.Integer()))
+		matrix = [[1, -2, 3], [], [2**31 - 1]]
+		buf = io.BytesIO()
+		matrix_field.serialize(buf, matrix)
+		data = buf.getvalue()
+		assert data == struct.pack('I', 3) + struct.pack('I3i', 3, 1, -2, 3) + struct.pack('I', 0) + \
+				struct.pack('Ii', 1, 2**31 - 1)
+		buf.seek(0)
+		assert matrix_field.deserialize(buf) == matrix
+		assert matrix_field.unpack_from(data, 0) == (matrix, len(data))
+
+		bool_field = fields.Array(fields.Boolean())
+		with self.assert_raises(TypeError):
+			bool_field.pack([True, 1])
+
+		view_field = fields.Array(fields.Float(), view=True)
+		data = view_field.pack([1.5, 2.5])
+		view, end = view_field.unpack_from(data, 0)
+		assert end == len(data)
+		assert isinstance(view, memoryview) and view.readonly
+		assert view.tolist() == [1.5, 2.5]
+		assert view_field.pack(view) == data
+		with self.assert_raises(TypeError):
+			view_field.pack(memoryview(b'abcd'))
+
+		with self.assert_raises(InvalidModel):
+			fields.Array(fields.String(), view=True)
@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 
+import asyncio
+import operator
 from os import path
 import shutil
+import threading
+import time
 import typing
 
 import plyvel
 
 import levelorm
+from levelorm import cache, columns, compression, metrics, parallel, query, schema
 from levelorm.fields import String, Blob, Boolean, Integer, Array, Float
 from levelorm.orm import InvalidModel
 from .base import BaseTest
@@ -18,6 +23,22 @@ DBBaseModel: typing.Any = levelorm.db_base_model(db)
 def tearDownModule():
 	shutil.rmtree(dbpath)
 
+# parallel_scan pickles the functions it runs, so they're defined here
+def total(numbers):
+	return sum(numbers.numbers)
+
+def is_even(numbers):
+	return numbers.numbers[0] % 2 == 0
+
+def add_total(accumulated, numbers):
+	return accumulated + total(numbers)
+
+def add(a, b):
+	return a + b
+
+def no_writes(*args):
+	raise AssertionError('parallel_scan workers must not write')
+
 class Animal(DBBaseModel):
 	prefix = 'animal'
 	name = String(key=True)
@@ -50,6 +71,116 @@ class RawData(DBBaseModel):
 	key = Blob(key=True)
 	data = Blob()
 
+class Pet(DBBaseModel):
+	prefix = 'pet'
+	name = String(key=True)
+	owner = String(index=True)
+	legs = Integer(index=True)
+	weight = Float(index=True)
+	indoor = Boolean(index=True)
+
+class Event(DBBaseModel):
+	prefix = 'event'
+	tenant = String(key=True)
+	kind = String(index=True)
+	ts = Integer(key=True)
+	weight = Float()
+
+class Reading(DBBaseModel):
+	prefix = 'reading'
+	celsius = Float(key=True)
+	place = String()
+
+class CountedPet(DBBaseModel):
+	prefix = 'countedpet'
+	counted = True
+	name = String(key=True)
+	legs = Integer()
+	weight = Float()
+	indoor = Boolean()
+
+class SlottedAnimal(DBBaseModel):
+	prefix = 'slottedanimal'
+	slots = True
+	name = String(key=True)
+	onomatopoeia = String()
+	decibels = Float(index=True)
+
+class AnimalV0(DBBaseModel):
+	prefix = 'versioned'
+	name = String(key=True)
+	onomatopoeia = String()
+
+class AnimalV1(DBBaseModel):
+	prefix = 'versioned'
+	version = 1
+	old_versions = {0: schema.Version([('onomatopoeia', String())], schema.unchanged)}
+	name = String(key=True)
+	onomatopoeia = String()
+
+def add_legs(values):
+	return dict(values, legs=4)
+
+class AnimalV2(DBBaseModel):
+	prefix = 'versioned'
+	version = 2
+	old_versions = {
+		0: schema.Version([('onomatopoeia', String())], schema.unchanged),
+		1: schema.Version([('onomatopoeia', String())], add_legs),
+	}
+	name = String(key=True)
+	onomatopoeia = String()
+	legs = Integer(index=True)
+
+class CompressedAnimal(DBBaseModel):
+	prefix = 'compressedanimal'
+	compression = compression.Zlib(min_size=16, dictionary_size=1024)
+	name = String(key=True)
+	onomatopoeia = String()
+	legs = Integer(index=True)
+
+class PaddedReading(DBBaseModel):
+	prefix = 'compactreading'
+	sensor = String(key=True)
+	ok = Boolean()
+	value = Integer(index=True)
+	label = String()
+	calibrated = Boolean()
+
+class CompactReading(DBBaseModel):
+	prefix = 'compactreading'
+	format = 'compact'
+	version = 1
+	old_versions = {
+		0: schema.Version([('ok', Boolean()), ('value', Integer(index=True)), ('label', String()),
+				('calibrated', Boolean())], schema.unchanged, format='padded'),
+	}
+	sensor = String(key=True)
+	ok = Boolean()
+	value = Integer(index=True)
+	label = String()
+	calibrated = Boolean()
+
+class Token(DBBaseModel):
+	prefix = 'token'
+	ttl = 60
+	counted = True
+	token = String(key=True)
+	user = String(index=True)
+
+CachedBaseModel: typing.Any = levelorm.db_base_model(db, cache_size=2, negative_cache=True)
+
+class CachedNumbers(CachedBaseModel):
+	prefix = 'cachednumbers'
+	name = String(key=True)
+	numbers = Array(Integer())
+
+class CachedToken(CachedBaseModel):
+	prefix = 'cachedtoken'
+	expiring = True
+	token = String(key=True)
+	user = String()
+
 class TestLevelORM(BaseTest):
 	def test_basic(self):
 		before = Animal('cow', 'moo', True, decibels=87.0)
@@ -126,6 +257,829 @@ class TestLevelORM(BaseTest):
 		assert len(data) == 1
 		assert data[0] == deadbeef
 
+	def test_batch(self):
+		Animal.save_many([Animal('cat', 'meow', False, 40.0), Animal('lion', 'roar', True, 110.0)])
+		assert Animal.get('cat').onomatopoeia == 'meow'
+
+		with Animal.batch() as batch:
+			Animal('cat', 'purr', False, 20.0).save()
+			Numbers('primes', [2, 3, 5, 7]).save()
+			Animal.get('lion').delete()
+			assert Animal.get('cat').onomatopoeia == 'meow'
+			assert Numbers.get('primes') is None
+			assert isinstance(batch, levelorm.orm.WriteBatch)
+		assert Animal.get('cat').onomatopoeia == 'purr'
+		assert Numbers.get('primes').numbers == [2, 3, 5, 7]
+		assert Animal.get('lion') is None
+
+		with self.assert_raises(RuntimeError):
+			with Animal.batch():
+				Animal('cat', 'hiss', False, 60.0).save()
+				raise RuntimeError('abort the batch')
+		assert Animal.get('cat').onomatopoeia == 'purr'
+
+		Animal.delete_many(['cat', 'lion'])
+		Numbers.delete_many(['primes'])
+		assert Animal.get('cat') is None
+		assert Numbers.get('primes') is None
+
+	def test_get_many(self):
+		Numbers.save_many(Numbers(str(i), [i]) for i in range(0, 100, 2))
+		for keys in [['4', '1', '4', '98'], [str(i) for i in range(100)]]:
+			results = Numbers.get_many(keys)
+			assert len(results) == len(keys)
+			for key, result in zip(keys, results):
+				if int(key) % 2 == 0:
+					assert result == Numbers(key, [int(key)])
+				else:
+					assert result is None
+		assert Numbers.get_many(['4', '4'], snapshot=False)[1].numbers == [4]
+		assert Numbers.get_many([]) == []
+		Numbers.delete_many(str(i) for i in range(0, 100, 2))
+
+	def test_read_session(self):
+		Numbers.save_many(Numbers(str(i), [i]) for i in range(0, 100, 2))
+		Pet('rex', 'alice', 4, 30.5, False).save()
+		CachedNumbers('one', [1]).save()
+		CachedNumbers._cache.clear()
+		with DBBaseModel.read_session() as session:
+			# none of these writes are visible inside the session
+			Numbers('1', [1]).save()
+			Numbers('2', [-2]).save()
+			Numbers.delete_many(['98'])
+			Pet('rex', 'bob', 4, 30.5, False).save()
+			Pet('tweety', 'bob', 2, 0.1, True).save()
+
+			assert Numbers.get('1') is None
+			assert Numbers.get('2').numbers == [2]
+			assert Numbers.get('2', fieldnames=['numbers']).numbers == [2]
+			assert [n.name for n in Numbers.iter(prefix='9')] == ['90', '92', '94', '96', '98']
+			assert list(Numbers.iter(start='94', include_value=False)) == ['94', '96', '98']
+			results = Numbers.get_many(str(i) for i in range(100))
+			assert [n.numbers[0] for n in results if n is not None] == list(range(0, 100, 2))
+			assert list(Numbers.scan_columns(['numbers'], start='96')['numbers'][1]) == [96, 98]
+			assert [p.owner for p in Pet.iter_by('legs')] == ['alice']
+			with Numbers.read_session() as inner:
+				assert inner is session
+				assert Numbers.get('98') is not None
+		assert Numbers.get('1').numbers == [1]
+		assert [p.owner for p in Pet.iter_by('legs')] == ['bob', 'bob']
+
+		# sessions of one base don't affect the models of another
+		with CachedBaseModel.read_session(snapshot=False, fill_cache=False):
+			assert CachedNumbers.get('one').numbers == [1]
+			assert Numbers.get('1') is not None
+		assert CachedNumbers.cache_stats()['entries'] == 0
+		with CachedBaseModel.read_session():
+			CachedNumbers('one', [2]).save()
+			assert CachedNumbers.get('one').numbers == [1]
+			assert CachedNumbers.get_many(['one']) == [CachedNumbers('one', [1])]
+		assert CachedNumbers.cache_stats()['entries'] == 0
+		assert CachedNumbers.get('one').numbers == [2]
+
+		# scans in a session step the session's raw iterators instead of creating new ones
+		with DBBaseModel.read_session() as session:
+			for _ in range(3):
+				assert [n.name for n in Numbers.iter(prefix='8')] == ['8', '80', '82', '84', '86', '88']
+			assert len(session._raw_iterators) == 1
+			snapshot = Numbers.db.snapshot()
+			for kwargs in [{}, {'reverse': True}, {'start': b'3', 'stop': b'5'}, {'start': b'30', 'include_start': False},
+					{'stop': b'50', 'include_stop': True, 'reverse': True}, {'start': b'31', 'stop': b'49', 'reverse': True},
+					{'prefix': b'4', 'reverse': True}, {'start': b'98', 'include_start': False}, {'include_value': False}]:
+				with Numbers._source().iterator(**kwargs) as it:
+					assert list(it) == list(snapshot.iterator(**kwargs)), kwargs
+			with Numbers._source().iterator(start=b'2', stop=b'6') as it:
+				assert next(it)[0] == b'2'
+				it.seek(b'55')
+				assert [key for key, _ in it] == [b'56', b'58']
+			with Numbers._source().iterator(reverse=True, stop=b'6') as it:
+				it.seek(b'55')
+				assert next(it)[0] == b'54'
+			assert len(session._raw_iterators) == 1
+
+		# without a snapshot, scans see what was written earlier in the session
+		with DBBaseModel.read_session(snapshot=False) as session:
+			assert [n.name for n in Numbers.iter(prefix='3')] == ['30', '32', '34', '36', '38']
+			Numbers('3', [3]).save()
+			Numbers.save_many(Numbers(str(i), [i]) for i in range(101, 111))
+			assert [n.name for n in Numbers.iter(prefix='3')] == ['3', '30', '32', '34', '36', '38']
+			assert [n.numbers[0] for n in Numbers.get_many(str(i) for i in range(101, 111))] == list(range(101, 111))
+			assert not session._raw_iterators
+		Numbers.delete_many(str(i) for i in range(101, 111))
+
+		Numbers.delete_many(str(i) for i in range(100))
+		Pet.delete_many(['rex', 'tweety'])
+		CachedNumbers.delete_many(['one'])
+
+	def test_count(self):
+		pets = [
+			CountedPet('rex', 4, 30.5, False),
+			CountedPet('spot', 4, 12.0, True),
+			CountedPet('tweety', 2, 0.1, True),
+			CountedPet('nemo', 0, 0.2, True),
+		]
+		CountedPet.save_many(pets)
+		assert CountedPet.count() == 4
+		with CountedPet.batch():
+			CountedPet('rex', 3, 30.5, False).save(force=True)
+			CountedPet('felix', 4, 5.0, True).save()
+			CountedPet('felix', 4, 5.5, True).save()
+			CountedPet.delete_many(['nemo', 'missing'])
+		assert CountedPet.count() == 4
+		assert CountedPet.count(start='r') == 3
+		assert CountedPet.count(where=CountedPet.indoor) == 3
+		assert Pet.count() == 0
+		# a counter that wasn't kept is recounted
+		db.delete(CountedPet._counter_key)
+		CountedPet('nemo', 0, 0.2, True).save()
+		assert db.get(CountedPet._counter_key) is None
+		assert CountedPet.count() == 5
+		assert CountedPet.recount() == 5
+
+		assert CountedPet.aggregate() == {'count': 5}
+		assert CountedPet.aggregate(sum='legs', min=['legs', 'weight'], max='weight', start='r') == \
+				{'count': 3, 'sum': {'legs': 9}, 'min': {'legs': 2, 'weight': 0.1}, 'max': {'weight': 30.5}}
+		assert CountedPet.aggregate(sum='weight', group_by='indoor') == {
+			False: {'count': 1, 'sum': {'weight': 30.5}},
+			True: {'count': 4, 'sum': {'weight': 5.5 + 0.2 + 12.0 + 0.1}},
+		}
+		assert CountedPet.aggregate(histogram={'legs': [1, 4]}, where=CountedPet.weight < 20) == \
+				{'count': 4, 'histogram': {'legs': [1, 1, 2]}}
+		assert CountedPet.aggregate(max='legs', stop='a') == {'count': 0, 'max': {'legs': None}}
+
+		Event.save_many([Event('acme', 'click', 1, 1.0), Event('acme', 'view', 2, 2.0), Event('globex', 'view', 1, 3.0)])
+		assert Event.aggregate(sum='weight', group_by='tenant') == \
+				{'acme': {'count': 2, 'sum': {'weight': 3.0}}, 'globex': {'count': 1, 'sum': {'weight': 3.0}}}
+		assert Event.count(prefix=('acme',)) == 2
+		Event.delete_many([('acme', 1), ('acme', 2), ('globex', 1)])
+		with self.assert_raises(ValueError):
+			CountedPet.aggregate(sum='name')
+		with self.assert_raises(ValueError):
+			Animal.aggregate(group_by='colour')
+
+		CountedPet.delete_many(['felix', 'nemo', 'rex', 'spot', 'tweety'])
+		assert CountedPet.count() == 0
+		db.delete(CountedPet._counter_key)
+
+	def test_index(self):
+		Pet.save_many([
+			Pet('rex', 'alice', 4, 30.5, False),
+			Pet('tweety', 'bob', 2, 0.1, True),
+			Pet('spot', 'alice', 4, 12.0, True),
+		])
+		assert [p.name for p in Pet.iter_by('owner', 'alice')] == ['rex', 'spot']
+		assert [p.name for p in Pet.iter_by('legs', start=3)] == ['rex', 'spot']
+		assert [p.name for p in Pet.iter_by('weight', stop=30.5, reverse=True)] == ['spot', 'tweety']
+		assert [p.name for p in Pet.iter_by('indoor', False)] == ['rex']
+
+		spot = Pet.get('spot')
+		spot.owner = 'bob'
+		spot.save()
+		assert [p.name for p in Pet.iter_by('owner', 'alice')] == ['rex']
+		assert [p.name for p in Pet.iter_by('owner', 'bob')] == ['spot', 'tweety']
+
+		with Pet.batch():
+			spot.owner = 'carol'
+			spot.save()
+			spot.owner = 'dave'
+			spot.save()
+		assert [p.name for p in Pet.iter_by('owner', start='c')] == ['spot']
+
+		Pet.delete_many(['rex', 'spot', 'tweety'])
+		assert list(Pet.iter_by('owner')) == []
+		assert list(db.iterator(prefix=b'pet:')) == []
+
+		with self.assert_raises(InvalidModel):
+			list(Pet.iter_by('name'))
+		with self.assert_raises(InvalidModel):
+			class PetOwner(DBBaseModel): # pylint: disable=unused-variable
+				prefix = 'pet:owner'
+				name = String(key=True)
+
+	def test_count_threads(self):
+		def run(target, count):
+			threads = [threading.Thread(target=target) for _ in range(count)]
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+		def save():
+			for i in range(500):
+				CountedPet('pet%d' % i, 4, 1.0, True).save()
+		def delete():
+			CountedPet.delete_many('pet%d' % i for i in range(0, 500, 2))
+
+		CountedPet.recount()
+		# only the first save of each pet counts, whichever thread it was in
+		run(save, 4)
+		assert CountedPet.count() == 500
+		run(delete, 2)
+		assert CountedPet.count() == 250
+		assert CountedPet.recount() == 250
+		CountedPet.delete_many('pet%d' % i for i in range(500))
+		assert CountedPet.count() == 0
+
+	def test_index_threads(self):
+		def save(legs):
+			for i in range(200):
+				Pet(str(i), 'alice', legs, 1.0, True).save()
+		threads = [threading.Thread(target=save, args=(legs,)) for legs in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		assert len(list(db.iterator(prefix=b'pet:legs-'))) == 200
+		pets = list(Pet.iter_by('legs'))
+		assert sorted(p.name for p in pets) == sorted(str(i) for i in range(200))
+		for legs in range(4):
+			assert all(p.legs == legs for p in Pet.iter_by('legs', legs))
+
+		# a stale index entry is skipped
+		db.put(b'pet:legs-' + Pet.legs.pack_ordered(9) + b'0', b'')
+		assert list(Pet.iter_by('legs', 9)) == []
+		db.delete(b'pet:legs-' + Pet.legs.pack_ordered(9) + b'0')
+		Pet.delete_many(str(i) for i in range(200))
+		assert list(db.iterator(prefix=b'pet:')) == []
+
+	def test_cache(self):
+		CachedNumbers('one', [1]).save()
+		CachedNumbers('two', [1, 2]).save()
+		CachedNumbers.get('one').numbers.append(100) # must not change the cached value
+		assert CachedNumbers.get('one').numbers == [1]
+		assert CachedNumbers.get('missing') is None
+		assert CachedNumbers.get('missing') is None
+		stats = CachedNumbers.cache_stats()
+		assert (stats['hits'], stats['misses'], stats['entries']) == (2, 2, 2)
+
+		CachedNumbers.get('two')
+		assert CachedNumbers.cache_stats()['evictions'] == 1
+
+		CachedNumbers('one', [1, 1]).save()
+		assert CachedNumbers.get('one').numbers == [1, 1]
+		with CachedNumbers.batch():
+			CachedNumbers('two', [2, 2]).save()
+			assert CachedNumbers.get('two').numbers == [1, 2]
+		assert CachedNumbers.get_many(['two', 'one', 'missing']) == \
+				[CachedNumbers('two', [2, 2]), CachedNumbers('one', [1, 1]), None]
+
+		# a value that is saved again between the read and the put isn't cached
+		def save_first(key, stored):
+			del CachedNumbers._cache_entry
+			CachedNumbers(key.decode('utf-8'), [3]).save()
+			return CachedNumbers._cache_entry(key, stored)
+		CachedNumbers._cache.clear()
+		CachedNumbers._cache_entry = staticmethod(save_first)
+		assert CachedNumbers.get('one').numbers == [1, 1]
+		assert CachedNumbers.get('one').numbers == [3]
+		CachedNumbers._cache_entry = staticmethod(save_first)
+		assert CachedNumbers.get_many(['two']) == [CachedNumbers('two', [2, 2])]
+		assert CachedNumbers.get_many(['two']) == [CachedNumbers('two', [3])]
+		# once the invalidation of a key is forgotten, values read before it aren't cached either
+		lru = cache.LRUCache(max_entries=2)
+		generation = lru.generation()
+		for i in range(cache.INVALIDATIONS + 1):
+			lru.invalidate(b'%d' % i)
+		lru.put(b'x', 1, 0, generation)
+		lru.put(b'y', 2, 0)
+		assert lru.get(b'x') is None and lru.get(b'y') == 2
+
+		CachedNumbers.delete_many(['one', 'two'])
+		assert CachedNumbers.get('one') is None
+		assert Numbers.cache_stats() is None
+
+	def test_lazy(self):
+		hankel = Matrices('hankel', [[1, 2], [2, 3]])
+		hankel.save()
+		lazy = Matrices.get('hankel', lazy=True)
+		assert 'numbers' not in vars(lazy)
+		lazy.save()
+		assert 'numbers' not in vars(lazy)
+		assert lazy == hankel
+		assert repr(lazy) == repr(hankel)
+		lazy.numbers.append([3, 4])
+		lazy.save()
+		assert Matrices.get('hankel').numbers == [[1, 2], [2, 3], [3, 4]]
+
+		Animal('cow', 'moo', True, 87.0).save()
+		cow = list(Animal.iter(lazy=True))[0]
+		assert cow.decibels == 87.0
+		assert 'onomatopoeia' not in vars(cow)
+		assert cow.onomatopoeia == 'moo'
+		cow.delete()
+
+		with self.assert_raises(AttributeError):
+			Animal.__new__(Animal).shouts # pylint: disable=expression-not-assigned
+
+	def test_keys(self):
+		Reading.save_many([Reading(t, 'somewhere') for t in [12.5, -40.0, 0.0, -0.5, 100.0]])
+		assert [r.celsius for r in Reading.iter()] == [-40.0, -0.5, 0.0, 12.5, 100.0]
+		assert [r.celsius for r in Reading.iter(start=-1.0, stop=50.0)] == [-0.5, 0.0, 12.5]
+		assert Reading.get(12.5).place == 'somewhere'
+		Reading.delete_many([-40.0, -0.5, 0.0, 12.5, 100.0])
+
+		events = [
+			Event('acme', 'click', 1500, 1.0),
+			Event('acme', 'view', -3, 0.5),
+			Event('acme', 'view', 1600, 2.0),
+			Event('acme\0', 'click', 1, 1.0),
+			Event('globex', 'click', 1550, 3.0),
+			Event('ac', 'view', 1550, 4.0),
+		]
+		Event.save_many(events)
+		assert [e._key for e in Event.iter()] == [('ac', 1550), ('acme', -3), ('acme', 1500), ('acme', 1600),
+				('acme\0', 1), ('globex', 1550)]
+		assert list(Event.iter(prefix=('acme',), include_value=False)) == [('acme', -3), ('acme', 1500), ('acme', 1600)]
+		assert [e.ts for e in Event.iter(start=('acme', 0), stop=('acme', 1600))] == [1500]
+		assert Event.get(('acme', 1500)) == events[0]
+		assert Event.get(('acme', 1500), fieldnames=['weight']) == ('acme', 1500, 1.0)
+		assert Event.get_many([('globex', 1550), ('acme', 1)]) == [events[4], None]
+		assert [e.ts for e in Event.iter_by('kind', 'view')] == [1550, -3, 1600]
+		assert [e.ts for e in Event.iter(where=(Event.tenant == 'acme') & (Event.ts > 0))] == [1500, 1600]
+		assert query.key_prefix(Event, (Event.ts == 1) & (Event.tenant == 'acme')) == \
+				Event._keyfield.serialize_key(('acme', 1))
+		assert list(Event.iter(as_tuples=True, prefix=('globex',))) == [Event.Record('globex', 'click', 1550, 3.0)]
+		assert list(Event.scan_columns(['weight'], include_key=True, prefix=('acme',))['ts']) == [-3, 1500, 1600]
+
+		click = Event.get(('acme', 1500))
+		click.weight = 1.5
+		click.save()
+		assert Event.get(('acme', 1500)).weight == 1.5
+		Event.delete_many([e._key for e in events])
+		assert list(Event.iter()) == []
+
+	def test_dirty(self):
+		cow = Animal('cow', 'moo', True, 87.0)
+		assert cow.is_dirty() and cow.changed_fields() == ['onomatopoeia', 'shouts', 'decibels']
+		cow.save()
+		assert not cow.is_dirty()
+
+		cow = Animal.get('cow')
+		cow.decibels = 87.0
+		assert not cow.is_dirty()
+		# an unchanged record isn't written again
+		Animal.db.put(b'cow', Animal._codec.encode(['MOO', True, 87.0]))
+		cow.save()
+		assert Animal.get('cow').onomatopoeia == 'MOO'
+		cow.save(force=True)
+		assert Animal.get('cow').onomatopoeia == 'moo'
+
+		cow = Animal.get('cow', lazy=True)
+		assert cow.decibels == 87.0
+		cow.shouts = False
+		assert cow.changed_fields() == ['shouts']
+		cow.save()
+		assert 'onomatopoeia' not in vars(cow)
+		assert Animal.get('cow') == Animal('cow', 'moo', False, 87.0)
+		cow.delete()
+		assert cow.is_dirty()
+		cow.save()
+		assert Animal.get('cow') == Animal('cow', 'moo', False, 87.0)
+		cow.delete()
+
+		Numbers('fibonacci', [1, 1, 2]).save()
+		fib = Numbers.get('fibonacci')
+		fib.numbers.append(3)
+		assert fib.changed_fields() == ['numbers']
+		fib.numbers.pop()
+		assert not fib.is_dirty()
+		fib.delete()
+
+		Pet('rex', 'alice', 4, 30.5, False).save()
+		rex = Pet.get('rex', lazy=True)
+		rex.owner = 'bob'
+		rex.save()
+		assert [p.name for p in Pet.iter_by('owner', 'bob')] == ['rex']
+		rex.delete()
+
+		spot = SlottedAnimal('spot', 'woof', 90.0)
+		spot.save()
+		spot = SlottedAnimal.get('spot')
+		assert not spot.is_dirty()
+		spot.decibels = 95.0
+		assert spot.changed_fields() == ['decibels']
+		spot.save()
+		assert SlottedAnimal.get('spot').decibels == 95.0
+		spot.delete()
+
+		CachedNumbers('one', [1]).save()
+		one = CachedNumbers.get('one')
+		one = CachedNumbers.get('one')
+		assert not one.is_dirty()
+		one.numbers.append(2)
+		one.save()
+		assert CachedNumbers.get('one').numbers == [1, 2]
+		one.delete()
+
+	def test_scan_columns(self):
+		Animal.save_many([Animal('cow', 'moo', True, 87.0), Animal('dog', 'woof', False, 95.0)])
+		Numbers.save_many([Numbers('a', [1, 2]), Numbers('b', []), Numbers('c', [3])])
+		for numpy in [columns.numpy, None]:
+			original, columns.numpy = columns.numpy, numpy
+			try:
+				result = Animal.scan_columns(['decibels', 'shouts'], include_key=True)
+				assert list(result['decibels']) == [87.0, 95.0]
+				assert [bool(shouts) for shouts in result['shouts']] == [True, False]
+				assert result['name'] == ['cow', 'dog']
+				assert list(Animal.scan_columns(['decibels'], start='d')['decibels']) == [95.0]
+
+				offsets, values = Numbers.scan_columns(['numbers'], start='a', stop='d')['numbers']
+				assert list(offsets) == [0, 2, 2, 3]
+				assert list(values) == [1, 2, 3]
+			finally:
+				columns.numpy = original
+		Animal.delete_many(['cow', 'dog'])
+		Numbers.delete_many(['a', 'b', 'c'])
+
+		with self.assert_raises(ValueError):
+			Animal.scan_columns(['onomatopoeia'])
+
+	def test_projection(self):
+		Animal.save_many([Animal('cow', 'moo', True, 87.0), Animal('dog', 'woof', False, 95.0)])
+		cow = Animal.get('cow', fieldnames=['decibels', 'onomatopoeia'])
+		assert cow == ('cow', 87.0, 'moo')
+		assert cow.decibels == 87.0
+		assert isinstance(cow, Animal.projection(['decibels', 'onomatopoeia']))
+		assert Animal.get('cat', fieldnames=['shouts']) is None
+		assert list(Animal.iter(fieldnames=['shouts'], start='d')) == [('dog', False)]
+		Animal.delete_many(['cow', 'dog'])
+
+		with self.assert_raises(ValueError):
+			Animal.get('cow', fieldnames=['legs'])
+
+	def test_where(self):
+		Animal.save_many([
+			Animal('cow', 'moo', True, 87.0),
+			Animal('dog', 'woof', False, 95.0),
+			Animal('duck', 'quack', True, 55.0),
+		])
+		def names(**kwargs):
+			return [animal.name for animal in Animal.iter(stop='z', **kwargs)]
+		assert names(where=(Animal.decibels > 80) & Animal.shouts) == ['cow']
+		assert names(where=~Animal.shouts | (Animal.onomatopoeia == 'quack')) == ['dog', 'duck']
+		assert names(where=Animal.name.startswith('d')) == ['dog', 'duck']
+		assert [animal.name for animal in Animal.iter(where=Animal.name.startswith('du'))] == ['duck']
+		assert names(where=Animal.name.startswith('d') & (Animal.onomatopoeia != 'woof')) == ['duck']
+		assert names(where=Animal.onomatopoeia.startswith('mo')) == ['cow']
+		assert names(where=Animal.onomatopoeia < 'p', limit=1) == ['cow']
+		assert names(limit=2) == ['cow', 'dog']
+		assert list(Animal.iter(where=Animal.decibels <= 87.0, include_value=False, stop='z')) == ['cow', 'duck']
+		assert list(Animal.iter(where=Animal.shouts, fieldnames=['decibels'], stop='z')) == [('cow', 87.0), ('duck', 55.0)]
+		assert [a.name for a in JISAnimal.iter(where=JISAnimal.onomatopoeia > 'a')] == ['犬']
+		Animal.delete_many(['cow', 'dog', 'duck'])
+
+		with self.assert_raises(TypeError):
+			list(Animal.iter(where=(Animal.decibels > 80) and Animal.shouts))
+		with self.assert_raises(ValueError):
+			list(Animal.iter(where=Numbers.numbers == []))
+		with self.assert_raises(TypeError):
+			assert Animal.name in [Animal.onomatopoeia, Animal.name]
+		assert Animal.name in {Animal.onomatopoeia, Animal.name}
+
+	def test_async(self):
+		async def run():
+			await Numbers('one', [1]).asave()
+			await Numbers.asave_many(Numbers(str(i), [i]) for i in range(2, 10))
+			assert (await Numbers.aget('one')).numbers == [1]
+			assert await Numbers.aget_many(['2', 'nine']) == [Numbers('2', [2]), None]
+
+			names = [n.name async for n in Numbers.aiter(chunk_size=3, start='2', stop='9')]
+			assert names == [str(i) for i in range(2, 9)]
+
+			# breaking out of the loop closes the iterator
+			iterator = Numbers.aiter(chunk_size=2, start='2')
+			async for number in iterator:
+				assert number.name == '2'
+				break
+			await iterator.aclose()
+
+			await (await Numbers.aget('one')).adelete()
+			await Numbers.adelete_many(str(i) for i in range(2, 10))
+			assert await Numbers.aget('one') is None
+
+		loop = asyncio.new_event_loop()
+		try:
+			loop.run_until_complete(run())
+		finally:
+			loop.close()
+
+	def test_parallel_scan(self):
+		Numbers.save_many(Numbers('p%02d' % i, [i, i]) for i in range(40))
+		min_partition_bytes = parallel.MIN_PARTITION_BYTES
+		parallel.MIN_PARTITION_BYTES = 64 # several partitions per worker
+		try:
+			assert Numbers.parallel_scan(total, workers=2, start='p', stop='q') == [i * 2 for i in range(40)]
+			evens = Numbers.parallel_scan(is_even, workers=2, mode='filter', start='p10', stop='p20')
+			assert [n.name for n in evens] == ['p%02d' % i for i in range(10, 20, 2)]
+			unordered = Numbers.parallel_scan(total, workers=3, ordered=False, start='p', stop='q')
+			assert sorted(unordered) == [i * 2 for i in range(40)]
+			assert Numbers.parallel_scan(add_total, workers=2, mode='reduce', initial=0, combine=add,
+					start='p', stop='q') == 40 * 39
+			assert Numbers.parallel_scan(total, workers=2, start='q') == []
+			with self.assert_raises(ValueError):
+				Numbers.parallel_scan(total, mode='sort')
+		finally:
+			parallel.MIN_PARTITION_BYTES = min_partition_bytes
+			Numbers.delete_many('p%02d' % i for i in range(40))
+
+	def test_metrics(self):
+		registry = metrics.Registry()
+		DBBaseModel.instrument(registry)
+		try:
+			Animal.save_many([Animal('cow', 'moo', True, 87.0), Animal('dog', 'woof', False, 95.0)])
+			assert Animal.get('cow').onomatopoeia == 'moo'
+			assert Animal.get('cat') is None
+			assert [a.name for a in Animal.iter(start='c', stop='e', where=Animal.shouts)] == ['cow']
+			Pet('kitty', 'me', 4, 2.5, True).save()
+			Pet.get('kitty').delete()
+		finally:
+			DBBaseModel.instrument(None)
+			Animal.delete_many(['cow', 'dog'])
+		assert not isinstance(Animal.db, metrics.InstrumentedDB)
+
+		stats = registry.snapshot()
+		assert set(stats['Animal']) == {'save_many', 'get', 'iter'}
+		assert stats['Animal']['save_many']['count'] == 1
+		assert stats['Animal']['save_many']['bytes_written'] > 0
+		get = stats['Animal']['get']
+		assert get['count'] == 2 and get['yielded'] == 1 and get['bytes_read'] > 0
+		assert get['latency']['count'] == 2 and get['p99'] >= get['p50'] > 0
+		assert stats['Animal']['iter']['scanned'] == 2
+		assert stats['Animal']['iter']['yielded'] == 1
+		assert set(stats['Pet']) == {'save', 'get', 'delete'}
+		assert stats['Pet']['save']['bytes_written'] > stats['Pet']['delete']['bytes_written'] > 0
+
+		# nothing is recorded without a hook
+		Animal.get('cow')
+		assert registry.snapshot()['Animal']['get']['count'] == 2
+
+	def test_slots(self):
+		cow = SlottedAnimal('cow', 'moo', 87.0)
+		assert not hasattr(cow, '__dict__')
+		with self.assert_raises(AttributeError):
+			setattr(cow, 'legs', 4)
+		assert isinstance(SlottedAnimal.decibels, Float)
+		cow.save()
+		SlottedAnimal('dog', onomatopoeia='woof', decibels=95.0).save()
+
+		cow = SlottedAnimal.get('cow')
+		assert cow == SlottedAnimal('cow', 'moo', 87.0)
+		assert repr(cow) == "SlottedAnimal(name='cow', onomatopoeia='moo', decibels=87.0)"
+		cow.onomatopoeia = 'MOO'
+		cow.save()
+		assert [a.onomatopoeia for a in SlottedAnimal.iter()] == ['MOO', 'woof']
+		assert [a.name for a in SlottedAnimal.iter(where=SlottedAnimal.decibels > 90)] == ['dog']
+		assert [a.name for a in SlottedAnimal.iter_by('decibels', start=90.0)] == ['dog']
+		with self.assert_raises(ValueError):
+			SlottedAnimal.get('cow', lazy=True)
+		SlottedAnimal.delete_many(['cow', 'dog'])
+
+		with self.assert_raises(InvalidModel):
+			class LazySlots(DBBaseModel): # pylint: disable=unused-variable
+				prefix = 'lazyslots'
+				slots = True
+				lazy = True
+				name = String(key=True)
+
+	def test_as_tuples(self):
+		Animal.save_many([Animal('cow', 'moo', True, 87.0), Animal('dog', 'woof', False, 95.0)])
+		records = list(Animal.iter(as_tuples=True, stop='z'))
+		assert records == [Animal.Record('cow', 'moo', True, 87.0), Animal.Record('dog', 'woof', False, 95.0)]
+		assert records[1].onomatopoeia == 'woof'
+		assert Animal(*records[0]) == Animal.get('cow')
+		assert list(Animal.iter(as_tuples=True, where=Animal.shouts)) == records[:1]
+		assert [tuple(r) for r in RawData.iter(as_tuples=True, stop=b'\xff')] == \
+				[(r.key, r.data) for r in RawData.iter(stop=b'\xff')]
+		with self.assert_raises(ValueError):
+			list(Animal.iter(as_tuples=True, include_value=False))
+		Animal.delete_many(['cow', 'dog'])
+
+	def test_versions(self):
+		AnimalV0('cow', 'moo').save()
+		AnimalV1('dog', 'woof').save()
+		AnimalV2('fish', '...', 0).save()
+		assert AnimalV0.db.get(b'dog')[:4] == schema.header(1)
+
+		assert AnimalV1.get('cow') == AnimalV1('cow', 'moo')
+		assert AnimalV2.get('cow') == AnimalV2('cow', 'moo', 4)
+		assert AnimalV2.get_many(['dog', 'fish']) == [AnimalV2('dog', 'woof', 4), AnimalV2('fish', '...', 0)]
+		assert AnimalV2.get('dog', fieldnames=['legs']).legs == 4
+		assert [a.name for a in AnimalV2.iter(where=AnimalV2.legs == 4)] == ['cow', 'dog']
+		assert list(AnimalV2.iter(as_tuples=True))[0] == ('cow', 'moo', 4)
+		assert list(AnimalV2.scan_columns(['legs'])['legs']) == [4, 4, 0]
+		# reading doesn't write unless migrate_on_read is set
+		assert AnimalV0.db.get(b'cow') == AnimalV0._codec.encode(['moo'])
+		assert [a.name for a in AnimalV2.iter_by('legs')] == ['fish']
+
+		AnimalV2.migrate_on_read = True
+		try:
+			# workers only decode
+			AnimalV2._write_upgraded = staticmethod(no_writes)
+			try:
+				assert AnimalV2.parallel_scan(operator.attrgetter('legs'), workers=2) == [4, 4, 0]
+			finally:
+				del AnimalV2._write_upgraded
+			assert AnimalV0.db.get(b'cow') == AnimalV0._codec.encode(['moo'])
+			AnimalV2.get('cow')
+		finally:
+			AnimalV2.migrate_on_read = False
+		assert AnimalV0.db.get(b'cow')[:4] == schema.header(2)
+		assert [a.name for a in AnimalV2.iter_by('legs', 4)] == ['cow']
+
+		checkpoints = []
+		migrator = AnimalV2.migrator(batch_size=1, after=b'cow', progress=lambda m: checkpoints.append(m.checkpoint))
+		migrator.start()
+		migrator.join()
+		assert checkpoints == [b'dog', b'fish'] and migrator.migrated == 1
+		assert [a.name for a in AnimalV2.iter_by('legs', 4)] == ['cow', 'dog']
+		with self.assert_raises(ValueError):
+			AnimalV1.get('dog') # written by a newer version
+		AnimalV2.delete_many(['cow', 'dog', 'fish'])
+
+		# records saved while a migration runs aren't replaced by the values it read before
+		for name in ['a1', 'a2', 'a3']:
+			AnimalV1(name, 'old').save()
+		def save_a3(migrator):
+			if migrator.checkpoint == b'a1':
+				AnimalV2('a3', 'new', 7).save()
+		migrator = AnimalV2.migrator(batch_size=1, progress=save_a3)
+		migrator.run()
+		assert migrator.migrated == 2
+		assert AnimalV2.get_many(['a1', 'a3']) == [AnimalV2('a1', 'old', 4), AnimalV2('a3', 'new', 7)]
+		# nor by writing back a value that was read before a save
+		AnimalV1('a4', 'old').save()
+		stored = AnimalV2.db.get(b'a4')
+		AnimalV2('a4', 'new', 7).save()
+		AnimalV2._write_upgraded(b'a4', AnimalV2._decode_stored(stored), stored)
+		assert AnimalV2.get('a4') == AnimalV2('a4', 'new', 7)
+		assert [a.name for a in AnimalV2.iter_by('legs', 7)] == ['a3', 'a4']
+		AnimalV2.delete_many(['a1', 'a2', 'a3', 'a4'])
+		assert not list(AnimalV2._base_db.iterator(prefix=b'versioned'))
+
+		with self.assert_raises(InvalidModel):
+			class FutureVersion(DBBaseModel): # pylint: disable=unused-variable
+				prefix = 'futureversion'
+				version = 1
+				old_versions = {1: schema.Version([], schema.unchanged)}
+				name = String(key=True)
+
+	def test_compression(self):
+		def stored(name):
+			return CompressedAnimal.db.get(name.encode('utf-8'))
+		words = ['moo', 'woof', 'quack', 'oink', 'neigh']
+		animals = [CompressedAnimal('animal%03d' % i, ' '.join(words[i % 5:] * 4), i % 5) for i in range(100)]
+		CompressedAnimal.save_many(animals)
+		assert stored('animal000')[:4] == compression.header(compression.NO_DICTIONARY)
+		assert len(stored('animal000')) < len(CompressedAnimal._codec.encode(['moo woof' * 10, 0]))
+		CompressedAnimal('tiny', '', 4).save()
+		assert stored('tiny')[:4] == compression.header(compression.STORED)
+
+		assert CompressedAnimal.get('animal001') == animals[1]
+		assert list(CompressedAnimal.iter(stop='b')) == animals
+		assert [a.name for a in CompressedAnimal.iter(where=CompressedAnimal.legs == 4, stop='b')] == \
+				['animal%03d' % i for i in range(4, 100, 5)]
+		assert [a.name for a in CompressedAnimal.iter_by('legs', 4)] == ['animal%03d' % i for i in range(4, 100, 5)] + ['tiny']
+		assert list(CompressedAnimal.scan_columns(['legs'], stop='b')['legs']) == [i % 5 for i in range(100)]
+
+		assert CompressedAnimal.train_compression(samples=50, seed=0) == 1
+		before = len(stored('animal007'))
+		CompressedAnimal.migrator(batch_size=10).run()
+		assert stored('animal007')[:4] == compression.header(1)
+		assert len(stored('animal007')) < before
+		assert list(CompressedAnimal.iter(stop='b')) == animals
+		stats = CompressedAnimal.compression_stats()
+		assert stats['dictionary'] == 1 and stats['ratio'] > 1
+		# no count is lost when several threads compress at once
+		compressor = CompressedAnimal._compressor
+		data = CompressedAnimal._codec.encode(['moo woof' * 10, 0])
+		def compress():
+			for _ in range(1000):
+				compressor.decompress(compressor.compress(data))
+		threads = [threading.Thread(target=compress) for _ in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		counts = CompressedAnimal.compression_stats()
+		assert (counts['values'], counts['decompressed']) == (stats['values'] + 4000, stats['decompressed'] + 4000)
+
+		CompressedAnimal.delete_many([a.name for a in animals] + ['tiny'])
+		assert Animal.compression_stats() is None
+
+	def test_compact(self):
+		readings = [PaddedReading('sensor%d' % i, i % 2 == 0, i - 2, 'label%d' % i, i == 3) for i in range(5)]
+		PaddedReading.save_many(readings)
+		expected = [CompactReading('sensor%d' % i, i % 2 == 0, i - 2, 'label%d' % i, i == 3) for i in range(5)]
+		assert list(CompactReading.iter()) == expected
+		assert [r.sensor for r in CompactReading.iter_by('value', -1)] == ['sensor1']
+
+		padded = len(CompactReading.db.get(b'sensor4'))
+		CompactReading.migrator().run()
+		stored = CompactReading.db.get(b'sensor4')
+		# the header, the bitmap, 2 zigzagged and 'label4' with its length
+		assert stored == schema.header(1) + b'\x01\x04\x06label4' and len(stored) < padded
+		assert list(CompactReading.iter()) == expected
+		assert [r.sensor for r in CompactReading.iter_by('value', -1)] == ['sensor1']
+		assert [r.sensor for r in CompactReading.iter(where=CompactReading.ok & (CompactReading.value > -2))] == \
+				['sensor2', 'sensor4']
+		assert [r.sensor for r in CompactReading.iter(where=CompactReading.label.startswith('label3'))] == ['sensor3']
+		scanned = CompactReading.scan_columns(['value', 'calibrated'])
+		assert list(scanned['value']) == [-2, -1, 0, 1, 2] and list(scanned['calibrated']) == [False] * 3 + [True, False]
+		assert CompactReading.aggregate(sum='value', group_by='ok') == \
+				{True: {'count': 3, 'sum': {'value': 0}}, False: {'count': 2, 'sum': {'value': 0}}}
+
+		lazy = CompactReading.get('sensor3', lazy=True)
+		assert lazy.calibrated and 'label' not in vars(lazy)
+		lazy.value = 2**20
+		lazy.calibrated = False
+		assert lazy.changed_fields() == ['value', 'calibrated']
+		lazy.save()
+		assert CompactReading.get('sensor3') == CompactReading('sensor3', False, 2**20, 'label3', False)
+		CompactReading.delete_many(reading.sensor for reading in readings)
+		assert not list(CompactReading._base_db.iterator(prefix=b'compactreading'))
+
+		with self.assert_raises(InvalidModel):
+			class UnknownFormat(DBBaseModel): # pylint: disable=unused-variable
+				prefix = 'unknownformat'
+				format = 'tiny'
+				name = String(key=True)
+
+	def test_expiry(self):
+		Token.save_many(Token('token%d' % i, 'user%d' % (i % 2)) for i in range(6))
+		Token('token0', 'user0').save(expires_at=time.time() - 1)
+		Token('token1', 'user1').save(expires_at=time.time() - 1)
+		Token('token2', 'user0').save(expires_at=time.time() + 0.3)
+		assert Token.get('token0') is None and Token.get('token0', fieldnames=['user']) is None
+		assert Token.get('token3') == Token('token3', 'user1')
+		assert Token.get_many(['token0', 'token3']) == [None, Token('token3', 'user1')]
+		assert [token.token for token in Token.iter()] == ['token2', 'token3', 'token4', 'token5']
+		assert list(Token.iter(include_value=False)) == ['token2', 'token3', 'token4', 'token5']
+		assert [token.token for token in Token.iter_by('user', 'user1')] == ['token3', 'token5']
+		assert Token.count(start='token0', stop='token9') == 4
+		assert Token.count(where=Token.user == 'user0') == 2
+		# the counter includes expired records until they are swept
+		assert Token.count() == 6
+
+		# saving an unchanged record writes it if it is given an expiry
+		token = Token.get('token4')
+		token.save(expires_at=time.time() - 1)
+		assert Token.get('token4') is None
+		assert Token.sweep(batch_size=2) == 3
+		assert Token.count() == 3
+		time.sleep(0.3)
+		assert Token.get('token2') is None and Token.sweep() == 1
+		assert list(Token._base_db.iterator(prefix=b'token:#expires-', include_value=False)) == \
+				[b'token:#expires-' + Token.db.get(key)[:8] + key for key in [b'token3', b'token5']]
+		# index entries of swept records are gone
+		assert [token.token for token in Token.iter_by('user', 'user0')] == []
+
+		sweeper = Token.sweeper(interval=0.01)
+		sweeper.start()
+		Token('token3', 'user1').save(expires_at=time.time() - 1)
+		deadline = time.time() + 5
+		while sweeper.swept < 1 and time.time() < deadline:
+			time.sleep(0.01)
+		sweeper.stop()
+		sweeper.join()
+		assert sweeper.swept == 1 and Token.count() == 1
+
+		# a record saved again between the sweep's read and its write is kept
+		Token('token6', 'user0').save(expires_at=time.time() - 1)
+		def save_token6(*args):
+			del Token._update_indexes
+			thread = threading.Thread(target=Token('token6', 'user1').save)
+			thread.start()
+			thread.join()
+			Token._update_indexes(*args)
+		Token._update_indexes = staticmethod(save_token6)
+		assert Token.sweep() == 0
+		assert Token.get('token6') == Token('token6', 'user1') and Token.count() == 2
+		assert list(Token._base_db.iterator(prefix=b'token:#expires-', include_value=False)) == \
+				[b'token:#expires-' + Token.db.get(key)[:8] + key for key in [b'token5', b'token6']]
+		Token.delete_many(['token5', 'token6'])
+		Token._base_db.delete(b'token:#count')
+		assert not list(Token._base_db.iterator(prefix=b'token'))
+
+		# a cached record expires in the cache too
+		CachedToken('forever', 'raylu').save()
+		CachedToken('brief', 'raylu').save(expires_at=time.time() + 0.2)
+		assert CachedToken.get('brief').user == 'raylu' and CachedToken.get_many(['brief']) == [CachedToken('brief', 'raylu')]
+		time.sleep(0.2)
+		assert CachedToken.get('brief') is None and CachedToken.get_many(['brief', 'forever'])[0] is None
+		assert CachedToken.sweep() == 1
+		assert CachedToken.get('forever').user == 'raylu'
+		assert not list(CachedToken._base_db.iterator(prefix=b'cachedtoken:'))
+		CachedToken.delete_many(['forever'])
+
+		with self.assert_raises(ValueError):
+			Animal('cow', 'moo', True, 0.0).save(expires_at=time.time())
+		with self.assert_raises(ValueError):
+			Animal.sweeper()
+		with self.assert_raises(InvalidModel):
+			class NegativeTTL(DBBaseModel): # pylint: disable=unused-variable
+				prefix = 'negativettl'
+				ttl = -1
+				name = String(key=True)
+
 	def test_invalid_model(self):
 		# pylint: disable=unused-variable
 
@@ -135,15 +1089,20 @@ class TestLevelORM(BaseTest):
 				not_a_key = String()
 
 		with self.assert_raises(InvalidModel):
-			class MultiKey(DBBaseModel):
-				prefix = 'multikey'
+			class BooleanKey(DBBaseModel):
+				prefix = 'booleankey'
+				key = Boolean(key=True)
+
+		with self.assert_raises(InvalidModel):
+			class ArrayKey(DBBaseModel):
+				prefix = 'arraykey'
 				key1 = String(key=True)
-				key2 = Blob(key=True)
+				key2 = Array(Integer(), key=True)
 
 		with self.assert_raises(InvalidModel):
-			class IntKey(DBBaseModel):
-				prefix = 'intkey'
-				key = Integer(key=True)
+			class IndexedKey(DBBaseModel):
+				prefix = 'indexedkey'
+				key = String(key=True, index=True)
 
 		with self.assert_raises(InvalidModel):
 			class NoPrefix(DBBaseModel):
@@ -0,0 +1,196 @@
+import multiprocessing
+from os import path
+import shutil
+import tempfile
+import threading
+import typing
+
+import plyvel
+
+import levelorm
+from levelorm import compression, server
+from levelorm.exceptions import RemoteError, WriteConflict
+from levelorm.fields import String, Integer
+from .base import BaseTest
+
+def save_cows(socket_path, first):
+	''' runs in a child process '''
+	DBBaseModel: typing.Any = levelorm.db_base_model(server.RemoteDB(socket_path))
+
+	class Cow(DBBaseModel):
+		prefix = 'cow'
+		name = String(key=True)
+		age = Integer(index=True)
+	Cow.save_many(Cow('cow%02d' % i, i) for i in range(first, first + 10))
+
+def save_counted_cows(socket_path, age):
+	''' runs in a child process '''
+	DBBaseModel: typing.Any = levelorm.db_base_model(server.RemoteDB(socket_path))
+
+	class CountedCow(DBBaseModel):
+		prefix = 'countedcow'
+		counted = True
+		name = String(key=True)
+		age = Integer(index=True)
+	for i in range(50):
+		CountedCow('cow%02d' % i, age).save()
+
+class TestServer(BaseTest):
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.db = plyvel.DB(path.join(self.tmpdir, 'db'), create_if_missing=True)
+		self.socket_path = path.join(self.tmpdir, 'levelorm.sock')
+		self.server = server.Server(self.db, self.socket_path).start()
+		self.remote = server.RemoteDB(self.socket_path, chunk_size=64)
+		DBBaseModel: typing.Any = levelorm.db_base_model(self.remote)
+
+		class Cow(DBBaseModel):
+			prefix = 'cow'
+			name = String(key=True)
+			age = Integer(index=True)
+		self.Cow = Cow
+
+	def tearDown(self):
+		self.remote.close()
+		self.server.close()
+		self.db.close()
+		shutil.rmtree(self.tmpdir)
+
+	def test_models(self):
+		Cow = self.Cow
+		Cow.save_many(Cow('cow%03d' % i, i % 7) for i in range(300))
+		assert self.db.get(b'cow-cow005') == Cow._codec.encode([5])
+		assert Cow.get('cow010') == Cow('cow010', 3)
+		assert Cow.get('nope') is None
+		assert Cow.get_many(['cow001', 'nope', 'cow299']) == [Cow('cow001', 1), None, Cow('cow299', 5)]
+		cows = list(Cow.iter())
+		assert len(cows) == 300 and cows[0] == Cow('cow000', 0) and cows[-1] == Cow('cow299', 5)
+		assert [cow.name for cow in Cow.iter(start='cow100', stop='cow103')] == ['cow100', 'cow101', 'cow102']
+		assert next(Cow.iter(reverse=True, include_value=False)) == 'cow299'
+		assert len(list(Cow.iter_by('age', 6))) == 42
+		assert Cow.count() == 300
+
+		with Cow.read_session():
+			Cow('cow000', 100).save()
+			assert Cow.get('cow000').age == 0
+			assert Cow.get_many(['cow000', 'cow001']) == [Cow('cow000', 0), Cow('cow001', 1)]
+		assert Cow.get('cow000').age == 100
+
+		with self.assert_raises(ValueError):
+			with Cow.batch():
+				Cow('cow000', 0).save()
+				raise ValueError
+		assert Cow.get('cow000').age == 100
+		Cow.delete_many('cow%03d' % i for i in range(300))
+		assert not list(self.db.iterator())
+		# every iterator and snapshot was closed
+		self.remote.get(b'')
+		assert not self.server.iterators and not self.server.snapshots
+
+	def test_raw(self):
+		remote = self.remote
+		remote.put(b'a', b'1')
+		with remote.write_batch() as write_batch:
+			write_batch.put(b'b', b'2')
+			write_batch.put(b'c', b'3')
+			write_batch.delete(b'a')
+		assert remote.get(b'a') is None and remote.get(b'a', b'default') == b'default'
+		snapshot = remote.snapshot()
+		remote.put(b'd', b'4')
+		assert list(snapshot.iterator()) == [(b'b', b'2'), (b'c', b'3')]
+		assert list(remote.iterator(include_value=False)) == [b'b', b'c', b'd']
+		with remote.raw_iterator() as it:
+			it.seek(b'c')
+			assert it.key() == b'c' and it.value() == b'3'
+			it.next()
+			it.next()
+			assert not it.valid()
+		snapshot.close()
+		prefixed = remote.prefixed_db(b'p-')
+		prefixed.put(b'x', b'5')
+		assert self.db.get(b'p-x') == b'5' and list(prefixed.iterator()) == [(b'x', b'5')]
+		assert remote.approximate_size(b'a', b'z') >= 0
+
+		with self.assert_raises(WriteConflict):
+			with remote.write_batch() as write_batch:
+				write_batch.expect(b'b', b'1')
+				write_batch.put(b'e', b'5')
+		assert remote.get(b'e') is None
+		remote.put(b'n', server._int64.pack(5))
+		with remote.write_batch() as write_batch:
+			write_batch.expect(b'b', b'2')
+			write_batch.expect(b'e', None)
+			write_batch.put(b'e', b'5')
+			write_batch.add(b'n', 2)
+			write_batch.add(b'missing', 2)
+		assert remote.get(b'e') == b'5' and remote.get(b'n') == server._int64.pack(7) and remote.get(b'missing') is None
+
+		# another process took the next dictionary id between load() and the write
+		first = compression.Compressor(compression.Zlib(), remote, 'z')
+		second = compression.Compressor(compression.Zlib(), remote, 'z')
+		load = first.load
+		def load_and_race():
+			dictionaries = load()
+			if not second.dictionaries:
+				second.add_dictionary(b'second')
+			return dictionaries
+		first.load = load_and_race # type: ignore
+		assert first.add_dictionary(b'first') == 2
+		assert first.load() == {1: b'second', 2: b'first'}
+
+		# closing a snapshot doesn't wait for the client's lock, which a garbage collecting thread might hold
+		snapshot = remote.snapshot()
+		with remote._lock:
+			snapshot.close()
+		remote.get(b'')
+		assert not self.server.snapshots
+
+		with self.assert_raises(RemoteError):
+			server.Server(self.db, self.socket_path)
+		with self.assert_raises(RemoteError):
+			remote._call(bytes((0xff,)))
+
+	def test_concurrent_writes(self):
+		Cow = self.Cow
+		def save(first):
+			for i in range(first, first + 50):
+				Cow('cow%03d' % i, i).save()
+		threads = [threading.Thread(target=save, args=(n * 50,)) for n in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		assert Cow.count() == 400
+		stats = self.server.stats()
+		assert stats['writes'] == 400 and stats['batches'] <= stats['writes']
+
+		context = multiprocessing.get_context('fork')
+		processes = [context.Process(target=save_cows, args=(self.socket_path, first)) for first in (400, 410)]
+		for process in processes:
+			process.start()
+		for process in processes:
+			process.join()
+			assert process.exitcode == 0
+		assert [cow.age for cow in Cow.iter(start='cow400')] == list(range(400, 420))
+
+	def test_concurrent_counts(self):
+		DBBaseModel: typing.Any = levelorm.db_base_model(self.remote)
+
+		class CountedCow(DBBaseModel):
+			prefix = 'countedcow'
+			counted = True
+			name = String(key=True)
+			age = Integer(index=True)
+		CountedCow.recount()
+
+		# each process only counts and indexes against the values it read, so the server checks them
+		context = multiprocessing.get_context('fork')
+		processes = [context.Process(target=save_counted_cows, args=(self.socket_path, age)) for age in range(4)]
+		for process in processes:
+			process.start()
+		for process in processes:
+			process.join()
+			assert process.exitcode == 0
+		assert CountedCow.count() == 50
+		assert len(list(self.db.iterator(prefix=b'countedcow:age-'))) == 50
+		assert sorted(cow.name for cow in CountedCow.iter_by('age')) == ['cow%02d' % i for i in range(50)]